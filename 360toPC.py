@@ -1,15 +1,10 @@
 import os
-import struct
 import argparse
 import glob
 
-def swap_endianness(data):
-    """ Swap endianness of the given byte data in 4-byte chunks. """
-    swapped = bytearray()
-    for i in range(0, len(data), 4):
-        chunk = data[i:i+4]
-        swapped.extend(chunk[::-1])  # Reverse byte order
-    return swapped
+from services.endian_converter import swap_header, MIN_FILE_SIZE
+
+# The conversion itself lives in services/endian_converter.py; this is the command line wrapper.
 
 def process_files(file_patterns):
     """ Process each file by swapping specific byte ranges and saving to a subdirectory. """
@@ -32,21 +27,12 @@ def process_files(file_patterns):
         with open(file, "rb") as f:
             original_data = f.read()
 
-        if len(original_data) < 84:
-            print(f"Skipping {file}: File is smaller than required 84 bytes.")
+        if len(original_data) < MIN_FILE_SIZE:
+            print(f"Skipping {file}: File is smaller than required {MIN_FILE_SIZE} bytes.")
             continue
 
-        # Swap endianness for first 64 bytes (0-63)
-        swapped_first_64 = swap_endianness(original_data[:64])
-
-        # Keep bytes 64-67 unchanged
-        unchanged_bytes = original_data[64:68]
-
-        # Swap endianness for bytes 68-83
-        swapped_68_83 = swap_endianness(original_data[68:84])
-
-        # Construct new file content
-        new_data = swapped_first_64 + unchanged_bytes + swapped_68_83 + original_data[84:]
+        # Swap endianness of bytes 0-63 and 68-83, keep the 'CMP1' magic and the data
+        new_data = swap_header(original_data)
 
         output_path = os.path.join(output_dir, os.path.basename(file))
         with open(output_path, "wb") as f:
@@ -0,0 +1,508 @@
+import argparse
+import functools
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import time
+import tracemalloc
+import zipfile
+
+from services import save_codec
+
+def _sample_bytes(length: int) -> bytes:
+    """Deterministic pseudo-random test data."""
+    return bytes((i * 131 + (i >> 8) * 7 + 3) & 0xff for i in range(length))
+
+
+def _sample_image(width: int = 384, height: int = 208):
+    """Deterministic test screenshot: gradients, a noisy-looking pattern and a flat area."""
+    import numpy as np
+    from PIL import Image
+
+    y, x = np.mgrid[0:height, 0:width]
+    arr = np.stack([(x * 3 + y) % 256, (x * y) % 256, (x // 8 * 37 + y // 8 * 11) % 256], axis=-1)
+    arr[:, :48] = (200, 30, 90)
+    return Image.fromarray(arr.astype(np.uint8))
+
+
+def _quality_images():
+    """Deterministic image set for the encoder quality comparison: (name, image) pairs."""
+    import numpy as np
+    from PIL import Image
+
+    height, width = 208, 384
+    y, x = np.mgrid[0:height, 0:width].astype(np.float64)
+    rng = np.random.default_rng(519)
+
+    gradient = np.stack([x / width * 255, y / height * 255, (x + y) / (width + height) * 255], axis=-1)
+    radius = np.hypot(x - width / 2, y - height / 2)
+    radial = np.stack([128 + 127 * np.sin(radius / 9), 128 + 127 * np.cos(radius / 13), 255 - radius % 256], axis=-1)
+    # Smooth scene with diagonal color ramps and mild noise, closest to a game screenshot
+    scene = gradient * 0.6 + radial * 0.4 + rng.normal(0, 6, (height, width, 3))
+    noise = rng.integers(0, 256, (height, width, 3))
+
+    images = [("pattern", _sample_image())]
+    for name, arr in (("gradient", gradient), ("radial", radial), ("scene", scene), ("noise", noise)):
+        images.append((name, Image.fromarray(np.clip(np.rint(arr), 0, 255).astype(np.uint8))))
+    return images
+
+
+def _decode_dxt1(data: bytes, width: int, height: int):
+    """Reference DXT1 decoder (4-color blocks only) returning an (H, W, 3) array."""
+    import numpy as np
+    from services.image_injector_service import ImageInjectorService
+
+    injector = ImageInjectorService()
+    blocks = np.frombuffer(data, dtype=ImageInjectorService._DXT1_BLOCK_DTYPE)
+    rgb0 = injector._expand_565(blocks['c0'].astype(np.int32))
+    rgb1 = injector._expand_565(blocks['c1'].astype(np.int32))
+    palette = np.stack([rgb0, rgb1, (2 * rgb0 + rgb1) // 3, (rgb0 + 2 * rgb1) // 3], axis=1)
+
+    indices = (blocks['indices'][:, None] >> (2 * np.arange(16, dtype=np.uint32))) & 3
+    pixels = np.take_along_axis(palette, indices[..., None].astype(np.intp), axis=1)
+    blocks_y, blocks_x = height // 4, width // 4
+    return pixels.reshape(blocks_y, blocks_x, 4, 4, 3).transpose(0, 2, 1, 3, 4).reshape(blocks_y * 4, blocks_x * 4, 3)
+
+
+def _psnr(original, decoded) -> float:
+    import numpy as np
+
+    original = np.asarray(original, dtype=np.float64)[:decoded.shape[0], :decoded.shape[1]]
+    mse = np.mean((original - decoded) ** 2)
+    return float('inf') if mse == 0 else 10 * np.log10(255 ** 2 / mse)
+
+
+def _synthetic_srr(size_kb: int) -> bytes:
+    """Toybox layout text with editable toys (text creators, challenges, prompts) spread through object records."""
+    lines = []
+    toy = 0
+    while sum(len(line) + 1 for line in lines) < size_kb * 1024:
+        toy += 1
+        lines.append(f'OBJECT_{toy} = {{ ID = {toy * 7919 % 100000} POS = {toy % 97}.5,{toy % 13}.25,{toy % 31}.0 ROT = 0,90,0 }}')
+        if toy % 50 == 0:
+            lines.extend(f'    "@AR_TextInput{j}_Default" = "Line {j} of sign {toy}"' for j in range(1, 11))
+        elif toy % 20 == 0:
+            lines.append(f'    "@AR_ChallengeTitle" = "Challenge {toy}"')
+            lines.append(f'    "@AR_ChallengeDescription" = "Collect all {toy} coins"')
+        elif toy % 15 == 0:
+            lines.append(f'    "@AR_PromptText" = "Press X to talk to toy {toy}"')
+    return "\n".join(lines).encode('utf-8')
+
+
+def _synthetic_ehrr() -> bytes:
+    return (b'VERSION = 519\nAUTHOREDNAME = "Benchmark Toybox"\n'
+            b'AUTHOREDDESC = "Synthetic toybox for the round-trip benchmark"\n'
+            b'DATESTRING = "2024-01-01 12:00"\n' + b'PLAYERS = 4\n' * 200)
+
+
+def _synthetic_scca() -> bytes:
+    return b'NAME = "Benchmark"\nSCREENSHOT = $' + b'00' * (384 * 208 // 2) + b'$\nSLOT = 7\n'
+
+
+def _synthetic_toybox_zip(srr: bytes, ehrr: bytes, scca: bytes) -> bytes:
+    """A toybox ZIP as users upload it: save files plus an incompressible texture."""
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("Toybox/SRR7A", srr)
+        zf.writestr("Toybox/EHRR7A", ehrr)
+        zf.writestr("Toybox/SCCA7A", scca)
+        zf.writestr("Toybox/SHRR7A.dds", hashlib.shake_256(srr).digest(256 * 1024))
+    return output.getvalue()
+
+
+def _best_of(func, repeat: int) -> float:
+    """Runs func `repeat` times and returns the fastest run in milliseconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def bench_hash(args) -> bool:
+    # Correctness is covered by the golden values in tests/test_save_codec.py
+    for size_kb in args.sizes:
+        data = _sample_bytes(size_kb * 1024)
+        ms = _best_of(lambda: save_codec.hash_file(data, len(data), 0), args.repeat)
+        print(f"hash_file {size_kb:>6} KB: {ms:9.2f} ms  ({size_kb / 1024 / (ms / 1000):.1f} MB/s)")
+    return True
+
+
+def bench_dxt1(args) -> bool:
+    from services.image_injector_service import ImageInjectorService
+
+    # Bit-identity with the original encoder is covered by tests/test_image_injector.py
+    injector = ImageInjectorService()
+    img = _sample_image()
+    ms = _best_of(lambda: injector._compress_dxt1(img), args.repeat)
+    print(f"DXT1 encode {img.size[0]}x{img.size[1]}: {ms:.2f} ms")
+    return True
+
+
+def bench_dxt1_quality(args) -> bool:
+    from PIL import Image
+    from services.image_injector_service import ImageInjectorService, DXT1_QUALITY_MODES
+
+    images = _quality_images()
+    for path in args.images:
+        images.append((path, Image.open(path).convert('RGB')))
+
+    injectors = {mode: ImageInjectorService(quality=mode) for mode in DXT1_QUALITY_MODES}
+    print(f"{'image':<24}" + "".join(f"{mode + ' dB':>12}{mode + ' ms':>12}" for mode in DXT1_QUALITY_MODES))
+
+    ok = True
+    for name, img in images:
+        img = img.convert('RGB')
+        row = f"{name:<24}"
+        scores = {}
+        for mode, injector in injectors.items():
+            data = injector._compress_dxt1(img)
+            scores[mode] = _psnr(img, _decode_dxt1(data, *img.size))
+            ms = _best_of(lambda: injector._compress_dxt1(img), args.repeat)
+            row += f"{scores[mode]:12.2f}{ms:12.2f}"
+        print(row)
+        if scores["high"] < scores["fast"]:
+            print(f"❌ 'high' quality is worse than 'fast' on {name}.")
+            ok = False
+    return ok
+
+
+def _edit_toys(parsed: dict) -> bytes:
+    """Rewrites the text of every editable toy, like a full pass through the editor views."""
+    lines = list(parsed['lines'])
+    for toy in parsed['toys']:
+        for index in toy.get('line_indices', {}).values():
+            lines[index] = re.sub(r'= "([^"]*)"', '= "Edited"', lines[index])
+    return "\n".join(lines).encode('utf-8')
+
+
+def _rezip(members: dict) -> bytes:
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    return output.getvalue()
+
+
+def _peak_memory_mb(func) -> float:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    finally:
+        tracemalloc.stop()
+
+
+def bench_roundtrip(args) -> bool:
+    from services import save_codec, toybox_zip
+    from services.file_parser import analyze_and_parse_toybox_file, read_zip_metadata
+    from services.image_injector_service import ImageInjectorService
+
+    injector = ImageInjectorService()
+    png = io.BytesIO()
+    _sample_image().save(png, format='PNG')
+    png = png.getvalue()
+
+    results = {}
+    print(f"{'stage':<12}{'size':>10}{'ms':>12}{'peak MB':>10}")
+    for size_kb in args.sizes:
+        srr = save_codec.encode(_synthetic_srr(size_kb))
+        ehrr = save_codec.encode(_synthetic_ehrr())
+        scca = save_codec.encode(_synthetic_scca(), level=1, alignment=64)
+        toybox = _synthetic_toybox_zip(srr, ehrr, scca)
+
+        # Each stage gets the output of the previous one, as in the editor flow
+        header, payload = save_codec.decode(srr)
+        parsed = analyze_and_parse_toybox_file(payload)
+        edited = _edit_toys(parsed)
+        encoded = save_codec.encode(edited, header)
+
+        stages = [
+            ("decode", lambda: save_codec.decode(srr)),
+            ("parse", lambda: analyze_and_parse_toybox_file(payload)),
+            ("edit", lambda: _edit_toys(parsed)),
+            ("encode", lambda: save_codec.encode(edited, header)),
+            ("rezip", lambda: _rezip({"Toybox/SRR7A": encoded, "Toybox/EHRR7A": ehrr, "Toybox/SCCA7A": scca})),
+            ("screenshot", lambda: injector.process_toybox(toybox, png)[0].close()),
+            ("renumber", lambda: toybox_zip.rename_members(toybox, "Toybox/", functools.partial(toybox_zip.renumbered_name, new_number=42))),
+            ("metadata", lambda: read_zip_metadata(toybox)),
+        ]
+        for name, func in stages:
+            ms = _best_of(func, args.repeat)
+            peak = _peak_memory_mb(func)
+            results[f"{name}@{size_kb}KB"] = ms
+            print(f"{name:<12}{size_kb:>8}KB{ms:12.2f}{peak:10.2f}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.baseline}.")
+        return True
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one.")
+        return True
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    ok = True
+    for key, ms in results.items():
+        reference = baseline.get(key)
+        if reference is not None and ms > reference * (1 + args.tolerance):
+            print(f"❌ {key} regressed: {ms:.2f} ms vs baseline {reference:.2f} ms (+{(ms / reference - 1) * 100:.0f}%)")
+            ok = False
+    if ok:
+        print(f"✅ No stage regressed by more than {args.tolerance * 100:.0f}% against {args.baseline}.")
+    return ok
+
+
+class _FakeEmbeddingEndpoint:
+    """Local stand-in for the embedding API: fixed latency per request and a requests/second quota."""
+
+    def __init__(self, latency: float, rate_limit: int, dimensions: int = 8):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.dimensions = dimensions
+        self.window_start = 0.0
+        self.window_requests = 0
+
+    @staticmethod
+    def vector(text: str, dimensions: int = 8) -> list[float]:
+        digest = hashlib.sha256(text.encode('utf-8')).digest()
+        return [b / 255 for b in digest[:dimensions]]
+
+    async def embed(self, texts: list[str], task_type: str) -> list[list[float]]:
+        import asyncio
+        from services.embedding_pipeline import RateLimitError
+
+        now = time.perf_counter()
+        if now - self.window_start >= 1.0:
+            self.window_start, self.window_requests = now, 0
+        self.window_requests += 1
+        if self.window_requests > self.rate_limit:
+            raise RateLimitError("429 Too Many Requests")
+        await asyncio.sleep(self.latency)
+        return [self.vector(text, self.dimensions) for text in texts]
+
+
+def bench_embed(args) -> bool:
+    import asyncio
+    import tempfile
+    from services.embedding_cache import EmbeddingCache
+    from services.embedding_pipeline import EmbeddingPipeline
+
+    ids = [str(i) for i in range(args.documents)]
+    documents = [f"Toybox {i}\nA synthetic description number {i}\nTags: Marvel" for i in range(args.documents)]
+    metadatas = [{"name": f"Toybox {i}"} for i in range(args.documents)]
+
+    async def serial():
+        # The old ingest loop: one request per document, one at a time (given no quota at all)
+        endpoint = _FakeEmbeddingEndpoint(args.latency / 1000, float('inf'))
+        for doc in documents:
+            await endpoint.embed([doc], "retrieval_document")
+
+    async def pipelined(documents, cache=None):
+        endpoint = _FakeEmbeddingEndpoint(args.latency / 1000, args.rate_limit)
+        pipeline = EmbeddingPipeline(endpoint.embed, batch_size=args.batch_size, concurrency=args.concurrency, base_delay=0.05,
+                                     cache=cache, model="fake-model")
+        stored = {}
+
+        async def on_batch(batch_ids, batch_docs, embeddings, batch_metadatas):
+            for doc_id, doc, embedding in zip(batch_ids, batch_docs, embeddings):
+                assert doc_id not in stored and embedding == _FakeEmbeddingEndpoint.vector(doc)
+                stored[doc_id] = embedding
+
+        count = await pipeline.run(ids, documents, metadatas, on_batch)
+        return count == len(ids) and len(stored) == len(ids), pipeline
+
+    start = time.perf_counter()
+    asyncio.run(serial())
+    serial_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    complete, pipeline = asyncio.run(pipelined(documents))
+    pipeline_ms = (time.perf_counter() - start) * 1000
+
+    print(f"serial:    {serial_ms:9.1f} ms ({args.documents} requests, no quota)")
+    print(f"pipelined: {pipeline_ms:9.1f} ms ({pipeline.requests} requests, {pipeline.rate_limited} rate limited)")
+    if not complete:
+        print("❌ The pipeline did not store every document exactly once.")
+
+    # A rebuild against a warm embedding cache, with every tenth document edited since
+    edited = [doc + " (edited)" if i % 10 == 0 else doc for i, doc in enumerate(documents)]
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = EmbeddingCache(os.path.join(tmp, "embedding_cache.db"))
+        asyncio.run(pipelined(documents, cache))
+        start = time.perf_counter()
+        cached_complete, pipeline = asyncio.run(pipelined(edited, cache))
+        cached_ms = (time.perf_counter() - start) * 1000
+        cache.close()
+
+    changed = len(documents[::10])
+    print(f"rebuild:   {cached_ms:9.1f} ms ({pipeline.requests} requests for {changed} edited documents, "
+          f"{args.documents - changed} served from the cache)")
+    if not cached_complete:
+        print("❌ The cached rebuild did not store every document exactly once.")
+    return complete and cached_complete
+
+
+def _latency_summary(timings: list[float]) -> str:
+    timings = sorted(timings)
+    return f"avg {sum(timings) / len(timings) * 1000:7.3f} ms, p95 {timings[int(len(timings) * 0.95)] * 1000:7.3f} ms"
+
+
+def bench_vector_store(args) -> bool:
+    import tempfile
+    import numpy as np
+    from services.vector_store import NumpyVectorStore
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.vectors, args.dimensions)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = rng.standard_normal((args.queries, args.dimensions)).astype(np.float32)
+    ids = [str(i) for i in range(args.vectors)]
+    documents = [f"Toybox {i}" for i in ids]
+    tags = ["Marvel", "Disney", "Star Wars", "Other"]
+    metadatas = [{"name": f"Toybox {i}", "url": "", "tags": tags[i % len(tags)]} for i in range(args.vectors)]
+    embeddings = vectors.tolist()
+    k = args.top_k
+
+    # Exact reference ranking
+    expected = [set(np.argsort(-(vectors @ query))[:k].astype(str)) for query in queries]
+    expected_total = sum(len(exact) for exact in expected)
+    ok = True
+
+    with tempfile.TemporaryDirectory() as tmp:
+        numpy_path = os.path.join(tmp, "vector_index")
+        start = time.perf_counter()
+        built = NumpyVectorStore(numpy_path)
+        built.upsert(ids, embeddings, documents, metadatas)
+        built.flush()
+        build_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        store = NumpyVectorStore(numpy_path)
+        load_ms = (time.perf_counter() - start) * 1000
+
+        timings, recall = [], 0
+        for query, exact in zip(queries, expected):
+            start = time.perf_counter()
+            results = store.query(query.tolist(), k)
+            timings.append(time.perf_counter() - start)
+            recall += len(exact & {result['id'] for result in results})
+        start = time.perf_counter()
+        store.with_tag("Star Wars", 25)
+        tag_ms = (time.perf_counter() - start) * 1000
+
+        print(f"numpy:  build {build_ms:8.1f} ms, open {load_ms:7.1f} ms, query {_latency_summary(timings)}, "
+              f"tag filter {tag_ms:.2f} ms, recall@{k} {recall / expected_total:.3f}")
+        if recall != expected_total:
+            print("❌ The NumPy index did not return the exact top-k.")
+            ok = False
+
+        try:
+            from services.vector_store import ChromaVectorStore
+            start = time.perf_counter()
+            chroma = ChromaVectorStore(os.path.join(tmp, "chroma_db"))
+            for offset in range(0, args.vectors, 1000):
+                chroma.upsert(ids[offset:offset + 1000], embeddings[offset:offset + 1000],
+                              documents[offset:offset + 1000], metadatas[offset:offset + 1000])
+            build_ms = (time.perf_counter() - start) * 1000
+            del chroma
+
+            start = time.perf_counter()
+            chroma = ChromaVectorStore(os.path.join(tmp, "chroma_db"))
+            load_ms = (time.perf_counter() - start) * 1000
+
+            timings, recall = [], 0
+            for query, exact in zip(queries, expected):
+                start = time.perf_counter()
+                results = chroma.query(query.tolist(), k)
+                timings.append(time.perf_counter() - start)
+                recall += len(exact & {result['id'] for result in results})
+            start = time.perf_counter()
+            chroma.with_tag("Star Wars", 25)
+            tag_ms = (time.perf_counter() - start) * 1000
+
+            print(f"chroma: build {build_ms:8.1f} ms, open {load_ms:7.1f} ms, query {_latency_summary(timings)}, "
+                  f"tag filter {tag_ms:.2f} ms, recall@{k} {recall / expected_total:.3f}")
+        except ImportError:
+            print("chroma: skipped (chromadb is not installed)")
+
+    return ok
+
+
+# A mix of queries the expander resolves and ones it leaves to the LLM refinement
+EXPANDER_QUERIES = ["rogue one maps", "any good obi-wan toyboxes", "marvel racing map with spider-man",
+                    "best racing map made in 2018", "empire", "star wars story"]
+
+
+def bench_query_expander(args) -> bool:
+    # Which queries are expanded is covered by tests/test_query_expander.py
+    from services.query_expander import QueryExpander
+
+    expander = QueryExpander(args.knowledge_base)
+    timings = []
+    for _ in range(args.repeat):
+        for query in EXPANDER_QUERIES:
+            start = time.perf_counter()
+            expander.expand(query)
+            timings.append(time.perf_counter() - start)
+    print(f"expand: {_latency_summary(timings)}")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the save file pipeline.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement (the fastest one is reported)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    hash_parser = subparsers.add_parser("hash", help="CMP1 checksum (Jenkins lookup2 hash)")
+    hash_parser.add_argument("--sizes", type=int, nargs="+", default=[64, 512, 2048], help="Input sizes in KB")
+    hash_parser.set_defaults(func=bench_hash)
+
+    dxt1_parser = subparsers.add_parser("dxt1", help="Screenshot DXT1 encoder")
+    dxt1_parser.set_defaults(func=bench_dxt1)
+
+    quality_parser = subparsers.add_parser("dxt1-quality", help="PSNR and speed of the DXT1 quality modes")
+    quality_parser.add_argument("--images", nargs="*", default=[], help="Extra screenshots to include in the comparison")
+    quality_parser.set_defaults(func=bench_dxt1_quality)
+
+    roundtrip_parser = subparsers.add_parser("roundtrip", help="decode -> parse -> edit -> encode -> rezip, plus screenshot, renumber and metadata")
+    roundtrip_parser.add_argument("--sizes", type=int, nargs="+", default=[64, 512, 2048], help="Decompressed SRR sizes in KB")
+    roundtrip_parser.add_argument("--baseline", default="benchmark_baseline.json", help="Stored per-stage timings to compare against")
+    roundtrip_parser.add_argument("--save-baseline", action="store_true", help="Record this run as the new baseline instead of comparing")
+    roundtrip_parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown per stage (0.25 = 25%%)")
+    roundtrip_parser.set_defaults(func=bench_roundtrip)
+
+    embed_parser = subparsers.add_parser("embed", help="Embedding ingest pipeline against a local fake endpoint")
+    embed_parser.add_argument("--documents", type=int, default=300)
+    embed_parser.add_argument("--latency", type=float, default=10, help="Fake request latency in ms")
+    embed_parser.add_argument("--rate-limit", type=int, default=20, help="Fake quota in requests per second")
+    embed_parser.add_argument("--batch-size", type=int, default=50)
+    embed_parser.add_argument("--concurrency", type=int, default=4)
+    embed_parser.set_defaults(func=bench_embed)
+
+    vector_parser = subparsers.add_parser("vector-store", help="Vector search latency of the NumPy index (and ChromaDB, if installed)")
+    vector_parser.add_argument("--vectors", type=int, default=3000)
+    vector_parser.add_argument("--dimensions", type=int, default=768)
+    vector_parser.add_argument("--queries", type=int, default=200)
+    vector_parser.add_argument("--top-k", type=int, default=10)
+    vector_parser.set_defaults(func=bench_vector_store)
+
+    expander_parser = subparsers.add_parser("query-expander", help="Latency of the knowledge base query expansion")
+    expander_parser.add_argument("--knowledge-base", default="knowledge_base.json")
+    expander_parser.set_defaults(func=bench_query_expander)
+
+    args = parser.parse_args()
+    if not args.func(args):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
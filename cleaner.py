@@ -1,15 +1,17 @@
 import chromadb
 import json
 import os
+from services.toybox_catalog import toybox_catalog
+from services.vector_store import NumpyVectorStore
 
 # --- CONFIGURATION ---
 CHROMA_DB_PATH = "chroma_db"
+VECTOR_INDEX_PATH = "vector_index"
 COLLECTION_NAME = "toybox_collection"
 BLACKLIST_FILE = "blacklisted_threads.json"
-TOYBOX_DATA_FILE = "toybox_data.json"
 
 def main():
-    print("--- Starting ChromaDB and JSON Cleanup ---")
+    print("--- Starting ChromaDB and Toybox Catalog Cleanup ---")
 
     # 1. Load the blacklist
     print(f"Loading blacklist from {BLACKLIST_FILE}...")
@@ -44,30 +46,28 @@ def main():
     except Exception as e:
         print(f"   -> ⚠️ Warning: An error occurred during deletion: {e}")
 
+    # 3b. Delete them from the NumPy vector index too, if one was migrated
+    if os.path.isdir(VECTOR_INDEX_PATH):
+        print(f"\nRemoving blacklisted IDs from the vector index at '{VECTOR_INDEX_PATH}'...")
+        try:
+            index = NumpyVectorStore(VECTOR_INDEX_PATH, mmap=False)
+            before = index.count()
+            index.delete(blacklisted_ids)
+            print(f"   -> Removed {before - index.count()} items. Items in the index now: {index.count()}")
+        except Exception as e:
+            print(f"   -> ⚠️ Warning: An error occurred while cleaning the vector index: {e}")
 
-    # 4. Clean up toybox_data.json for consistency
-    print(f"\nCleaning up '{TOYBOX_DATA_FILE}'...")
+    # 4. Clean up the toybox catalog for consistency
+    print(f"\nCleaning up '{toybox_catalog.db_path}'...")
     try:
-        with open(TOYBOX_DATA_FILE, 'r', encoding='utf-8') as f:
-            all_toyboxes = json.load(f)
-        
-        original_count = len(all_toyboxes)
-        # Create a new list containing only the items NOT in the blacklist
-        cleaned_toyboxes = [tb for tb in all_toyboxes if str(tb.get('id')) not in blacklisted_ids]
-        cleaned_count = len(cleaned_toyboxes)
-
-        if original_count == cleaned_count:
-            print("   -> No blacklisted items found in the JSON file. It's already clean.")
+        removed = toybox_catalog.delete_many(blacklisted_ids)
+        if not removed:
+            print("   -> No blacklisted items found in the catalog. It's already clean.")
         else:
-            with open(TOYBOX_DATA_FILE, 'w', encoding='utf-8') as f:
-                json.dump(cleaned_toyboxes, f, indent=4, ensure_ascii=False)
-            print(f"   -> Removed {original_count - cleaned_count} items from the JSON file.")
-            print(f"   -> Total items in JSON now: {cleaned_count}")
-
-    except FileNotFoundError:
-        print(f"   -> ⚠️ Warning: '{TOYBOX_DATA_FILE}' not found. Skipping JSON cleanup.")
+            print(f"   -> Removed {removed} items from the catalog.")
+            print(f"   -> Total items in the catalog now: {toybox_catalog.count()}")
     except Exception as e:
-        print(f"   -> ❌ Error cleaning JSON file: {e}")
+        print(f"   -> ❌ Error cleaning the toybox catalog: {e}")
 
     print("\n✅ Cleanup complete!")
 
@@ -2,16 +2,12 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 import json
-import os
 import asyncio
-import tempfile
 import shutil
 import zipfile
 import io
-import re
 import zlib
 import aiohttp
-import aiofiles
 from discord import ForumChannel
 import config
 from views.ask_toybox_view import AskToyboxPanelView
@@ -19,12 +15,10 @@ from views.rating_view import RatingView
 from services.rating_service import rating_service
 from services.tag_analyzer import SimpleTagAnalyzer
 from services.counters import SlotCounter
+from services.cpu_executor import cpu_executor
+from services.file_parser import read_zip_metadata
 from utils.logger import logger
 
-AUTHOREDNAME_PATTERN = r'AUTHOREDNAME\s*=\s*"([^"]+)"'
-AUTHOREDDESC_PATTERN = r'AUTHOREDDESC\s*=\s*"([^"]+)"'
-DATESTRING_PATTERN = r'DATESTRING\s*=\s*"([^"]+)"'
-CONTENT_OFFSET = 84
 
 class AdminCommands(commands.Cog):
     def __init__(self, bot):
@@ -156,8 +150,9 @@ class AdminCommands(commands.Cog):
         await interaction.edit_original_response(content=result_message)
 
     @app_commands.command(name="update_toyboxes", description="ADMIN: Manually update the toybox search database.")
+    @app_commands.describe(full="Re-read the whole forum archive and drop deleted threads (default: only changes since last sync)")
     @app_commands.checks.has_permissions(administrator=True)
-    async def update_toyboxes_cmd(self, interaction: discord.Interaction):
+    async def update_toyboxes_cmd(self, interaction: discord.Interaction, full: bool = False):
         if not interaction.guild:
             await interaction.response.send_message("This command must be used in a server.", ephemeral=True)
             return
@@ -165,7 +160,7 @@ class AdminCommands(commands.Cog):
         
         from services.toybox_service import toybox_service
         try:
-            result = await toybox_service.update_toybox_database(interaction.guild)
+            result = await toybox_service.update_toybox_database(interaction.guild, full=full)
             
             # handle both old (int) and new (tuple) return types safely
             if isinstance(result, tuple):
@@ -181,6 +176,35 @@ class AdminCommands(commands.Cog):
 
 
 
+    @app_commands.command(name="cpu_stats", description="ADMIN: Shows the load and job latency of the save file worker pool.")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def cpu_stats(self, interaction: discord.Interaction):
+        stats = cpu_executor.stats()
+
+        embed = discord.Embed(title="⚙️ CPU Executor", color=discord.Color.blurple())
+        embed.add_field(name="Workers", value=str(stats['workers']), inline=True)
+        embed.add_field(name="Running / Queued", value=f"{stats['in_flight'] - stats['queue_depth']} / {stats['queue_depth']}", inline=True)
+        embed.add_field(name="Completed / Failed / Timed out", value=f"{stats['completed']} / {stats['failed']} / {stats['timed_out']}", inline=True)
+        embed.add_field(name="Latency (avg / p95)", value=f"{stats['avg_latency_ms']:.0f} ms / {stats['p95_latency_ms']:.0f} ms", inline=True)
+        embed.add_field(name="Queue wait (avg)", value=f"{stats['avg_queue_wait_ms']:.0f} ms", inline=True)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="query_cache_stats", description="ADMIN: Shows how many query embeddings and AI chat answers were served from cache.")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def query_cache_stats(self, interaction: discord.Interaction):
+        from services.rag_service import rag_service
+        stats = rag_service.query_cache.stats()
+
+        embed = discord.Embed(title="🧠 Query Embedding Cache", color=discord.Color.blurple())
+        embed.add_field(name="Entries in memory", value=str(stats['entries']), inline=True)
+        embed.add_field(name="Hits (memory / disk / coalesced)", value=f"{stats['hits']} / {stats['disk_hits']} / {stats['coalesced']}", inline=True)
+        embed.add_field(name="Misses (API calls)", value=str(stats['misses']), inline=True)
+        embed.add_field(name="Hit rate", value=f"{stats['hit_rate'] * 100:.1f}%", inline=True)
+        embed.add_field(name="Embedding latency saved", value=f"~{stats['saved_ms'] / 1000:.1f} s (avg call {stats['avg_upstream_ms']:.0f} ms)", inline=True)
+        answers = rag_service.answer_cache.stats()
+        embed.add_field(name="Cached answers (exact / similar hits / misses)", value=f"{answers['entries']} ({answers['hits']} / {answers['semantic_hits']} / {answers['misses']})", inline=True)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
     @app_commands.command(name="edit", description="Edit ratings for a specific message.")
     async def edit_ratings(self, interaction: discord.Interaction, message_id: str, user_to_remove: str):
         try:
@@ -271,67 +295,34 @@ class AdminCommands(commands.Cog):
                     )
                     await message.edit(embed=progress_embed)
                     
-                    # Create temporary directory for each record
-                    with tempfile.TemporaryDirectory() as temp_dir:
-                        file_path = f"{temp_dir}/downloaded.zip"
-                        
-                        # Download file
-                        async with aiohttp.ClientSession() as session:
-                            async with session.get(file_url) as response:
-                                if response.status != 200:
-                                    failed += 1
-                                    continue
-                                file_content = await response.read()
-                        
-                        # Save downloaded file
-                        async with aiofiles.open(file_path, 'wb') as f:
-                            await f.write(file_content)
-
-                        extracted_file_path = None
-                        
-                        # Extract ZIP and find EHRR/EHRA file
-                        with zipfile.ZipFile(file_path, 'r') as zip_ref:
-                            zip_ref.extractall(temp_dir)
-                            
-                            # Search for EHRR or EHRA file
-                            for root, _, files in os.walk(temp_dir):
-                                for file in files:
-                                    if file.startswith("EHRR") or file.startswith("EHRA"):
-                                        extracted_file_path = os.path.join(root, file)
-                                        break
-                                if extracted_file_path:
-                                    break
-
-                        if not extracted_file_path:
-                            failed += 1
-                            continue
-
-                        # Read and process the file
-                        async with aiofiles.open(extracted_file_path, 'rb') as f:
-                            file_bytes = await f.read()
-
-                        # Decompress and decode data
-                        decompressed_data = zlib.decompress(file_bytes[CONTENT_OFFSET:]).decode('utf-8').rstrip('\x00')
-
-                        # Extract metadata
-                        auth_name_match = re.search(AUTHOREDNAME_PATTERN, decompressed_data)
-                        auth_desc_match = re.search(AUTHOREDDESC_PATTERN, decompressed_data)
-                        date_string_match = re.search(DATESTRING_PATTERN, decompressed_data)
-
-                        # Update Airtable record
-                        update_fields = {}
-
-                        if auth_name_match:
-                            update_fields['Name'] = auth_name_match.group(1)
-
-                        if auth_desc_match:
-                            update_fields['description'] = auth_desc_match.group(1)
-
-                        if update_fields:
-                            table.update(record['id'], update_fields)
-                            success += 1
-                        else:
-                            failed += 1
+                    # Download file
+                    async with aiohttp.ClientSession() as session:
+                        async with session.get(file_url) as response:
+                            if response.status != 200:
+                                failed += 1
+                                continue
+                            file_content = await response.read()
+
+                    # Read the metadata straight from the EHRR/EHRA file in the ZIP
+                    metadata = await cpu_executor.run(read_zip_metadata, file_content, fields=('name', 'description'))
+                    if not metadata:
+                        failed += 1
+                        continue
+
+                    # Update Airtable record
+                    update_fields = {}
+
+                    if metadata.name:
+                        update_fields['Name'] = metadata.name
+
+                    if metadata.description:
+                        update_fields['description'] = metadata.description
+
+                    if update_fields:
+                        table.update(record['id'], update_fields)
+                        success += 1
+                    else:
+                        failed += 1
 
                 except Exception as e:
                     failed += 1
@@ -427,97 +418,60 @@ class AdminCommands(commands.Cog):
 
             file_url = fields['file'][0]['url']
             
-            # Create temporary directory
-            with tempfile.TemporaryDirectory() as temp_dir:
-                file_path = f"{temp_dir}/downloaded.zip"
-                
-                # Download file
-                progress_embed.set_field_at(0, name="Status", value="Downloading ZIP file...", inline=False)
-                await interaction.edit_original_response(embed=progress_embed)
-                
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(file_url) as response:
-                        if response.status != 200:
-                            raise Exception("Failed to download file")
-                        file_content = await response.read()
-                        
-                # Save downloaded file
-                async with aiofiles.open(file_path, 'wb') as f:
-                    await f.write(file_content)
-
-                extracted_file_path = None
-                
-                # Extract ZIP and find EHRR/EHRA file
-                with zipfile.ZipFile(file_path, 'r') as zip_ref:
-                    zip_ref.extractall(temp_dir)
-                    
-                    # Search for EHRR or EHRA file
-                    for root, _, files in os.walk(temp_dir):
-                        for file in files:
-                            if file.startswith("EHRR") or file.startswith("EHRA"):
-                                extracted_file_path = os.path.join(root, file)
-                                break
-                        if extracted_file_path:
-                            break
-
-                if not extracted_file_path:
-                    await interaction.followup.send("No valid EHRR or EHRA file found in the ZIP!", ephemeral=True)
-                    return
+            # Download file
+            progress_embed.set_field_at(0, name="Status", value="Downloading ZIP file...", inline=False)
+            await interaction.edit_original_response(embed=progress_embed)
+            
+            async with aiohttp.ClientSession() as session:
+                async with session.get(file_url) as response:
+                    if response.status != 200:
+                        raise Exception("Failed to download file")
+                    file_content = await response.read()
+
+            # Read the metadata straight from the EHRR/EHRA file in the ZIP
+            progress_embed.set_field_at(0, name="Status", value="Extracting metadata...", inline=False)
+            await interaction.edit_original_response(embed=progress_embed)
+
+            metadata = await cpu_executor.run(read_zip_metadata, file_content)
+            if not metadata:
+                await interaction.followup.send("No valid EHRR or EHRA file found in the ZIP!", ephemeral=True)
+                return
 
-                # Read and process the file
-                progress_embed.set_field_at(0, name="Status", value="Extracting metadata...", inline=False)
+            # Update Airtable record
+            update_fields = {}
+            metadata_text = "**Metadata Extracted:**\n"
+
+            if metadata.name:
+                update_fields['Name'] = metadata.name
+                metadata_text += f"**Name:** {metadata.name}\n"
+
+            if metadata.description:
+                update_fields['description'] = metadata.description
+                metadata_text += f"**Description:** {metadata.description}\n"
+
+            if metadata.date:
+                metadata_text += f"**Date:** {metadata.date}\n"
+            if update_fields:
+                progress_embed.set_field_at(0, name="Status", value="Updating Airtable record...", inline=False)
                 await interaction.edit_original_response(embed=progress_embed)
                 
-                async with aiofiles.open(extracted_file_path, 'rb') as f:
-                    file_bytes = await f.read()
-
-                # Decompress and decode data
-                decompressed_data = zlib.decompress(file_bytes[CONTENT_OFFSET:]).decode('utf-8').rstrip('\x00')
-
-                # Extract metadata
-                auth_name_match = re.search(AUTHOREDNAME_PATTERN, decompressed_data)
-                auth_desc_match = re.search(AUTHOREDDESC_PATTERN, decompressed_data)
-                date_string_match = re.search(DATESTRING_PATTERN, decompressed_data)
-
-                # Update Airtable record
-                update_fields = {}
-                metadata_text = "**Metadata Extracted:**\n"
-
-                if auth_name_match:
-                    name = auth_name_match.group(1)
-                    update_fields['Name'] = name
-                    metadata_text += f"**Name:** {name}\n"
-
-                if auth_desc_match:
-                    description = auth_desc_match.group(1)
-                    update_fields['description'] = description
-                    metadata_text += f"**Description:** {description}\n"
-
-                if date_string_match:
-                    date = date_string_match.group(1)
-                    metadata_text += f"**Date:** {date}\n"
-
-                if update_fields:
-                    progress_embed.set_field_at(0, name="Status", value="Updating Airtable record...", inline=False)
-                    await interaction.edit_original_response(embed=progress_embed)
-                    
-                    # Update Airtable
-                    table.update(post_id, update_fields)
-
-                # Create success embed
-                success_embed = discord.Embed(
-                    title="✅ Metadata Extracted",
-                    description=metadata_text if metadata_text != "**Metadata Extracted:**\n" else "No metadata found in the file.",
-                    color=0x00ff00
+                # Update Airtable
+                table.update(post_id, update_fields)
+
+            # Create success embed
+            success_embed = discord.Embed(
+                title="✅ Metadata Extracted",
+                description=metadata_text if metadata_text != "**Metadata Extracted:**\n" else "No metadata found in the file.",
+                color=0x00ff00
+            )
+            if update_fields:
+                success_embed.add_field(
+                    name="Airtable Update",
+                    value="Record has been updated with the extracted metadata.",
+                    inline=False
                 )
-                if update_fields:
-                    success_embed.add_field(
-                        name="Airtable Update",
-                        value="Record has been updated with the extracted metadata.",
-                        inline=False
-                    )
 
-                await interaction.edit_original_response(embed=success_embed)
+            await interaction.edit_original_response(embed=success_embed)
 
         except zipfile.BadZipFile:
             await interaction.followup.send("Error: Invalid ZIP file!", ephemeral=True)
@@ -537,6 +491,17 @@ class AdminCommands(commands.Cog):
 
 
 
+    async def _count_thread_history(self, guild: discord.Guild, thread_id: int) -> int:
+        """SRR files in the ZIPs attached to the first 5 messages of a thread."""
+        thread = guild.get_thread(thread_id) or await guild.fetch_channel(thread_id)
+        count = 0
+        async for message in thread.history(limit=5, oldest_first=True):
+            for attachment in message.attachments:
+                if attachment.filename.lower().endswith('.zip'):
+                    zip_data = await attachment.read()
+                    count += self.bot.counter.count_srr_files(zip_data, attachment.filename)
+        return count
+
     @app_commands.command(name="count_total_toyboxes", description="ADMIN: Counts all toyboxes in the forum channel by scanning zip files.")
     @app_commands.default_permissions(administrator=True)
     async def count_total_toyboxes(self, interaction: discord.Interaction):
@@ -558,65 +523,75 @@ class AdminCommands(commands.Cog):
         processed_threads = 0
         total_toyboxes = 0
         failed_threads = 0
+        cached_counts = 0
         
-        # Collect all threads (active and archived)
-        all_threads = []
+        # Thread facts come from the thread cache; only the first run has to crawl the forum
+        from services.thread_cache import thread_cache
         try:
-            # Active threads
-            for thread in forum_channel.threads:
-                all_threads.append(thread)
-            
-            # Archived threads
-            async for thread in forum_channel.archived_threads(limit=None):
-                all_threads.append(thread)
-                
+            if not thread_cache.complete:
+                status_embed.description = "Building the thread cache (first run only)..."
+                await status_message.edit(embed=status_embed)
+            await thread_cache.ensure_complete(forum_channel)
         except Exception as e:
             await interaction.followup.send(f"❌ Error fetching threads: {e}", ephemeral=True)
             return
 
+        all_threads = thread_cache.all()
         total_threads = len(all_threads)
         status_embed.description = f"Found {total_threads} threads. Processing..."
         await status_message.edit(embed=status_embed)
 
-        for thread in all_threads:
-            processed_threads += 1
-            
-            # Update status every 10 threads
-            if processed_threads % 10 == 0:
-                status_embed.description = f"Processing thread {processed_threads}/{total_threads}...\nCurrent Count: {total_toyboxes}"
-                await status_message.edit(embed=status_embed)
-
-            try:
-                # Scan the first 5 messages of the thread for zip files
-                messages_scanned = 0
-                zip_found_in_thread = False
+        async with aiohttp.ClientSession() as session:
+            for facts in all_threads:
+                processed_threads += 1
                 
-                async for message in thread.history(limit=5, oldest_first=True):
-                    messages_scanned += 1
-                    if not message.attachments:
+                # Update status every 10 threads
+                if processed_threads % 10 == 0:
+                    status_embed.description = f"Processing thread {processed_threads}/{total_threads}...\nCurrent Count: {total_toyboxes}"
+                    await status_message.edit(embed=status_embed)
+
+                if not facts['zips']:
+                    # The ZIPs may be in a follow-up message; those aren't cached, so scan the
+                    # first 5 messages of the thread
+                    try:
+                        count = await self._count_thread_history(interaction.guild, facts['thread_id'])
+                        total_toyboxes += count
+                        if count:
+                            logger.info(f"Thread {facts['thread_id']}: Counted {count} toyboxes in follow-up messages")
+                    except Exception as e:
+                        failed_threads += 1
+                        logger.error(f"Error processing thread {facts['thread_id']}: {e}")
+                    continue
+                if facts['srr_count'] is not None:
+                    # Counted before, and the ZIPs haven't changed since
+                    total_toyboxes += facts['srr_count']
+                    cached_counts += 1
+                    continue
+
+                try:
+                    facts = await thread_cache.fresh(interaction.guild, facts['thread_id'])
+                    if not facts:
+                        failed_threads += 1
                         continue
 
-                    for attachment in message.attachments:
-                        if attachment.filename.lower().endswith('.zip'):
-                            logger.info(f"Thread {thread.id}: Found zip {attachment.filename} in message {message.id}")
-                            
-                            # Download zip
-                            zip_data = await attachment.read()
-                            
-                            # Count SRR files using existing service
-                            count = self.bot.counter.count_srr_files(zip_data, attachment.filename)
-                            
-                            if count > 0:
-                                total_toyboxes += count
-                                zip_found_in_thread = True
-                                logger.info(f"Thread {thread.id}: Counted {count} toyboxes in {attachment.filename}")
-                            
-                if not zip_found_in_thread:
-                     logger.info(f"Thread {thread.id}: No zip file found in first {messages_scanned} messages.")
+                    count = 0
+                    for zip_info in facts['zips']:
+                        # Download zip
+                        async with session.get(zip_info['url']) as resp:
+                            if resp.status != 200:
+                                raise RuntimeError(f"Download of {zip_info['filename']} failed ({resp.status})")
+                            zip_data = await resp.read()
 
-            except Exception as e:
-                failed_threads += 1
-                logger.error(f"Error processing thread {thread.id}: {e}")
+                        # Count SRR files using existing service
+                        count += self.bot.counter.count_srr_files(zip_data, zip_info['filename'])
+                    
+                    thread_cache.set_srr_count(facts['thread_id'], count)
+                    total_toyboxes += count
+                    logger.info(f"Thread {facts['thread_id']}: Counted {count} toyboxes in {len(facts['zips'])} zip(s)")
+
+                except Exception as e:
+                    failed_threads += 1
+                    logger.error(f"Error processing thread {facts['thread_id']}: {e}")
 
         # Final Report
         from utils.ascii_numbers import get_big_number
@@ -630,6 +605,7 @@ class AdminCommands(commands.Cog):
         final_embed.add_field(name="Total Toyboxes", value=f"```\n{ascii_count}\n```", inline=False)
         final_embed.add_field(name="Threads Processed", value=str(processed_threads), inline=True)
         final_embed.add_field(name="Failed/Skipped", value=str(failed_threads), inline=True)
+        final_embed.add_field(name="Counts from Cache", value=str(cached_counts), inline=True)
         
         await status_message.edit(embed=final_embed)
 
@@ -1,15 +1,14 @@
 import discord
 from discord.ext import commands, tasks
 from discord import app_commands
-import json
-import os
 import random
 import datetime
 import re
 from zoneinfo import ZoneInfo
 from utils.logger import logger
-import config
 from services.daily_toybox_service import daily_toybox_service
+from services.toybox_catalog import toybox_catalog, extract_creator
+from services.thread_cache import thread_cache
 from views.daily_toybox_view import DailyToyboxView
 
 # Role ID for Daily Toybox Subscribers
@@ -31,37 +30,15 @@ def get_color_for_tags(tags: list):
     return discord.Color.gold()
 
 async def get_thread_image(bot, url: str):
-    """Attempts to fetch the first image attachment or embed image from a thread's starter message."""
+    """The first image attachment or embed image of a thread's starter message, via the thread cache."""
     match = re.search(r'/channels/\d+/(\d+)', url)
     if not match: 
         return None
         
     thread_id = int(match.group(1))
     try:
-        thread = await bot.fetch_channel(thread_id)
-        # Fetch starter message
-        try:
-            msgs = [m async for m in thread.history(limit=1, oldest_first=True)]
-            if not msgs: 
-                return None
-            msg = msgs[0]
-            
-            # Check attachments
-            if msg.attachments:
-                for att in msg.attachments:
-                    if att.content_type and att.content_type.startswith('image/'):
-                        return att.url
-                    # Fallback check of path without query parameters
-                    path = att.url.split('?')[0].lower()
-                    if path.endswith(('.png', '.jpg', '.jpeg', '.webp', '.gif')):
-                        return att.url
-            # Check embeds
-            if msg.embeds:
-                for emb in msg.embeds:
-                    if emb.image and emb.image.url: 
-                        return emb.image.url
-        except Exception as e:
-            logger.warning(f"Failed to fetch history for thread {thread_id}: {e}")
+        facts = await thread_cache.fresh(bot, thread_id)
+        return facts['image_url'] if facts else None
     except Exception as e:
         logger.warning(f"Could not fetch thread {thread_id} for image extraction: {e}")
     return None
@@ -137,13 +114,8 @@ class DailyToybox(commands.Cog):
 
     async def generate_daily_post(self) -> tuple[discord.Embed, DailyToyboxView, dict]:
         """Generates the daily toybox post (embed, view, and selected toybox)."""
-        if not os.path.exists(config.TOYBOX_DATA_FILE):
-            logger.error("Toybox data file not found!")
-            return None, None, None
-
         try:
-            with open(config.TOYBOX_DATA_FILE, 'r') as f:
-                toyboxes = json.load(f)
+            toyboxes = toybox_catalog.all()
         except Exception as e:
             logger.error(f"Error loading toyboxes: {e}")
             return None, None, None
@@ -168,10 +140,7 @@ class DailyToybox(commands.Cog):
         
         # Extract Creator from description if possible
         desc = toybox.get('description', '')
-        creator_name = "Unknown Creator"
-        creator_match = re.search(r'(?i)Creator:\s*([^\n]+)', desc)
-        if creator_match:
-            creator_name = creator_match.group(1).replace('*', '').strip()
+        creator_name = extract_creator(desc) or "Unknown Creator"
             
         # Clean description (remove boilerplate lines like the creator/video footer)
         clean_desc = re.sub(r'(-+\n)?(?:\*\*)?(?::art:|🎨).*Creator:[^\n]+(?:\n|$)', '', desc, flags=re.IGNORECASE)
@@ -260,13 +229,8 @@ class DailyToybox(commands.Cog):
         play_count = best_toybox_stats['play_count']
         
         # Load toybox info
-        if not os.path.exists(config.TOYBOX_DATA_FILE):
-            return
-            
         try:
-            with open(config.TOYBOX_DATA_FILE, 'r') as f:
-                toyboxes = json.load(f)
-            best_tb = next((tb for tb in toyboxes if tb['id'] == toybox_id), None)
+            best_tb = toybox_catalog.get(toybox_id)
             
             if best_tb:
                 channel = self.bot.get_channel(DAILY_CHANNEL_ID)
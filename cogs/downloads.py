@@ -3,23 +3,20 @@ from discord.ext import commands
 from discord import app_commands
 import os
 import tempfile
-import shutil
-import asyncio
 import zipfile
 import io
 import re
 import zlib
-import aiofiles
+import functools
+import aiohttp
 import config
 from views.download_views import BrownbatDownloadView
 from views.bundle_view import AddToBundleView
+from services import endian_converter, toybox_zip
+from services.cpu_executor import cpu_executor
+from services.file_parser import read_metadata, read_zip_metadata
 from utils.logger import logger
 
-AUTHOREDNAME_PATTERN = r'AUTHOREDNAME\s*=\s*"([^"]+)"'
-AUTHOREDDESC_PATTERN = r'AUTHOREDDESC\s*=\s*"([^"]+)"'
-DATESTRING_PATTERN = r'DATESTRING\s*=\s*"([^"]+)"'
-CONTENT_OFFSET = 84
-
 class DownloadCommands(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
@@ -59,14 +56,14 @@ class DownloadCommands(commands.Cog):
     @app_commands.command(name="360_to_pc", description="Convert Xbox 360 format files to PC format")
     @app_commands.describe(file="Upload a zip file containing Xbox 360 format files to convert")
     async def convert_360_to_pc(self, interaction: discord.Interaction, file: discord.Attachment):
-        await self.process_conversion(interaction, file, "360toPC.py")
+        await self.process_conversion(interaction, file)
 
     @app_commands.command(name="wiiu_to_pc_converter", description="Convert wii u format files to PC format")
     @app_commands.describe(file="Upload a zip file containing wii u format files to convert")
     async def convert_wiiu_to_pc(self, interaction: discord.Interaction, file: discord.Attachment):
-        await self.process_conversion(interaction, file, "360toPC.py")
+        await self.process_conversion(interaction, file)
 
-    async def process_conversion(self, interaction: discord.Interaction, file: discord.Attachment, script_name: str):
+    async def process_conversion(self, interaction: discord.Interaction, file: discord.Attachment):
         await interaction.response.defer()
 
         if not file or not file.filename.lower().endswith('.zip'):
@@ -77,83 +74,25 @@ class DownloadCommands(commands.Cog):
             
         original_filename = file.filename
 
-        with tempfile.TemporaryDirectory() as temp_dir:
-            input_zip_path = os.path.join(temp_dir, "input.zip")
-            extract_dir = os.path.join(temp_dir, "extracted")
-            output_zip_path = os.path.join(temp_dir, "converted.zip")
-            
-            os.makedirs(extract_dir, exist_ok=True)
-            
-            try:
-                zip_content = await file.read()
-                with open(input_zip_path, 'wb') as f:
-                    f.write(zip_content)
-                
-                with zipfile.ZipFile(input_zip_path, 'r') as zip_ref:
-                    zip_ref.extractall(extract_dir)
-            except Exception as e:
-                return await interaction.followup.send(f"Error processing zip file: {str(e)}")
-            
-            # Find target directory (handle nested folders)
-            target_dir = extract_dir
-            contents = os.listdir(extract_dir)
-            if len(contents) == 1 and os.path.isdir(os.path.join(extract_dir, contents[0])):
-                target_dir = os.path.join(extract_dir, contents[0])
-            
-            original_dir = os.getcwd()
-            try:
-                # Copy script
-                script_path = os.path.join(original_dir, script_name)
-                target_script_path = os.path.join(target_dir, script_name)
-                shutil.copy2(script_path, target_script_path)
-                
-                os.chdir(target_dir)
-                
-                # Check for RR files
-                files_before = os.listdir(target_dir)
-                if not any("RR" in f for f in files_before):
-                    os.chdir(original_dir)
-                    return await interaction.followup.send("No matching *RR* files found.")
-                
-                # Run script
-                process = await asyncio.create_subprocess_exec(
-                    "python3", target_script_path, "*RR*", "*RR*",
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
-                )
-                stdout, stderr = await process.communicate()
-                
-                if process.returncode != 0:
-                    os.chdir(original_dir)
-                    return await interaction.followup.send(f"Error running conversion: {stderr.decode()}")
-                
-                os.chdir(original_dir)
-                
-                # Check output
-                converted_dir = os.path.join(target_dir, "converted_files")
-                if not os.path.exists(converted_dir) or not os.listdir(converted_dir):
-                    return await interaction.followup.send("Conversion produced no files.")
-                
-                # Zip output
-                with zipfile.ZipFile(output_zip_path, 'w', zipfile.ZIP_DEFLATED) as zip_out:
-                    for root, _, files in os.walk(converted_dir):
-                        for file_name in files:
-                            file_path = os.path.join(root, file_name)
-                            arcname = os.path.relpath(file_path, converted_dir)
-                            zip_out.write(file_path, arcname)
-                
-                # Send result
-                with open(output_zip_path, 'rb') as f:
-                    output_file = discord.File(fp=io.BytesIO(f.read()), filename=f"converted_{original_filename}")
-                    await interaction.followup.send(
-                        content="✅ Files converted successfully!",
-                        file=output_file
-                    )
-                    
-            except Exception as e:
-                if os.getcwd() != original_dir:
-                    os.chdir(original_dir)
-                await interaction.followup.send(f"An error occurred: {str(e)}")
+        try:
+            zip_content = await file.read()
+            converted_zip, found, converted = await cpu_executor.run(endian_converter.convert_zip, zip_content)
+        except zipfile.BadZipFile as e:
+            return await interaction.followup.send(f"Error processing zip file: {str(e)}")
+        except Exception as e:
+            return await interaction.followup.send(f"An error occurred: {str(e)}")
+
+        if not found:
+            return await interaction.followup.send("No matching *RR* files found.")
+        if not converted:
+            return await interaction.followup.send("Conversion produced no files.")
+
+        # Send result
+        output_file = discord.File(fp=io.BytesIO(converted_zip), filename=f"converted_{original_filename}")
+        await interaction.followup.send(
+            content="✅ Files converted successfully!",
+            file=output_file
+        )
 
     @app_commands.command(name="batch_download_renumber", description="Download, filter, and renumber toyboxes from forum threads.")
     @app_commands.describe(
@@ -185,81 +124,26 @@ class DownloadCommands(commands.Cog):
             return
 
         # 3. Iterate Threads
-        processed_count = 0
-        zip_files_data = [] # List of (filename, file_content_bytes)
-
-        # We need to sort threads maybe? For now, we take them in default order (usually recent activity)
-        # or we might want to sort by creation date if the user expects a specific order.
-        # However, the user didn't specify order, so we iterate as is.
-        # Note: 'threads' property only has active threads. We might need archived ones too.
-        # But fetching archived threads is an async generator.
-        
-        active_threads = forum_channel.threads
-        
+        # Thread names, tags and starter message attachments come from the thread cache,
+        # newest thread first; only the first run has to crawl the forum.
+        from services.thread_cache import thread_cache
         progress_msg = await interaction.followup.send(f"🔍 Scanning threads (Active & Archived)... (Target: {limit})")
+        await thread_cache.ensure_complete(forum_channel)
+
+        found_threads = [] # List of (thread name, thread ID)
+        for facts in thread_cache.all():
+            if len(found_threads) >= limit:
+                break
 
-        found_threads = []
-        
-        # Function to process a list/iterator of threads
-        async def process_thread_list(threads_iterable, is_async=False):
-            nonlocal processed_count
-            
-            iterator = threads_iterable
-            if is_async:
-                # For async generators (archived_threads)
-                async for thread in iterator:
-                    if processed_count >= limit:
-                        break
-                    
-                    if await check_thread(thread):
-                        processed_count += 1
-            else:
-                # For standard lists (active_threads)
-                for thread in iterator:
-                    if processed_count >= limit:
-                        break
-                    
-                    if await check_thread(thread):
-                        processed_count += 1
-                        
-        async def check_thread(thread):
             # Check tags
-            thread_tags = [t.name.lower() for t in thread.applied_tags]
+            thread_tags = [t.lower() for t in facts['applied_tags']]
             if any(ex_tag in thread_tags for ex_tag in excluded_tag_list):
-                return False
+                continue
 
             # Check for zip
-            try:
-                # If we have the message in cache, good. If not, fetch.
-                # starter_message might be None if not cached.
-                starter_msg = thread.starter_message
-                if not starter_msg:
-                    try:
-                        starter_msg = await thread.fetch_message(thread.id)
-                    except discord.NotFound:
-                        return False
-                
-                if not starter_msg:
-                    return False
-                    
-                zip_attachment = next((a for a in starter_msg.attachments if a.filename.lower().endswith('.zip')), None)
-                if zip_attachment:
-                    found_threads.append((thread.name, zip_attachment))
-                    return True
-            except Exception as e:
-                logger.error(f"Error checking thread {thread.id}: {e}")
-            return False
-
-        # 1. Check Active Threads
-        await process_thread_list(active_threads, is_async=False)
-        
-        # 2. Check Archived Threads (if limit not reached)
-        if processed_count < limit:
-            # Fetch archived threads
-            # Note: archived_threads() returns an async iterator
-            await process_thread_list(forum_channel.archived_threads(limit=None), is_async=True)
+            if facts['zips']:
+                found_threads.append((facts['name'], facts['thread_id']))
 
-        
         if not found_threads:
             await interaction.followup.send("❌ No matching threads with ZIP files found.")
             return
@@ -276,15 +160,20 @@ class DownloadCommands(commands.Cog):
             success_count = 0
             
             async with aiohttp.ClientSession() as session:
-                for idx, (thread_name, attachment) in enumerate(found_threads):
+                for idx, (thread_name, thread_id) in enumerate(found_threads):
                     if idx >= len(sequence):
                         break
                         
                     new_number = sequence[idx]
                     
                     try:
+                        # Cached attachment links expire; this re-reads the thread if needed
+                        facts = await thread_cache.fresh(interaction.guild, thread_id)
+                        if not facts or not facts['zips']:
+                            continue
+
                         # Download
-                        async with session.get(attachment.url) as resp:
+                        async with session.get(facts['zips'][0]['url']) as resp:
                             if resp.status != 200:
                                 continue
                             data = await resp.read()
@@ -409,52 +298,13 @@ class DownloadCommands(commands.Cog):
 
         try:
             zip_content = await zip_file.read()
-            input_zip = zipfile.ZipFile(io.BytesIO(zip_content))
-            
-            output_zip_buffer = io.BytesIO()
-            output_zip = zipfile.ZipFile(output_zip_buffer, 'w', zipfile.ZIP_DEFLATED)
-            
-            folder_name = None
-            for name in input_zip.namelist():
-                if name.endswith('/'):
-                    folder_name = name
-                    break
-            
-            if not folder_name:
-                # If no folder, create one based on filename
-                folder_name = zip_file.filename.replace('.zip', '') + '/'
-
-            for file_info in input_zip.infolist():
-                if file_info.filename.endswith('/'):
-                    continue
-                    
-                filename = os.path.basename(file_info.filename)
-                new_filename = filename
-                
-                # Regex to parse the filename: Prefix + Number + Suffix
-                match = re.search(r'([A-Z]+)(\d+)(.*)', filename)
-                
-                if match:
-                    prefix_part, num_part, suffix_part = match.groups()
-                    
-                    # 1. Change 'R' in the prefix to 'A' (only if it ends with R)
-                    # "Reverse the process" of toybox_game_to_toybox which did A->R
-                    if prefix_part.endswith('R'):
-                        prefix_part = prefix_part[:-1] + 'A'
-                    
-                    # 2. Change number if provided
-                    if new_number is not None:
-                        num_part = str(new_number)
-                        
-                    new_filename = f"{prefix_part}{num_part}{suffix_part}"
-                
-                # Add to new zip
-                file_content = input_zip.read(file_info.filename)
-                output_zip.writestr(folder_name + new_filename, file_content)
-            
-            input_zip.close()
-            output_zip.close()
-            output_zip_buffer.seek(0)
+            # If no folder, create one based on filename
+            default_folder = zip_file.filename.replace('.zip', '') + '/'
+            converted = await cpu_executor.run(
+                toybox_zip.rename_members, zip_content, default_folder,
+                functools.partial(toybox_zip.to_toybox_game_name, new_number=new_number)
+            )
+            output_zip_buffer = io.BytesIO(converted)
             
             await interaction.followup.send(
                 "✅ Conversion complete!",
@@ -478,54 +328,13 @@ class DownloadCommands(commands.Cog):
         
         try:
             zip_content = await zip_file.read()
-            input_zip = zipfile.ZipFile(io.BytesIO(zip_content))
-            output_zip_buffer = io.BytesIO()
-            output_zip = zipfile.ZipFile(output_zip_buffer, 'w', zipfile.ZIP_DEFLATED)
-            
-            # Determine folder name
-            folder_name = None
-            for name in input_zip.namelist():
-                if name.endswith('/'):
-                    folder_name = name
-                    break
-            if not folder_name:
-                folder_name = zip_file.filename.replace('.zip', '') + '/'
-                
-            for file_info in input_zip.infolist():
-                if file_info.filename.endswith('/'):
-                    continue
-                    
-                filename = os.path.basename(file_info.filename)
-                
-                # Skip macOS metadata files
-                if '__MACOSX' in file_info.filename or filename.startswith('._'):
-                    continue
-
-                new_filename = filename
-                
-                # Regex to parse the filename: Prefix + Number + Suffix
-                # e.g., "SHRA5A" -> Prefix="SHRA", Num="5", Suffix="A"
-                match = re.match(r'([A-Z]+)(\d+)(.*)', filename)
-                
-                if match:
-                    prefix_part, num_part, suffix_part = match.groups()
-                    
-                    # 1. Change 'A' in the prefix to 'R' (only if it ends with A)
-                    if prefix_part.endswith('A'):
-                        prefix_part = prefix_part[:-1] + 'R'
-                    
-                    # 2. Change number if provided
-                    if new_number is not None:
-                        num_part = str(new_number)
-                        
-                    new_filename = f"{prefix_part}{num_part}{suffix_part}"
-
-                file_content = input_zip.read(file_info.filename)
-                output_zip.writestr(folder_name + new_filename, file_content)
-                
-            input_zip.close()
-            output_zip.close()
-            output_zip_buffer.seek(0)
+            default_folder = zip_file.filename.replace('.zip', '') + '/'
+            converted = await cpu_executor.run(
+                toybox_zip.rename_members, zip_content, default_folder,
+                functools.partial(toybox_zip.to_toybox_name, new_number=new_number),
+                skip_macos_metadata=True
+            )
+            output_zip_buffer = io.BytesIO(converted)
             
             await interaction.followup.send(
                 "✅ Conversion complete!",
@@ -548,36 +357,12 @@ class DownloadCommands(commands.Cog):
         
         try:
             zip_content = await zip_file.read()
-            input_zip = zipfile.ZipFile(io.BytesIO(zip_content))
-            output_zip_buffer = io.BytesIO()
-            output_zip = zipfile.ZipFile(output_zip_buffer, 'w', zipfile.ZIP_DEFLATED)
-            
-            folder_name = None
-            for name in input_zip.namelist():
-                if name.endswith('/'):
-                    folder_name = name
-                    break
-            if not folder_name:
-                folder_name = zip_file.filename.replace('.zip', '') + '/'
-                
-            for file_info in input_zip.infolist():
-                if file_info.filename.endswith('/'):
-                    continue
-                    
-                filename = os.path.basename(file_info.filename)
-                new_filename = filename
-                
-                match = re.match(r'([A-Z]+)(\d+)(.*)', filename)
-                if match:
-                    prefix, num, suffix = match.groups()
-                    new_filename = f"{prefix}{new_number}{suffix}"
-                    
-                file_content = input_zip.read(file_info.filename)
-                output_zip.writestr(folder_name + new_filename, file_content)
-                
-            input_zip.close()
-            output_zip.close()
-            output_zip_buffer.seek(0)
+            default_folder = zip_file.filename.replace('.zip', '') + '/'
+            renumbered = await cpu_executor.run(
+                toybox_zip.rename_members, zip_content, default_folder,
+                functools.partial(toybox_zip.renumbered_name, new_number=new_number)
+            )
+            output_zip_buffer = io.BytesIO(renumbered)
             
             await interaction.followup.send(
                 f"✅ Number changed to {new_number}!",
@@ -609,33 +394,12 @@ class DownloadCommands(commands.Cog):
             for idx, file in enumerate(files):
                 new_number = int(num_list[idx])
                 zip_content = await file.read()
-                input_zip = zipfile.ZipFile(io.BytesIO(zip_content))
-                output_zip_buffer = io.BytesIO()
-                output_zip = zipfile.ZipFile(output_zip_buffer, 'w', zipfile.ZIP_DEFLATED)
-                
-                folder_name = None
-                for name in input_zip.namelist():
-                    if name.endswith('/'):
-                        folder_name = name
-                        break
-                if not folder_name:
-                    folder_name = file.filename.replace('.zip', '') + '/'
-                    
-                for file_info in input_zip.infolist():
-                    if file_info.filename.endswith('/'):
-                        continue
-                    filename = os.path.basename(file_info.filename)
-                    new_filename = filename
-                    match = re.match(r'([A-Z]+)(\d+)(.*)', filename)
-                    if match:
-                        prefix, num, suffix = match.groups()
-                        new_filename = f"{prefix}{new_number}{suffix}"
-                    file_content = input_zip.read(file_info.filename)
-                    output_zip.writestr(folder_name + new_filename, file_content)
-                    
-                input_zip.close()
-                output_zip.close()
-                output_zip_buffer.seek(0)
+                default_folder = file.filename.replace('.zip', '') + '/'
+                renumbered = await cpu_executor.run(
+                    toybox_zip.rename_members, zip_content, default_folder,
+                    functools.partial(toybox_zip.renumbered_name, new_number=new_number)
+                )
+                output_zip_buffer = io.BytesIO(renumbered)
                 processed_files.append(discord.File(output_zip_buffer, filename=f"renumbered_{file.filename}"))
                 
             await interaction.followup.send("✅ Batch processing complete!", files=processed_files)
@@ -645,60 +409,39 @@ class DownloadCommands(commands.Cog):
 
     @app_commands.command(name="meta", description="Extracts metadata from ZIP, EHRR or EHRA file.")
     async def meta(self, interaction: discord.Interaction, ehr_file: discord.Attachment):
+        # Reading the file waits for a worker when the pool is busy
+        await interaction.response.defer()
         try:
-            with tempfile.TemporaryDirectory() as temp_dir:
-                file_path = f"{temp_dir}/{ehr_file.filename}"
-                
-                async with aiofiles.open(file_path, 'wb') as f:
-                    await f.write(await ehr_file.read())
-                
-                extracted_file_path = None
-                
-                if ehr_file.filename.endswith(".zip"):
-                    with zipfile.ZipFile(file_path, 'r') as zip_ref:
-                        zip_ref.extractall(temp_dir)
-                        for root, _, files in os.walk(temp_dir):
-                            for file in files:
-                                if file.startswith("EHRR") or file.startswith("EHRA"):
-                                    extracted_file_path = os.path.join(root, file)
-                                    break
-                            if extracted_file_path:
-                                break
-                else:
-                    extracted_file_path = file_path
-                
-                if not extracted_file_path:
-                    await interaction.response.send_message("No valid EHRR or EHRA file found in the ZIP!", ephemeral=True)
-                    return
-                
-                async with aiofiles.open(extracted_file_path, 'rb') as f:
-                    file_bytes = await f.read()
-                    
-                decompressed_data = zlib.decompress(file_bytes[CONTENT_OFFSET:]).decode('utf-8').rstrip('\x00')
-                
-                auth_name_match = re.search(AUTHOREDNAME_PATTERN, decompressed_data)
-                auth_desc_match = re.search(AUTHOREDDESC_PATTERN, decompressed_data)
-                date_string_match = re.search(DATESTRING_PATTERN, decompressed_data)
-                
-                metadata_text = "**Metadata Extracted:**\n"
-                if auth_name_match:
-                    metadata_text += f"**Name:** {auth_name_match.group(1)}\n"
-                if auth_desc_match:
-                    metadata_text += f"**Description:** {auth_desc_match.group(1)}\n"
-                if date_string_match:
-                    metadata_text += f"**Date:** {date_string_match.group(1)}\n"
-                
-                if not (auth_name_match or auth_desc_match or date_string_match):
-                    metadata_text = "No metadata found in the file."
-                
-                await interaction.response.send_message(metadata_text)
+            file_bytes = await ehr_file.read()
+            
+            if ehr_file.filename.endswith(".zip"):
+                metadata = await cpu_executor.run(read_zip_metadata, file_bytes)
+            else:
+                metadata = await cpu_executor.run(read_metadata, file_bytes)
+            
+            if metadata is None:
+                await interaction.followup.send("No valid EHRR or EHRA file found in the ZIP!", ephemeral=True)
+                return
+            
+            metadata_text = "**Metadata Extracted:**\n"
+            if metadata.name:
+                metadata_text += f"**Name:** {metadata.name}\n"
+            if metadata.description:
+                metadata_text += f"**Description:** {metadata.description}\n"
+            if metadata.date:
+                metadata_text += f"**Date:** {metadata.date}\n"
+            
+            if not (metadata.name or metadata.description or metadata.date):
+                metadata_text = "No metadata found in the file."
+            
+            await interaction.followup.send(metadata_text)
         
         except zipfile.BadZipFile:
-            await interaction.response.send_message("Error: Invalid ZIP file!", ephemeral=True)
+            await interaction.followup.send("Error: Invalid ZIP file!", ephemeral=True)
         except zlib.error:
-            await interaction.response.send_message("Error: Could not decompress the file!", ephemeral=True)
+            await interaction.followup.send("Error: Could not decompress the file!", ephemeral=True)
         except Exception as e:
-            await interaction.response.send_message(f"An error occurred: {str(e)}", ephemeral=True)
+            await interaction.followup.send(f"An error occurred: {str(e)}", ephemeral=True)
 
     @app_commands.command(name="add_to_bundle", description="Collect toyboxes from Discord threads and create a renumbered bundle.")
     @app_commands.describe(numbers="Comma-separated sequence of numbers (e.g., '243, 244, 246, 248')")
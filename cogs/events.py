@@ -6,7 +6,10 @@ import random
 import traceback
 import google.generativeai as genai
 from services.rag_service import rag_service
+from services.query_expander import query_expander
+from services.context_builder import build_context, estimate_tokens
 from views.counting_views import CountingView
+from utils.answer_stream import StreamingAnswer, iterate_in_thread
 from utils.logger import logger
 import config
 
@@ -14,6 +17,43 @@ class Events(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
+    async def refine_query(self, original_query: str) -> str:
+        """Asks the LLM for the keywords of a request; the request itself if that fails."""
+        search_query = original_query
+        try:
+            refinement_prompt = f"""
+                    Extract the essential keywords from the following user request.
+                    Focus on character names, game genres (like 'racing', 'combat'), or franchises (like 'Marvel').
+                    Ignore conversational filler like "I want to play" or "can you find me".
+                    Return ONLY the keywords, separated by a space.
+
+                    User request: "{original_query}"
+                    
+                    Keywords:
+                    """
+            refinement_response = await asyncio.to_thread(
+                self.bot.gemini_model.generate_content,
+                refinement_prompt,
+                generation_config=genai.types.GenerationConfig(temperature=0.0)
+            )
+            
+            search_query = original_query # Default fallback
+            if refinement_response and hasattr(refinement_response, 'parts') and refinement_response.parts:
+                try:
+                    # Verify if there is text content before accessing
+                    if refinement_response.text:
+                        search_query = refinement_response.text.strip()
+                        logger.info(f"Query Refinement: Original='{original_query}' -> Refined='{search_query}'")
+                except ValueError:
+                     logger.warning(f"Query Refinement: Response blocked or invalid (Finish Reason: {refinement_response.candidates[0].finish_reason}). Using original query.")
+            else:
+                logger.info(f"Query Refinement: No valid text parts returned. Using original query.")
+
+        except Exception as e:
+            logger.error(f"⚠️ Error during query refinement: {e}. Falling back to original query.")
+            search_query = original_query
+        return search_query
+
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
         # --- Part 1: AI Chat Logic ---
@@ -54,39 +94,14 @@ class Events(commands.Cog):
             
             try:
                 # --- STEP 0: REFINE QUERY ---
-                search_query = original_query
-                try:
-                    refinement_prompt = f"""
-                    Extract the essential keywords from the following user request.
-                    Focus on character names, game genres (like 'racing', 'combat'), or franchises (like 'Marvel').
-                    Ignore conversational filler like "I want to play" or "can you find me".
-                    Return ONLY the keywords, separated by a space.
-
-                    User request: "{original_query}"
-                    
-                    Keywords:
-                    """
-                    refinement_response = await asyncio.to_thread(
-                        self.bot.gemini_model.generate_content,
-                        refinement_prompt,
-                        generation_config=genai.types.GenerationConfig(temperature=0.0)
-                    )
-                    
-                    search_query = original_query # Default fallback
-                    if refinement_response and hasattr(refinement_response, 'parts') and refinement_response.parts:
-                        try:
-                            # Verify if there is text content before accessing
-                            if refinement_response.text:
-                                search_query = refinement_response.text.strip()
-                                logger.info(f"Query Refinement: Original='{original_query}' -> Refined='{search_query}'")
-                        except ValueError:
-                             logger.warning(f"Query Refinement: Response blocked or invalid (Finish Reason: {refinement_response.candidates[0].finish_reason}). Using original query.")
-                    else:
-                        logger.info(f"Query Refinement: No valid text parts returned. Using original query.")
-
-                except Exception as e:
-                    logger.error(f"⚠️ Error during query refinement: {e}. Falling back to original query.")
-                    search_query = original_query
+                # Expand the query locally with the knowledge base first; only ask the LLM
+                # to extract keywords when the local matcher doesn't recognise the subject
+                expansion = query_expander.expand(original_query)
+                if expansion.confident:
+                    search_query = expansion.search_query
+                    logger.info(f"Query Expansion: Original='{original_query}' -> Expanded='{search_query}' (LLM refinement skipped)")
+                else:
+                    search_query = await self.refine_query(original_query)
 
                 # --- STEP 1: RETRIEVE CONTEXT ---
                 retrieved_toyboxes = await rag_service.retrieve_toyboxes(
@@ -109,12 +124,23 @@ class Events(commands.Cog):
                     await thinking_message.edit(embed=no_results_embed)
                     return
 
-                # --- STEP 3: BUILD CONTEXT & PROMPT ---
-                context_str = "Found these potentially relevant Toyboxes:\n\n"
-                for i, tb in enumerate(retrieved_toyboxes, 1):
-                    context_str += f"--- Toybox {i} ---\nName: {tb['name']}\nDescription: {tb['description']}\nLink: <{tb['url']}>\n\n"
+                # --- STEP 2b: SERVE A CACHED ANSWER ---
+                # The same (or a near-identical) question that retrieved the same toyboxes
+                # from the same database version gets the stored answer
+                retrieved_ids = [tb['id'] for tb in retrieved_toyboxes]
+                db_version = rag_service.db_version
+                cached_answer = await rag_service.answer_cache.get(search_query, retrieved_ids, db_version)
+                if cached_answer:
+                    elapsed_time = time.time() - start_time
+                    await StreamingAnswer(
+                        thinking_message,
+                        discord.Embed(title="🦆 Here's what I found!", color=discord.Color.green())
+                    ).show(cached_answer, f"Search completed in {elapsed_time:.2f} seconds (cached answer).")
+                    return
 
-                prompt = f"""You are a specialized, friendly and helpful assistant for the Disney Infinity community Discord server. Your goal is to help users find Toyboxes shared in the forum based on their questions, using ONLY the provided context. Be conversational and enthusiastic!
+                # --- STEP 3: BUILD CONTEXT & PROMPT ---
+                def render_prompt(context_str):
+                    return f"""You are a specialized, friendly and helpful assistant for the Disney Infinity community Discord server. Your goal is to help users find Toyboxes shared in the forum based on their questions, using ONLY the provided context. Be conversational and enthusiastic!
 
 **Background:**
 - The user's original request was: "{original_query}"
@@ -153,67 +179,84 @@ class Events(commands.Cog):
 **Your Answer (Respond following all instructions, focusing *only* on relevant items from the provided context):**
 """
 
+                # Whatever the instructions leave of the prompt budget goes to the toybox descriptions
+                context_budget = config.PROMPT_TOKEN_BUDGET - estimate_tokens(render_prompt(""))
+                context_str = build_context(retrieved_toyboxes, context_budget, config.CONTEXT_ITEM_TOKENS)
+                prompt = render_prompt(context_str)
+                logger.info(f"RAG prompt: ~{estimate_tokens(prompt)} tokens (budget {config.PROMPT_TOKEN_BUDGET}).")
+
                 # --- STEP 4: GENERATE AND SEND RESPONSE ---
-                response = await asyncio.to_thread(
-                    self.bot.gemini_model.generate_content,
-                    prompt,
-                    generation_config=genai.types.GenerationConfig(temperature=0.5),
-                    safety_settings=[
-                       {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-                       {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-                       {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-                       {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"}
-                    ]
+                # Streamed chunks are shown as they arrive; without streaming, the whole
+                # response is the only chunk
+                def generate():
+                    response = self.bot.gemini_model.generate_content(
+                        prompt,
+                        stream=config.AI_CHAT_STREAMING,
+                        generation_config=genai.types.GenerationConfig(temperature=0.5),
+                        safety_settings=[
+                           {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+                           {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+                           {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+                           {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"}
+                        ]
+                    )
+                    return response if config.AI_CHAT_STREAMING else [response]
+
+                answer_stream = StreamingAnswer(
+                    thinking_message,
+                    discord.Embed(title="🦆 Here's what I found!", color=discord.Color.green()),
+                    interval=config.AI_CHAT_STREAM_EDIT_INTERVAL
                 )
+                response = None
+                text_error = None
+                stream = iterate_in_thread(generate)
+                try:
+                    async for response in stream:
+                        # Try to get the text; a blocked chunk raises instead
+                        try:
+                            await answer_stream.append(response.text)
+                        except (AttributeError, ValueError) as e:
+                            text_error = e
+                            break
+                finally:
+                    # Stops the worker thread from reading the rest of the stream
+                    await stream.aclose()
 
                 # Check if response was blocked or empty
-                if not response or not hasattr(response, 'text'):
-                    block_reason = "Unknown"
-                    if hasattr(response, "prompt_feedback") and response.prompt_feedback:
-                        block_reason = str(getattr(response.prompt_feedback, "block_reason", "Unknown"))
-                    await thinking_message.edit(embed=discord.Embed(
-                        title="⚠️ Waaak!",
-                        description=f"My response got filtered (Reason: `{block_reason}`). Could you ask differently? 🦆",
-                        color=discord.Color.orange()
-                    ))
-                    return
-
-                # Try to get the text, handle if it's empty
-                try:
-                    answer = response.text.strip()
-                    if not answer:
+                if not answer_stream.text.strip():
+                    prompt_feedback = getattr(response, "prompt_feedback", None)
+                    block_reason = getattr(prompt_feedback, "block_reason", None) if prompt_feedback else None
+                    if response is None or block_reason:
+                        await thinking_message.edit(embed=discord.Embed(
+                            title="⚠️ Waaak!",
+                            description=f"My response got filtered (Reason: `{block_reason or 'Unknown'}`). Could you ask differently? 🦆",
+                            color=discord.Color.orange()
+                        ))
+                    elif text_error is not None:
+                        logger.error(f"Error accessing response.text: {text_error}")
+                        await thinking_message.edit(embed=discord.Embed(
+                            title="⚠️ Oops!",
+                            description="Something went wrong generating my response. Please try again! 🦆",
+                            color=discord.Color.orange()
+                        ))
+                    else:
                         await thinking_message.edit(embed=discord.Embed(
                             title="⚠️ Hmm...",
                             description="I couldn't generate a response. Please try rephrasing your question! 🦆",
                             color=discord.Color.orange()
                         ))
-                        return
-                except (AttributeError, ValueError) as e:
-                    logger.error(f"Error accessing response.text: {e}")
-                    await thinking_message.edit(embed=discord.Embed(
-                        title="⚠️ Oops!",
-                        description="Something went wrong generating my response. Please try again! 🦆",
-                        color=discord.Color.orange()
-                    ))
                     return
 
-                elapsed_time = time.time() - start_time
-
-                final_embed = discord.Embed(
-                    title="🦆 Here's what I found!",
-                    description=answer[:4096] if len(answer) <= 4096 else answer[:4093] + "...",
-                    color=discord.Color.green()
-                ).set_footer(text=f"Search completed in {elapsed_time:.2f} seconds.")
+                if text_error is not None:
+                    logger.warning(f"Answer stream stopped early: {text_error}")
+                else:
+                    await rag_service.answer_cache.put(search_query, retrieved_ids, db_version, answer_stream.text.strip())
 
-                await thinking_message.edit(embed=final_embed)
-
-                if len(answer) > 4096:
-                    remaining_text = "[...]\n" + answer[4096:]
-                    MAX_MSG_LENGTH = 2000
-                    remaining_chunks = [remaining_text[i:i+MAX_MSG_LENGTH] for i in range(0, len(remaining_text), MAX_MSG_LENGTH)]
-                    for chunk in remaining_chunks:
-                        await message.channel.send(chunk)
-                        await asyncio.sleep(0.6)
+                elapsed_time = time.time() - start_time
+                first_token_time = answer_stream.first_token_at - start_time
+                await answer_stream.finish(
+                    f"Search completed in {elapsed_time:.2f} seconds. First words after {first_token_time:.2f} seconds."
+                )
             except Exception as e:
                 logger.error(f"❌ Unexpected Error during RAG processing in thread {message.channel.id}:")
                 traceback.print_exc()
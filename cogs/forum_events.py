@@ -0,0 +1,60 @@
+import discord
+from discord.ext import commands
+import config
+from services.thread_cache import thread_cache, describe_thread
+from utils.logger import logger
+
+def is_toybox_thread(channel) -> bool:
+    return isinstance(channel, discord.Thread) and channel.parent_id == config.FORUM_CHANNEL_ID
+
+class ForumEvents(commands.Cog):
+    """Keeps the thread cache current from gateway events of the toybox forum."""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    @commands.Cog.listener()
+    async def on_thread_create(self, thread: discord.Thread):
+        if not is_toybox_thread(thread):
+            return
+        try:
+            await thread_cache.refresh(thread)
+        except discord.HTTPException as e:
+            logger.warning(f"⚠️ Could not read new thread {thread.id} for the thread cache: {e}")
+
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        # The starter message of a forum post can arrive after the thread itself
+        if is_toybox_thread(message.channel) and message.id == message.channel.id:
+            thread_cache.put(describe_thread(message.channel, message))
+
+    @commands.Cog.listener()
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent):
+        # Attachments of a starter message can change when it is edited
+        if payload.message_id != payload.channel_id or thread_cache.get(payload.channel_id) is None:
+            return
+        thread = self.bot.get_channel(payload.channel_id)
+        if not is_toybox_thread(thread):
+            return
+        try:
+            await thread_cache.refresh(thread, fetch=True)
+        except discord.HTTPException as e:
+            logger.warning(f"⚠️ Could not re-read edited thread {thread.id} for the thread cache: {e}")
+
+    @commands.Cog.listener()
+    async def on_thread_update(self, before: discord.Thread, after: discord.Thread):
+        if not is_toybox_thread(after):
+            return
+        if not thread_cache.update_metadata(after):
+            try:
+                await thread_cache.refresh(after)
+            except discord.HTTPException as e:
+                logger.warning(f"⚠️ Could not read thread {after.id} for the thread cache: {e}")
+
+    @commands.Cog.listener()
+    async def on_raw_thread_delete(self, payload: discord.RawThreadDeleteEvent):
+        if payload.parent_id == config.FORUM_CHANNEL_ID:
+            thread_cache.remove_many([payload.thread_id])
+
+async def setup(bot):
+    await bot.add_cog(ForumEvents(bot))
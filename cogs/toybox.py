@@ -427,20 +427,8 @@ class ToyboxCommands(commands.Cog):
         thread_id = str(interaction.channel.id)
         
         try:
-            import json
-            with open(config.TOYBOX_DATA_FILE, "r", encoding='utf-8') as f:
-                toybox_list = json.load(f)
-            
-            found = False
-            for toybox in toybox_list:
-                if str(toybox["id"]) == thread_id:
-                    toybox["tags"] = [tag]
-                    found = True
-                    break
-            
-            if found:
-                with open(config.TOYBOX_DATA_FILE, "w", encoding='utf-8') as f:
-                    json.dump(toybox_list, f, indent=4, ensure_ascii=False)
+            from services.toybox_catalog import toybox_catalog
+            if toybox_catalog.set_tags(thread_id, [tag]):
                 await interaction.followup.send(f"✅ Updated tag for this thread to {tag}", ephemeral=True)
             else:
                 await interaction.followup.send("❌ Thread not found in database. Try running /update_toyboxes first", ephemeral=True)
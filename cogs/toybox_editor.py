@@ -4,11 +4,14 @@ from discord import app_commands
 import os
 import tempfile
 import zipfile
-import asyncio
 import shutil
 import traceback
-import io
+import zlib
 
+import config
+
+from services import save_codec
+from services.cpu_executor import cpu_executor
 
 from services.file_parser import (
     analyze_and_parse_toybox_file, 
@@ -75,32 +78,21 @@ class ToyboxEditorCog(commands.Cog):
                 await interaction.followup.send("❌ No SRR files (e.g., SRR2A) found in the ZIP.", ephemeral=True)
                 return
             
-            script_path = os.path.join(os.getcwd(), 'inflate.py')
-            if not os.path.exists(script_path):
-                shutil.rmtree(temp_dir)
-                await interaction.followup.send(f"❌ `inflate.py` not found in the bot's root directory: {script_path}", ephemeral=True)
-                return
-            
             # If only one SRR file, process it directly
             if len(srr_files) == 1:
                 srr_file = srr_files[0]
                 srr_path = srr_file['path']
-                txt_path = os.path.join(files_root, f"{srr_file['name']}.txt")
                 
                 # Decompress the SRR file
-                proc = await asyncio.create_subprocess_exec(
-                    'python3', script_path, '-d', srr_path, txt_path,
-                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-                )
-                _, stderr = await proc.communicate()
-                if proc.returncode != 0:
+                try:
+                    _, payload = await cpu_executor.run(save_codec.decode_file, srr_path)
+                except (ValueError, zlib.error) as e:
                     shutil.rmtree(temp_dir)
-                    await interaction.followup.send(f"❌ Decompression failed: {stderr.decode()}", ephemeral=True)
+                    await interaction.followup.send(f"❌ Decompression failed: {e}", ephemeral=True)
                     return
                 
                 # Parse the decompressed file
-                with open(txt_path, 'rb') as f:
-                    parsed_data = analyze_and_parse_toybox_file(f.read())
+                parsed_data = analyze_and_parse_toybox_file(payload)
                 
                 if not parsed_data['toys']:
                     shutil.rmtree(temp_dir)
@@ -112,9 +104,7 @@ class ToyboxEditorCog(commands.Cog):
                     'temp_dir': temp_dir,
                     'files_root': files_root,
                     'original_zip_name': zip_file.filename,
-                    'srr_path': srr_path,
-                    'txt_path': txt_path,
-                    'script_path': script_path
+                    'srr_path': srr_path
                 }
                 view = ToyboxEditView(parsed_data, srr_file['name'], 'zip', context)
                 await interaction.followup.send(embed=view.create_embed(), view=view)
@@ -123,23 +113,10 @@ class ToyboxEditorCog(commands.Cog):
                 # Multiple SRR files - check each one for toys and let user choose
                 for srr_file in srr_files:
                     try:
-                        srr_path = srr_file['path']
-                        txt_path = os.path.join(files_root, f"{srr_file['name']}.txt")
-                        
                         # Decompress to check for toys
-                        proc = await asyncio.create_subprocess_exec(
-                            'python3', script_path, '-d', srr_path, txt_path,
-                            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-                        )
-                        _, stderr = await proc.communicate()
-                        
-                        if proc.returncode == 0:
-                            # Successfully decompressed, check for toys
-                            with open(txt_path, 'rb') as f:
-                                parsed_data = analyze_and_parse_toybox_file(f.read())
-                            srr_file['toy_count'] = len(parsed_data['toys'])
-                        else:
-                            srr_file['toy_count'] = 0
+                        _, payload = await cpu_executor.run(save_codec.decode_file, srr_file['path'])
+                        parsed_data = analyze_and_parse_toybox_file(payload)
+                        srr_file['toy_count'] = len(parsed_data['toys'])
                     except Exception:
                         srr_file['toy_count'] = 0
                 
@@ -152,7 +129,7 @@ class ToyboxEditorCog(commands.Cog):
                     return
                 
                 # Create selection view
-                view = SRRFileSelectView(srr_files, temp_dir, files_root, zip_file.filename, script_path)
+                view = SRRFileSelectView(srr_files, temp_dir, files_root, zip_file.filename)
                 await interaction.followup.send(embed=view.create_embed(), view=view)
                 
         except Exception as e:
@@ -194,30 +171,19 @@ class ToyboxEditorCog(commands.Cog):
                 await interaction.followup.send("❌ No EHRR files (e.g., EHRR19) found in the ZIP.", ephemeral=True)
                 return
             
-            script_path = os.path.join(os.getcwd(), 'inflate.py')
-            if not os.path.exists(script_path):
-                shutil.rmtree(temp_dir)
-                await interaction.followup.send(f"❌ `inflate.py` not found in the bot's root directory.", ephemeral=True)
-                return
-
             # If only one EHRR file, process it directly
             if len(ehrr_files) == 1:
                 ehrr_file = ehrr_files[0]
                 ehrr_path = ehrr_file['path']
-                txt_path = os.path.join(files_root, f"{ehrr_file['name']}.txt")
                 
-                proc = await asyncio.create_subprocess_exec(
-                    'python3', script_path, '-d', ehrr_path, txt_path,
-                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-                )
-                _, stderr = await proc.communicate()
-                if proc.returncode != 0:
+                try:
+                    _, payload = await cpu_executor.run(save_codec.decode_file, ehrr_path)
+                except (ValueError, zlib.error) as e:
                     shutil.rmtree(temp_dir)
-                    await interaction.followup.send(f"❌ Decompression failed: {stderr.decode()}", ephemeral=True)
+                    await interaction.followup.send(f"❌ Decompression failed: {e}", ephemeral=True)
                     return
                 
-                with open(txt_path, 'rb') as f:
-                    parsed_data = analyze_and_parse_toybox_file(f.read())
+                parsed_data = analyze_and_parse_toybox_file(payload)
                 
                 if not parsed_data['toys']:
                     shutil.rmtree(temp_dir)
@@ -228,16 +194,14 @@ class ToyboxEditorCog(commands.Cog):
                     'temp_dir': temp_dir,
                     'files_root': files_root,
                     'original_zip_name': zip_file.filename,
-                    'srr_path': ehrr_path,
-                    'txt_path': txt_path,
-                    'script_path': script_path
+                    'srr_path': ehrr_path
                 }
                 view = ToyboxEditView(parsed_data, ehrr_file['name'], 'zip', context)
                 await interaction.followup.send(embed=view.create_embed(), view=view)
             
             else:
                 # Multiple EHRR files
-                view = EHRRFileSelectView(ehrr_files, temp_dir, files_root, zip_file.filename, script_path)
+                view = EHRRFileSelectView(ehrr_files, temp_dir, files_root, zip_file.filename)
                 await interaction.followup.send(embed=view.create_embed(), view=view)
 
         except Exception as e:
@@ -262,26 +226,22 @@ class ToyboxEditorCog(commands.Cog):
         temp_dir = tempfile.mkdtemp()
         try:
             zip_path = os.path.join(temp_dir, toybox_zip.filename)
-            zip_data = await toybox_zip.read()
-            
             screenshot_updated = False
             
-            # 1. Process Screenshot if provided
+            # 1. Process Screenshot if provided (the modified zip is written to zip_path)
             if screenshot:
                 try:
+                    zip_data = await toybox_zip.read()
                     image_data = await screenshot.read()
-                    from services.image_injector_service import ImageInjectorService
-                    injector = ImageInjectorService()
-                    zip_data, _ = injector.process_toybox(zip_data, image_data)
+                    from services.image_injector_service import replace_screenshot
+                    await cpu_executor.run(replace_screenshot, zip_data, image_data, config.SCREENSHOT_DXT1_QUALITY, zip_path)
                     screenshot_updated = True
                 except Exception as e:
                     shutil.rmtree(temp_dir)
                     await interaction.followup.send(f"❌ Failed to process screenshot: {e}", ephemeral=True)
                     return
-
-            # Save zip (either modified or original) to temp dir
-            with open(zip_path, 'wb') as f:
-                f.write(zip_data)
+            else:
+                await toybox_zip.save(zip_path)
 
             # 2. Process Metadata (EHRR)
             extract_folder = os.path.join(temp_dir, 'extracted')
@@ -302,29 +262,18 @@ class ToyboxEditorCog(commands.Cog):
             
             # Case A: EHRR Found - Launch Editor
             if ehrr_files:
-                script_path = os.path.join(os.getcwd(), 'inflate.py')
-                if not os.path.exists(script_path):
-                    shutil.rmtree(temp_dir)
-                    await interaction.followup.send(f"❌ `inflate.py` not found.", ephemeral=True)
-                    return
-
                 if len(ehrr_files) == 1:
                     ehrr_file = ehrr_files[0]
                     ehrr_path = ehrr_file['path']
-                    txt_path = os.path.join(files_root, f"{ehrr_file['name']}.txt")
                     
-                    proc = await asyncio.create_subprocess_exec(
-                        'python3', script_path, '-d', ehrr_path, txt_path,
-                        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-                    )
-                    _, stderr = await proc.communicate()
-                    if proc.returncode != 0:
+                    try:
+                        _, payload = await cpu_executor.run(save_codec.decode_file, ehrr_path)
+                    except (ValueError, zlib.error) as e:
                         shutil.rmtree(temp_dir)
-                        await interaction.followup.send(f"❌ Decompression failed: {stderr.decode()}", ephemeral=True)
+                        await interaction.followup.send(f"❌ Decompression failed: {e}", ephemeral=True)
                         return
                     
-                    with open(txt_path, 'rb') as f:
-                        parsed_data = analyze_and_parse_toybox_file(f.read())
+                    parsed_data = analyze_and_parse_toybox_file(payload)
                     
                     if not parsed_data['toys']:
                         # Fallback if no editable metadata but screenshot updated
@@ -342,16 +291,14 @@ class ToyboxEditorCog(commands.Cog):
                         'temp_dir': temp_dir,
                         'files_root': files_root,
                         'original_zip_name': toybox_zip.filename,
-                        'srr_path': ehrr_path,
-                        'txt_path': txt_path,
-                        'script_path': script_path
+                        'srr_path': ehrr_path
                     }
                     view = ToyboxEditView(parsed_data, ehrr_file['name'], 'zip', context)
                     await interaction.followup.send(embed=view.create_embed(), view=view)
                 
                 else:
                     # Multiple EHRR files
-                    view = EHRRFileSelectView(ehrr_files, temp_dir, files_root, toybox_zip.filename, script_path)
+                    view = EHRRFileSelectView(ehrr_files, temp_dir, files_root, toybox_zip.filename)
                     await interaction.followup.send(embed=view.create_embed(), view=view)
 
             # Case B: No EHRR Found
@@ -388,14 +335,15 @@ class ToyboxEditorCog(commands.Cog):
             image_data = await screenshot.read()
             
             # Process
-            from services.image_injector_service import ImageInjectorService
-            injector = ImageInjectorService()
+            from services.image_injector_service import replace_screenshot
             
-            modified_zip_data, filename = injector.process_toybox(zip_data, image_data)
-            
-            # Send back
-            file = discord.File(io.BytesIO(modified_zip_data), filename=filename)
-            await interaction.followup.send(f"✅ Successfully replaced screenshot in `{toybox_zip.filename}`!", file=file, ephemeral=True)
+            with tempfile.TemporaryDirectory() as temp_dir:
+                output_path = os.path.join(temp_dir, "modified_toybox.zip")
+                filename = await cpu_executor.run(replace_screenshot, zip_data, image_data, config.SCREENSHOT_DXT1_QUALITY, output_path)
+                
+                # Send back
+                file = discord.File(output_path, filename=filename)
+                await interaction.followup.send(f"✅ Successfully replaced screenshot in `{toybox_zip.filename}`!", file=file, ephemeral=True)
             
         except Exception as e:
             await interaction.followup.send(f"❌ An error occurred: {e}\n```py\n{traceback.format_exc()}\n```", ephemeral=True)
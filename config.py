@@ -15,10 +15,15 @@ GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 
 # File Paths
 KNOWLEDGE_BASE_FILE = "knowledge_base.json"
-TOYBOX_DATA_FILE = "toybox_data.json"
+TOYBOX_DATA_FILE = "toybox_data.json"  # Legacy toybox database, imported into TOYBOX_DB_PATH once
+TOYBOX_DB_PATH = "toybox_catalog.db"
+TOYBOX_SYNC_STATE_FILE = "toybox_sync_state.json"  # Watermark of the last forum sync
 BLACKLIST_FILE = "blacklisted_threads.json"
 RATINGS_FILE = "ratings.json"
 CHROMA_DB_PATH = "chroma_db"
+EMBEDDING_CACHE_PATH = "embedding_cache.db"
+VECTOR_INDEX_PATH = "vector_index"
+THREAD_CACHE_PATH = "thread_cache.db"  # Starter message facts of the toybox forum threads
 
 # Channel IDs
 TARGET_PURGE_CHANNEL_ID = 1378062939566637066
@@ -28,3 +33,36 @@ FORUM_CHANNEL_ID = 1253093395920851054
 VALID_TAGS = ["Disney", "Marvel", "Star Wars", "Other"]
 GEMINI_MODEL_NAME = 'gemini-2.5-flash'
 EMBEDDING_MODEL_NAME = 'models/embedding-001'
+EMBEDDING_BATCH_SIZE = 50  # Documents per embedding request (Gemini allows up to 100)
+EMBEDDING_CONCURRENCY = 4  # Embedding requests in flight during ingestion
+# Thread starter messages fetched at once during a toybox sync. Each thread is its own Discord
+# rate limit bucket, so this mostly stays clear of the global limit (50 requests/second)
+STARTER_FETCH_CONCURRENCY = 10
+QUERY_EMBEDDING_CACHE_SIZE = 512  # Search query embeddings kept in memory
+QUERY_EMBEDDING_TTL = 7 * 24 * 3600  # Seconds before a cached query embedding is fetched again
+QUERY_EMBEDDING_DISK_CACHE = True  # Also keep query embeddings in EMBEDDING_CACHE_PATH across restarts
+
+# Vector store behind the RAG search: "chroma" (CHROMA_DB_PATH) or "numpy" (VECTOR_INDEX_PATH, see migrate_vectors.py)
+VECTOR_STORE_BACKEND = os.getenv('VECTOR_STORE_BACKEND', 'chroma')
+VECTOR_SEARCH_TIMEOUT = 4.0  # Seconds to wait for the query embedding before answering from the lexical index alone
+HYBRID_RRF_K = 60  # Reciprocal rank fusion constant for merging lexical and vector rankings
+
+# AI chat answers: stream the response into the thinking message, editing it at most every N seconds
+AI_CHAT_STREAMING = True
+AI_CHAT_STREAM_EDIT_INTERVAL = 1.2
+
+# Answer cache for repeated AI chat questions (cleared whenever the toybox database changes)
+ANSWER_CACHE_SIZE = 256
+ANSWER_CACHE_TTL = 24 * 3600  # Seconds
+ANSWER_CACHE_SIMILARITY = 0.95  # Query embedding cosine similarity that counts as the same question
+
+# RAG prompt size: ceiling for the whole prompt and for each toybox description in it (estimated tokens)
+PROMPT_TOKEN_BUDGET = 6000
+CONTEXT_ITEM_TOKENS = 250
+
+# Screenshot DXT1 encoder: "fast" (min/max endpoints) or "high" (principal-axis fit, ~8x slower)
+SCREENSHOT_DXT1_QUALITY = os.getenv('SCREENSHOT_DXT1_QUALITY', 'fast')
+
+# CPU executor for save file work (0 = min(4, CPU count)); timeout in seconds per job
+CPU_POOL_SIZE = int(os.getenv('CPU_POOL_SIZE', '0'))
+CPU_JOB_TIMEOUT = float(os.getenv('CPU_JOB_TIMEOUT', '60'))
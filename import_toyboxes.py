@@ -0,0 +1,47 @@
+import argparse
+import json
+
+from services.toybox_catalog import ToyboxCatalog
+
+# --- CONFIGURATION ---
+TOYBOX_DATA_FILE = "toybox_data.json"
+TOYBOX_DB_PATH = "toybox_catalog.db"
+
+def main():
+    parser = argparse.ArgumentParser(description="Imports toybox_data.json into the SQLite toybox catalog.")
+    parser.add_argument("--source", default=TOYBOX_DATA_FILE, help="Toybox JSON file")
+    parser.add_argument("--target", default=TOYBOX_DB_PATH, help="Toybox catalog database")
+    args = parser.parse_args()
+
+    print("--- Importing toybox data into the toybox catalog ---")
+
+    # 1. Load the JSON file
+    print(f"Loading toybox data from '{args.source}'...")
+    try:
+        with open(args.source, 'r', encoding='utf-8') as f:
+            toyboxes = json.load(f)
+        print(f"   -> Found {len(toyboxes)} toyboxes.")
+    except FileNotFoundError:
+        print(f"❌ Error: '{args.source}' not found.")
+        return
+
+    # 2. Upsert everything in one transaction; existing entries with the same ID are replaced
+    print(f"\nWriting to '{args.target}'...")
+    catalog = ToyboxCatalog(args.target)
+    before = catalog.count()
+    catalog.upsert_many(toyboxes)
+    print(f"   -> Catalog had {before} toyboxes, now has {catalog.count()}.")
+
+    # 3. Check that every toybox reads back unchanged
+    print("\nVerifying...")
+    stored = {toybox['id']: toybox for toybox in catalog.all()}
+    mismatched = [toybox['id'] for toybox in toyboxes if stored.get(int(toybox['id'])) != dict(toybox, id=int(toybox['id']))]
+    if mismatched:
+        print(f"   -> ⚠️ {len(mismatched)} toyboxes read back differently, e.g. ID {mismatched[0]}.")
+    else:
+        print("   -> All toyboxes read back unchanged.")
+
+    print("\n✅ Import complete!")
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,43 @@
+import asyncio
 import google.generativeai as genai
-import chromadb
 import json
 import os
+import random
 import time
 from dotenv import load_dotenv
+from services.embedding_cache import embedding_cache
+from services.embedding_pipeline import is_rate_limit_error
+from services.toybox_catalog import toybox_catalog
+from services.vector_store import create_vector_store
 
 # --- CONFIGURATION ---
 load_dotenv()
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
-TOYBOX_DATA_FILE = "toybox_data.json"
-CHROMA_DB_PATH = "chroma_db"
-COLLECTION_NAME = "toybox_collection"
+# Toyboxes finished so far, written after every upsert batch; an interrupted run resumes from it
+CHECKPOINT_FILE = "indexer_checkpoint.json"
+WORKERS = 8
+# Tagging and embedding calls share one budget; cached embeddings don't count
+REQUESTS_PER_MINUTE = 100
+RATE_LIMIT_BURST = 5
+UPSERT_BATCH_SIZE = 25
+MAX_RETRIES = 5
 
 # --- INITIALIZE AI & DB ---
-print("Initializing Gemini and ChromaDB...")
+print("Initializing Gemini and the vector store...")
 try:
     genai.configure(api_key=GEMINI_API_KEY)
     tagging_model = genai.GenerativeModel('gemini-2.5-flash')
     embedding_model = 'models/embedding-001'
     
-    client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
-    collection = client.get_or_create_collection(name=COLLECTION_NAME)
+    # ChromaDB or the NumPy index, whichever VECTOR_STORE_BACKEND selects for the bot
+    vector_store = create_vector_store()
     print("✅ Initialization complete.")
 except Exception as e:
     print(f"❌ Failed to initialize: {e}")
     exit()
 
-def get_ai_tags(toybox_name, toybox_desc):
+async def get_ai_tags(toybox_name, toybox_desc):
     """Uses Gemini to generate descriptive gameplay tags for a toybox."""
-    print(f"   -> Generating AI tags for '{toybox_name}'...")
     desc_snippet = (toybox_desc[:1500] + '...') if len(toybox_desc) > 1500 else toybox_desc
     
     prompt = f"""
@@ -46,7 +55,8 @@ def get_ai_tags(toybox_name, toybox_desc):
     """
     
     try:
-        response = tagging_model.generate_content(prompt)
+        await rate_limiter.acquire()
+        response = await with_retries(lambda: tagging_model.generate_content(prompt))
         # <<< FIX: More robust cleaning logic for the AI's response
         clean_text = response.text.strip()
         # Remove markdown code blocks and brackets
@@ -60,68 +70,207 @@ def get_ai_tags(toybox_name, toybox_desc):
         ai_tags = [tag.strip() for tag in clean_text.split(',') if tag.strip()]
         return ai_tags
     except Exception as e:
-        print(f"      ⚠️ AI Tagging Error: {e}")
+        print(f"      ⚠️ AI Tagging Error for '{toybox_name}': {e}")
         return []
 
-def main():
-    print(f"Loading toybox data from {TOYBOX_DATA_FILE}...")
+def is_unchanged(document, toybox):
+    """Whether a stored document was built from the toybox's current name and description."""
+    document = document or ""
+    return ((document.startswith(f"Name: {toybox['name']}. ") and document.endswith(f"Description: {toybox.get('description', '')}"))
+            or document.startswith(f"{toybox['name']}\n{toybox.get('description', '')}\n"))
+
+async def get_embedding(document_text):
+    """Embeds a document, reusing the cached embedding if this exact text was embedded before."""
+    embedding = embedding_cache.get(embedding_model, "retrieval_document", document_text)
+    if embedding is not None:
+        return embedding, True
+
+    await rate_limiter.acquire()
+    result = await with_retries(lambda: genai.embed_content(
+        model=embedding_model,
+        content=document_text,
+        task_type="retrieval_document"
+    ))
+    embedding = result['embedding']
+    embedding_cache.put(embedding_model, "retrieval_document", document_text, embedding)
+    return embedding, False
+
+class TokenBucket:
+    """Allows `rate` requests per second on average, with bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+rate_limiter = TokenBucket(REQUESTS_PER_MINUTE / 60, RATE_LIMIT_BURST)
+
+async def with_retries(call):
+    """Runs a blocking Gemini call in a worker thread, backing off and retrying when rate limited."""
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return await asyncio.to_thread(call)
+        except Exception as e:
+            if not is_rate_limit_error(e) or attempt == MAX_RETRIES:
+                raise
+            delay = min(60, 2 ** attempt) * random.uniform(1, 1.5)
+            print(f"      ⚠️ Rate limited, retrying in {delay:.1f}s...")
+            await asyncio.sleep(delay)
+            await rate_limiter.acquire()
+
+def load_checkpoint():
+    """Toyboxes finished by an interrupted run, by ID."""
     try:
-        with open(TOYBOX_DATA_FILE, 'r', encoding='utf-8') as f:
-            all_toyboxes = json.load(f)
+        with open(CHECKPOINT_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
     except FileNotFoundError:
-        print(f"❌ Error: '{TOYBOX_DATA_FILE}' not found. Run the /update_toyboxes command first.")
+        return {}
+    except Exception as e:
+        print(f"⚠️ Ignoring unreadable checkpoint {CHECKPOINT_FILE}: {e}")
+        return {}
+
+def write_json(path, data):
+    """Writes through a temporary file, so an interrupted write never leaves a truncated file."""
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+def build_document(toybox, tags):
+    return (
+        f"Name: {toybox['name']}. "
+        f"Tags: {', '.join(tags)}. "
+        f"Description: {toybox.get('description', '')}"
+    )
+
+async def index_toybox(toybox, position, total):
+    """Tags and embeds one toybox. Returns (toybox with combined tags, document, embedding)."""
+    ai_tags = await get_ai_tags(toybox['name'], toybox.get("description", ""))
+    # Sorted, so the same tags always give the same document text (and cached embedding)
+    combined_tags = sorted(set(toybox.get("tags", []) + ai_tags))
+    document_text = build_document(toybox, combined_tags)
+    embedding, cached = await get_embedding(document_text)
+    print(f"[{position}/{total}] {toybox['name']} (ID {toybox['id']}) -> {combined_tags}"
+          f"{' (cached embedding)' if cached else ''}")
+    return dict(toybox, tags=combined_tags), document_text, embedding
+
+async def run_indexing(pending, finished, total):
+    """
+    Indexes `pending` with WORKERS concurrent workers. Finished rows are upserted in
+    batches of UPSERT_BATCH_SIZE, and the checkpoint is written after each batch, so a
+    toybox only counts as done once it is in the vector store.
+    """
+    queue = asyncio.Queue()
+    for item in pending:
+        queue.put_nowait(item)
+    batch = []
+    batch_lock = asyncio.Lock()
+    failed = 0
+
+    async def flush():
+        if not batch:
+            return
+        rows, batch[:] = batch[:], []
+        await asyncio.to_thread(
+            vector_store.upsert,
+            [str(toybox['id']) for toybox, _, _ in rows],
+            [embedding for _, _, embedding in rows],
+            [document for _, document, _ in rows],
+            [{"name": toybox['name'], "url": toybox['url'], "tags": ", ".join(toybox['tags'])} for toybox, _, _ in rows]
+        )
+        await asyncio.to_thread(vector_store.flush)
+        for toybox, _, _ in rows:
+            finished[str(toybox['id'])] = toybox
+        await asyncio.to_thread(write_json, CHECKPOINT_FILE, finished)
+        print(f"   💾 Stored {len(rows)} toyboxes, checkpoint at {len(finished)}/{total}.")
+
+    async def worker():
+        nonlocal failed
+        while True:
+            try:
+                position, toybox = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                row = await index_toybox(toybox, position, total)
+            except Exception as e:
+                failed += 1
+                print(f"   ❌ Failed to index '{toybox['name']}' (ID {toybox['id']}): {e}")
+                continue
+            async with batch_lock:
+                batch.append(row)
+                if len(batch) >= UPSERT_BATCH_SIZE:
+                    await flush()
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(WORKERS)))
+    finally:
+        # Also on Ctrl+C, so the rows already tagged and embedded are kept
+        async with batch_lock:
+            await flush()
+    return failed
+
+def main():
+    print(f"Loading toybox data from {toybox_catalog.db_path}...")
+    all_toyboxes = toybox_catalog.all()
+    if not all_toyboxes:
+        print(f"❌ Error: '{toybox_catalog.db_path}' has no toyboxes. Run the /update_toyboxes command first.")
         return
     
-    print(f"Found {len(all_toyboxes)} toyboxes. Starting indexing process...")
-    
-    updated_toyboxes = []
+    print(f"Found {len(all_toyboxes)} toyboxes. Checking which ones are already indexed...")
+
+    # One bulk read instead of a lookup per toybox
+    stored_entries = vector_store.entries()
+    checkpoint = load_checkpoint()
+    finished = {}
+    pending = []
     for i, toybox in enumerate(all_toyboxes):
-        print(f"\n[{i+1}/{len(all_toyboxes)}] Processing Toybox ID: {toybox['id']}")
         toybox_id = str(toybox['id'])
+        resumed = checkpoint.get(toybox_id)
+        if (resumed is not None and toybox_id in stored_entries
+                and resumed['name'] == toybox['name'] and resumed.get('description') == toybox.get('description')):
+            finished[toybox_id] = dict(toybox, tags=resumed['tags'])
+        elif toybox_id in stored_entries and is_unchanged(stored_entries[toybox_id][0], toybox):
+            finished[toybox_id] = toybox
+        else:
+            pending.append((i + 1, toybox))
 
-        if len(collection.get(ids=[toybox_id])['ids']) > 0:
-            print(f"   -> Already indexed. Skipping.")
-            updated_toyboxes.append(toybox)
-            continue
+    if checkpoint:
+        print(f"Resuming an interrupted run ({len(checkpoint)} toyboxes in {CHECKPOINT_FILE}).")
+    print(f"{len(finished)} already indexed, {len(pending)} to index "
+          f"({WORKERS} workers, {REQUESTS_PER_MINUTE} requests/minute).")
 
-        description = toybox.get("description", "")
-        ai_tags = get_ai_tags(toybox['name'], description)
-        
-        existing_tags = toybox.get("tags", [])
-        combined_tags = list(set(existing_tags + ai_tags))
-        toybox['tags'] = combined_tags
-        print(f"   -> Combined Tags: {combined_tags}")
-
-        document_text = (
-            f"Name: {toybox['name']}. "
-            f"Tags: {', '.join(combined_tags)}. "
-            f"Description: {description}"
-        )
+    start = time.time()
+    failed = 0
+    try:
+        failed = asyncio.run(run_indexing(pending, finished, len(all_toyboxes)))
+    except KeyboardInterrupt:
+        print(f"\n⏸️ Interrupted. Progress is saved in {CHECKPOINT_FILE}; run the indexer again to resume.")
+        return
 
-        print("   -> Generating vector embedding...")
-        embedding = genai.embed_content(
-            model=embedding_model,
-            content=document_text,
-            task_type="retrieval_document"
-        )['embedding']
-
-        print("   -> Storing in ChromaDB...")
-        collection.add(
-            ids=[toybox_id],
-            embeddings=[embedding],
-            documents=[document_text],
-            metadatas=[{"name": toybox['name'], "url": toybox['url'], "tags": ", ".join(combined_tags)}]
-        )
-        
-        updated_toyboxes.append(toybox)
-        
-        time.sleep(1.1) 
+    print("\nSaving the enriched tags to the toybox catalog...")
+    retagged = [finished[str(toybox['id'])] for toybox in all_toyboxes
+                if str(toybox['id']) in finished and finished[str(toybox['id'])].get('tags') != toybox.get('tags')]
+    toybox_catalog.upsert_many(retagged)
+    print(f"   -> Updated the tags of {len(retagged)} toyboxes.")
+    if failed:
+        print(f"⚠️ {failed} toyboxes failed to index. {CHECKPOINT_FILE} is kept; run the indexer again to retry them.")
+    elif os.path.exists(CHECKPOINT_FILE):
+        os.remove(CHECKPOINT_FILE)
 
-    print("\nSaving enriched toybox data back to file...")
-    with open(TOYBOX_DATA_FILE, 'w', encoding='utf-8') as f:
-        json.dump(updated_toyboxes, f, indent=4, ensure_ascii=False)
-        
-    print("✅ Indexing complete! The bot's brain is now up to date.")
+    print(f"✅ Indexing complete in {time.time() - start:.0f}s! The bot's brain is now up to date.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -22,6 +22,10 @@ from views.play_view import PlayView
 from services.counters import ToyboxCounter, SlotCounter
 from services.rating_service import rating_service
 from services.rag_service import rag_service
+from services.thread_cache import thread_cache
+from services.cpu_executor import cpu_executor
+from services.embedding_cache import embedding_cache
+from services.toybox_catalog import toybox_catalog
 
 # --- Initialization ---
 logger.info("Starting Donald Bot...")
@@ -98,6 +102,12 @@ async def on_ready():
 # --- Main Entry Point ---
 if __name__ == "__main__":
     if config.TOKEN:
-        bot.run(config.TOKEN)
+        try:
+            bot.run(config.TOKEN)
+        finally:
+            cpu_executor.shutdown()
+            thread_cache.close()
+            embedding_cache.close()
+            toybox_catalog.close()
     else:
         logger.critical("❌ BOT_TOKEN not found in environment variables.")
\ No newline at end of file
@@ -0,0 +1,70 @@
+import argparse
+import time
+
+import chromadb
+import numpy as np
+
+from services.vector_store import NumpyVectorStore
+
+# --- CONFIGURATION ---
+CHROMA_DB_PATH = "chroma_db"
+COLLECTION_NAME = "toybox_collection"
+VECTOR_INDEX_PATH = "vector_index"
+PAGE_SIZE = 500
+
+def main():
+    parser = argparse.ArgumentParser(description="Copies the ChromaDB toybox collection into the NumPy vector index.")
+    parser.add_argument("--source", default=CHROMA_DB_PATH, help="ChromaDB directory")
+    parser.add_argument("--target", default=VECTOR_INDEX_PATH, help="Vector index directory (replaced)")
+    args = parser.parse_args()
+
+    print("--- Migrating ChromaDB to the NumPy vector index ---")
+
+    # 1. Connect to ChromaDB
+    print(f"Connecting to ChromaDB at '{args.source}'...")
+    try:
+        client = chromadb.PersistentClient(path=args.source)
+        collection = client.get_collection(name=COLLECTION_NAME)
+        total = collection.count()
+        print(f"   -> Collection '{COLLECTION_NAME}' has {total} items.")
+    except Exception as e:
+        print(f"❌ Error connecting to ChromaDB: {e}")
+        return
+
+    # 2. Read every entry, a page at a time
+    ids, embeddings, documents, metadatas = [], [], [], []
+    for offset in range(0, total, PAGE_SIZE):
+        page = collection.get(include=["embeddings", "documents", "metadatas"], limit=PAGE_SIZE, offset=offset)
+        ids.extend(page['ids'])
+        embeddings.extend(page['embeddings'])
+        documents.extend(page['documents'])
+        metadatas.extend(page['metadatas'])
+        print(f"   -> Read {len(ids)}/{total} items.")
+
+    if not ids:
+        print("Nothing to migrate.")
+        return
+
+    # 3. Write the index (a fresh one, so entries deleted from Chroma don't linger)
+    print(f"\nWriting the vector index to '{args.target}'...")
+    store = NumpyVectorStore(args.target, mmap=False)
+    store.delete(list(store.entries()))
+    store.upsert(ids, embeddings, documents, [metadata or {} for metadata in metadatas])
+    store.flush()
+    print(f"   -> Stored {store.count()} vectors of dimension {len(embeddings[0])}.")
+
+    # 4. Check that both backends rank the same nearest neighbours
+    print("\nComparing search results on a sample of stored vectors...")
+    sample = np.random.default_rng(0).choice(len(ids), size=min(20, len(ids)), replace=False)
+    matches = 0
+    started = time.perf_counter()
+    for row in sample:
+        chroma_top = collection.query(query_embeddings=[list(embeddings[row])], n_results=5)['ids'][0]
+        numpy_top = [result['id'] for result in store.query(embeddings[row], 5)]
+        matches += len(set(chroma_top) & set(numpy_top))
+    print(f"   -> {matches}/{len(sample) * 5} top-5 results agree ({(time.perf_counter() - started) * 1000:.0f} ms).")
+
+    print("\n✅ Migration complete! Set VECTOR_STORE_BACKEND=numpy to use the new index.")
+
+if __name__ == "__main__":
+    main()
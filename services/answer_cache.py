@@ -0,0 +1,98 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from services.query_embedding_cache import normalize_query
+from utils.logger import logger
+
+
+class AnswerCache:
+    """
+    Generated AI chat answers, keyed by (normalized search query, sorted retrieved toybox
+    IDs, toybox DB version).
+
+    A different phrasing of a cached question is served too when it retrieved the same
+    toyboxes and its query embedding is at least `similarity` (cosine) close to the
+    cached one. Entries from an older DB version are dropped as soon as the version
+    changes, so an update of the toybox database never serves stale answers.
+    """
+
+    def __init__(self, embed_query=None, max_entries: int = 256, ttl: float = 86400,
+                 similarity: float = 0.95, embed_timeout: float = 2.0):
+        self.embed_query = embed_query
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.embed_timeout = embed_timeout
+        self._entries = OrderedDict()  # (query, ids, version) -> (expires_at, unit embedding or None, answer)
+        self._version = None
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    async def _embedding(self, query: str):
+        if self.embed_query is None:
+            return None
+        try:
+            vector = np.asarray(await asyncio.wait_for(self.embed_query(query), self.embed_timeout), dtype=np.float32)
+        except Exception as e:
+            logger.debug(f"Answer cache: no embedding for '{query}' ({e!r}); exact matches only.")
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def _check_version(self, version: str):
+        if version != self._version:
+            if self._entries:
+                logger.info(f"Answer cache: toybox DB version changed, dropping {len(self._entries)} answers.")
+            self._entries.clear()
+            self._version = version
+
+    async def get(self, query: str, toybox_ids: list, version: str):
+        """Returns the cached answer for this query and set of retrieved toyboxes, or None."""
+        self._check_version(version)
+        now = time.monotonic()
+        ids = tuple(sorted(map(str, toybox_ids)))
+        key = (normalize_query(query), ids, version)
+
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > now:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+        if any(other[1] == ids for other in self._entries):
+            embedding = await self._embedding(key[0])
+            best_key, best_score = None, self.similarity
+            for other, (expires_at, other_embedding, _) in list(self._entries.items()):
+                if embedding is None or other[1] != ids or expires_at <= now or other_embedding is None:
+                    continue
+                score = float(other_embedding @ embedding)
+                if score >= best_score:
+                    best_key, best_score = other, score
+            if best_key is not None and best_key in self._entries:
+                logger.info(f"Answer cache: '{key[0]}' matches cached '{best_key[0]}' (similarity {best_score:.3f}).")
+                self._entries.move_to_end(best_key)
+                self.semantic_hits += 1
+                return self._entries[best_key][2]
+
+        self.misses += 1
+        return None
+
+    async def put(self, query: str, toybox_ids: list, version: str, answer: str):
+        self._check_version(version)
+        key = (normalize_query(query), tuple(sorted(map(str, toybox_ids))), version)
+        self._entries[key] = (time.monotonic() + self.ttl, await self._embedding(key[0]), answer)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'semantic_hits': self.semantic_hits,
+            'misses': self.misses,
+        }
@@ -0,0 +1,87 @@
+import re
+
+# Rough token estimate for Gemini on English text
+CHARS_PER_TOKEN = 4
+
+_URL = re.compile(r"<?https?://\S+>?")
+_DISCORD_TOKEN = re.compile(r"<a?:\w+:\d+>|<[@#][!&]?\d+>")
+_MARKDOWN = re.compile(r"[*_~`|>#]+")
+_SPACES = re.compile(r"[ \t]+")
+_BLANK_LINES = re.compile(r"\s*\n\s*")
+_SENTENCE_END = re.compile(r"[.!?](?=\s)|\n")
+
+# A description shorter than this isn't worth listing an item for
+_MIN_DESCRIPTION_TOKENS = 20
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cuts text to about max_tokens, at a sentence end if one is near, else at a word."""
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    sentence_ends = [m.end() for m in _SENTENCE_END.finditer(cut)]
+    if sentence_ends and sentence_ends[-1] >= limit // 2:
+        return cut[:sentence_ends[-1]].rstrip() + " …"
+    return cut.rsplit(" ", 1)[0].rstrip() + " …"
+
+
+def compress_description(text: str, max_tokens: int) -> str:
+    """
+    A forum first post reduced for the prompt: links, Discord mentions/emoji and markdown
+    removed, whitespace collapsed, and cut to max_tokens.
+    """
+    text = _URL.sub("", text or "")
+    text = _DISCORD_TOKEN.sub("", text)
+    text = _MARKDOWN.sub("", text)
+    text = _SPACES.sub(" ", text)
+    text = _BLANK_LINES.sub("\n", text).strip()
+    return truncate_to_tokens(text, max_tokens)
+
+
+def build_context(toyboxes: list[dict], max_tokens: int, item_tokens: int) -> str:
+    """
+    The "Provided Toybox Information" block of the RAG prompt, within max_tokens.
+
+    Entries for the same thread (URL) are listed once, and entries sharing a description
+    (parts of one toybox posted separately) are merged into one item with all their names
+    and links. Each description is cut to item_tokens, or to an even share of what is
+    left of the budget; items that no longer fit are dropped, least relevant first.
+    Uses the precomputed "summary" of a toybox where there is one.
+    """
+    items, by_url, by_summary = [], set(), {}
+    for tb in toyboxes:
+        if tb['url'] in by_url:
+            continue
+        by_url.add(tb['url'])
+        summary = tb.get('summary') or compress_description(tb.get('description', ''), item_tokens)
+        key = summary.lower()
+        if key and key in by_summary:
+            by_summary[key]['entries'].append(tb)
+            continue
+        item = {'entries': [tb], 'summary': summary}
+        by_summary[key] = item
+        items.append(item)
+
+    context = "Found these potentially relevant Toyboxes:\n\n"
+    used = estimate_tokens(context)
+    for i, item in enumerate(items, 1):
+        names = " / ".join(tb['name'] for tb in item['entries'])
+        links = " ".join(f"<{tb['url']}>" for tb in item['entries'])
+        tags = ", ".join(dict.fromkeys(tag.strip() for tb in item['entries'] for tag in tb.get('tags', []) if tag.strip()))
+        tags_line = f"Tags: {tags}\n" if tags else ""
+        frame = f"--- Toybox {i} ---\nName: {names}\n{tags_line}Description: \nLink: {links}\n\n"
+        frame_tokens = estimate_tokens(frame)
+        share = (max_tokens - used) // (len(items) - i + 1) - frame_tokens
+        budget = min(item_tokens, max(share, _MIN_DESCRIPTION_TOKENS))
+        if used + frame_tokens + budget > max_tokens:
+            break
+        description = truncate_to_tokens(item['summary'], budget)
+        entry = f"--- Toybox {i} ---\nName: {names}\n{tags_line}Description: {description}\nLink: {links}\n\n"
+        context += entry
+        used += estimate_tokens(entry)
+    return context
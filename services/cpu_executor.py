@@ -0,0 +1,111 @@
+import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import config
+from utils.logger import logger
+
+
+class CpuJobTimeout(Exception):
+    """Raised when a job does not finish within its timeout."""
+
+
+def _run_job(func, args, kwargs, submitted_at):
+    """Runs in the worker process. Returns the time the job spent queued and its result."""
+    return time.time() - submitted_at, func(*args, **kwargs)
+
+
+class CpuExecutorService:
+    """
+    Runs CPU-heavy save file work (DXT1 encoding, zlib, CMP1 hashing, ZIP rewrites) in a
+    process pool, so command handlers don't block the event loop while it runs.
+
+    Jobs must be module-level functions with picklable arguments and results.
+    """
+
+    def __init__(self, max_workers: int = None, timeout: float = 60.0, history: int = 200):
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.timeout = timeout
+        self._pool = None
+        self._in_flight = 0
+        self._latencies = deque(maxlen=history)
+        self._queue_waits = deque(maxlen=history)
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            logger.info(f"CPU executor started with {self.max_workers} worker(s).")
+        return self._pool
+
+    async def run(self, func, *args, timeout: float = None, **kwargs):
+        """
+        Runs func(*args, **kwargs) in the pool and returns its result.
+
+        Raises:
+            CpuJobTimeout: If the job takes longer than `timeout` seconds (default: the
+                service timeout). A job that already started keeps its worker busy until
+                it finishes; the pool cannot interrupt it.
+        """
+        timeout = timeout or self.timeout
+        loop = asyncio.get_running_loop()
+        submitted_at = time.time()
+        self._in_flight += 1
+        pool = self._get_pool()
+        try:
+            future = loop.run_in_executor(pool, _run_job, func, args, kwargs, submitted_at)
+            queue_wait, result = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            logger.warning(f"CPU job {func.__name__} timed out after {timeout}s ({self.stats()['queue_depth']} queued).")
+            raise CpuJobTimeout(f"{func.__name__} did not finish within {timeout:g} seconds.")
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); start a fresh pool for the next job
+            self.failed += 1
+            logger.error(f"CPU executor pool broke while running {func.__name__}; restarting it.")
+            # Other jobs of the broken pool fail the same way; only the first one replaces it
+            if self._pool is pool:
+                self._pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self._in_flight -= 1
+
+        latency = time.time() - submitted_at
+        self.completed += 1
+        self._latencies.append(latency)
+        self._queue_waits.append(queue_wait)
+        logger.debug(f"CPU job {func.__name__} took {latency * 1000:.0f} ms ({queue_wait * 1000:.0f} ms queued).")
+        return result
+
+    def stats(self) -> dict:
+        """Pool size, current load and latency figures over the recent jobs."""
+        latencies = sorted(self._latencies)
+        return {
+            'workers': self.max_workers,
+            'in_flight': self._in_flight,
+            'queue_depth': max(0, self._in_flight - self.max_workers),
+            'completed': self.completed,
+            'failed': self.failed,
+            'timed_out': self.timed_out,
+            'avg_latency_ms': sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+            'p95_latency_ms': latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0.0,
+            'avg_queue_wait_ms': sum(self._queue_waits) / len(self._queue_waits) * 1000 if self._queue_waits else 0.0,
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# Global instance
+cpu_executor = CpuExecutorService(config.CPU_POOL_SIZE, config.CPU_JOB_TIMEOUT)
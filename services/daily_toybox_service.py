@@ -1,5 +1,4 @@
 import sqlite3
-import os
 import datetime
 import asyncio
 from utils.logger import logger
@@ -143,33 +142,19 @@ class DailyToyboxService:
             return cursor.fetchone() is not None
 
     def get_toybox_url(self, toybox_id: int) -> str:
-        """Looks up the jump URL for a given toybox ID from the toybox_data.json file."""
-        import json
-        import config
-        if not os.path.exists(config.TOYBOX_DATA_FILE):
-            return ""
+        """Looks up the jump URL for a given toybox ID in the toybox catalog."""
+        from services.toybox_catalog import toybox_catalog
         try:
-            with open(config.TOYBOX_DATA_FILE, 'r', encoding='utf-8') as f:
-                toyboxes = json.load(f)
-                for tb in toyboxes:
-                    if tb.get('id') == toybox_id:
-                        return tb.get('url', '')
+            return toybox_catalog.get_url(toybox_id)
         except Exception as e:
             logger.error(f"Error reading toybox URL for ID {toybox_id}: {e}")
         return ""
 
     def get_toybox_details(self, toybox_id: int) -> dict:
-        """Looks up the details for a given toybox ID from the toybox_data.json file."""
-        import json
-        import config
-        if not os.path.exists(config.TOYBOX_DATA_FILE):
-            return None
+        """Looks up the details for a given toybox ID in the toybox catalog."""
+        from services.toybox_catalog import toybox_catalog
         try:
-            with open(config.TOYBOX_DATA_FILE, 'r', encoding='utf-8') as f:
-                toyboxes = json.load(f)
-                for tb in toyboxes:
-                    if tb.get('id') == toybox_id:
-                        return tb
+            return toybox_catalog.get(toybox_id)
         except Exception as e:
             logger.error(f"Error reading toybox details for ID {toybox_id}: {e}")
         return None
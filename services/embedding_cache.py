@@ -0,0 +1,112 @@
+import hashlib
+import sqlite3
+import threading
+from array import array
+
+import config
+from utils.logger import logger
+
+# SQLite limits the number of parameters per statement; look keys up in chunks
+_LOOKUP_CHUNK = 500
+
+
+def text_hash(text: str) -> str:
+    """SHA-256 of the document text, the content part of a cache key."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding store keyed by (model name, task_type, SHA-256 of the text).
+
+    An embedding only depends on those three, so rebuilding the vector DB, re-tagging or
+    re-running the indexer reuses the stored vectors for every text that didn't change,
+    and only new or edited documents reach the embedding API. Vectors are stored as
+    float64 blobs, so a cached embedding is identical to the one the API returned.
+    """
+
+    def __init__(self, db_path: str = config.EMBEDDING_CACHE_PATH):
+        self.db_path = db_path
+        self._db = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.setup_db()
+
+    def setup_db(self):
+        """Opens the connection every lookup shares; it is used from worker threads under the lock."""
+        try:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            with self._db as db:
+                db.execute("""
+                    CREATE TABLE IF NOT EXISTS embeddings (
+                        model TEXT,
+                        task_type TEXT,
+                        text_hash TEXT,
+                        vector BLOB,
+                        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (model, task_type, text_hash)
+                    )
+                """)
+        except Exception as e:
+            logger.error(f"❌ Failed to set up embedding cache at {self.db_path}: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def get_many(self, model: str, task_type: str, texts: list[str], max_age: float = None) -> list:
+        """
+        Returns the cached embedding for each text, or None where there is none (or, with
+        max_age, where it was stored more than max_age seconds ago).
+        """
+        hashes = [text_hash(text) for text in texts]
+        age_filter = f"AND created_at >= datetime('now', '-{int(max_age)} seconds') " if max_age else ""
+        found = {}
+        try:
+            with self._lock, self._db as db:
+                for start in range(0, len(hashes), _LOOKUP_CHUNK):
+                    chunk = hashes[start:start + _LOOKUP_CHUNK]
+                    rows = db.execute(
+                        f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND task_type = ? "
+                        f"{age_filter}AND text_hash IN ({','.join('?' * len(chunk))})",
+                        (model, task_type, *chunk)
+                    )
+                    found.update(rows)
+        except Exception as e:
+            logger.error(f"❌ Embedding cache lookup failed: {e}")
+
+        embeddings = [array('d', found[h]).tolist() if h in found else None for h in hashes]
+        hit_count = sum(embedding is not None for embedding in embeddings)
+        self.hits += hit_count
+        self.misses += len(texts) - hit_count
+        return embeddings
+
+    def put_many(self, model: str, task_type: str, texts: list[str], embeddings: list[list[float]]):
+        """Stores one embedding per text, replacing any earlier entry."""
+        rows = [(model, task_type, text_hash(text), array('d', embedding).tobytes())
+                for text, embedding in zip(texts, embeddings)]
+        try:
+            with self._lock, self._db as db:
+                db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, task_type, text_hash, vector) VALUES (?, ?, ?, ?)",
+                    rows
+                )
+        except Exception as e:
+            logger.error(f"❌ Failed to store {len(rows)} embedding(s) in the cache: {e}")
+
+    def get(self, model: str, task_type: str, text: str, max_age: float = None):
+        return self.get_many(model, task_type, [text], max_age)[0]
+
+    def put(self, model: str, task_type: str, text: str, embedding: list[float]):
+        self.put_many(model, task_type, [text], [embedding])
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+# Global instance
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,138 @@
+import asyncio
+import inspect
+import logging
+import random
+
+import config
+
+logger = logging.getLogger("DonaldBot")
+
+
+class RateLimitError(Exception):
+    """Raised by embedding backends (e.g. a fake endpoint) to signal HTTP 429."""
+
+
+def is_rate_limit_error(e: Exception) -> bool:
+    """Recognizes rate limiting from Gemini (ResourceExhausted / 429) without importing google.api_core."""
+    return (isinstance(e, RateLimitError)
+            or getattr(e, 'code', None) == 429
+            or type(e).__name__ in ('ResourceExhausted', 'TooManyRequests'))
+
+
+def gemini_embed_batch(texts: list[str], task_type: str) -> list[list[float]]:
+    """Embeds a batch of texts with one Gemini request (batchEmbedContents)."""
+    import google.generativeai as genai
+
+    result = genai.embed_content(model=config.EMBEDDING_MODEL_NAME, content=texts, task_type=task_type)
+    return result['embedding']
+
+
+class EmbeddingPipeline:
+    """
+    Embeds documents in batches, with several batch requests in flight at once.
+
+    `embed_batch(texts, task_type)` returns one embedding per text. It may be a plain
+    function (run in a worker thread) or a coroutine function, so a local fake endpoint
+    can be dropped in for testing. When the backend reports a rate limit, a shared delay
+    is doubled (at most once per delay period, so a burst of concurrent 429s counts once)
+    and applied before every request, then decays again as requests succeed.
+
+    With a `cache` (see services.embedding_cache), texts already embedded with `model`
+    are served from it up front and only the remaining ones are batched and sent upstream.
+    """
+
+    def __init__(self, embed_batch=gemini_embed_batch, batch_size: int = 50, concurrency: int = 4,
+                 max_retries: int = 6, base_delay: float = 1.0, max_delay: float = 60.0,
+                 cache=None, model: str = config.EMBEDDING_MODEL_NAME):
+        self.embed_batch = embed_batch
+        self.cache = cache
+        self.model = model
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._delay = 0.0
+        self._last_backoff = 0.0
+        self.requests = 0
+        self.rate_limited = 0
+
+    async def _embed(self, texts: list[str], task_type: str) -> list[list[float]]:
+        if inspect.iscoroutinefunction(self.embed_batch):
+            return await self.embed_batch(texts, task_type)
+        return await asyncio.to_thread(self.embed_batch, texts, task_type)
+
+    async def _embed_with_backoff(self, texts: list[str], task_type: str, semaphore: asyncio.Semaphore) -> list[list[float]]:
+        for attempt in range(self.max_retries + 1):
+            async with semaphore:
+                if self._delay:
+                    await asyncio.sleep(self._delay * random.uniform(0.5, 1.0))
+                try:
+                    self.requests += 1
+                    embeddings = await self._embed(texts, task_type)
+                except Exception as e:
+                    if not is_rate_limit_error(e) or attempt == self.max_retries:
+                        raise
+                    self.rate_limited += 1
+                    now = asyncio.get_running_loop().time()
+                    if now - self._last_backoff >= self._delay:
+                        self._last_backoff = now
+                        self._delay = min(self.max_delay, max(self.base_delay, self._delay * 2))
+                        logger.warning(f"⚠️ Embedding rate limited, backing off to {self._delay:.1f}s (attempt {attempt + 1}/{self.max_retries}).")
+                    continue
+
+            if len(embeddings) != len(texts):
+                raise ValueError(f"Embedding backend returned {len(embeddings)} embeddings for {len(texts)} texts.")
+            # Ease off slowly: with several requests in flight, halving would undo a backoff at once
+            self._delay = self._delay * 0.9 if self._delay > self.base_delay / 8 else 0.0
+            return embeddings
+
+    async def run(self, ids: list[str], documents: list[str], metadatas: list[dict], on_batch, task_type: str = "retrieval_document") -> int:
+        """
+        Embeds all documents and awaits `on_batch(ids, documents, embeddings, metadatas)`
+        for each batch as soon as it is done, so results are stored incrementally.
+
+        A batch that still fails after retrying is logged and skipped.
+
+        Returns:
+            The number of documents passed to on_batch.
+        """
+        stored = 0
+        if self.cache is not None:
+            cached = await asyncio.to_thread(self.cache.get_many, self.model, task_type, documents)
+            hits = [i for i, embedding in enumerate(cached) if embedding is not None]
+            for start in range(0, len(hits), self.batch_size):
+                batch = hits[start:start + self.batch_size]
+                await on_batch([ids[i] for i in batch], [documents[i] for i in batch],
+                               [cached[i] for i in batch], [metadatas[i] for i in batch])
+            stored += len(hits)
+
+            # Only the misses are batched and sent upstream
+            misses = [i for i, embedding in enumerate(cached) if embedding is None]
+            ids = [ids[i] for i in misses]
+            documents = [documents[i] for i in misses]
+            metadatas = [metadatas[i] for i in misses]
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def process(start: int):
+            end = start + self.batch_size
+            embeddings = await self._embed_with_backoff(documents[start:end], task_type, semaphore)
+            if self.cache is not None:
+                await asyncio.to_thread(self.cache.put_many, self.model, task_type, documents[start:end], embeddings)
+            return start, end, embeddings
+
+        tasks = [asyncio.create_task(process(start)) for start in range(0, len(documents), self.batch_size)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    start, end, embeddings = await next_done
+                except Exception as e:
+                    logger.error(f"❌ Embedding batch failed: {e}")
+                    continue
+                await on_batch(ids[start:end], documents[start:end], embeddings, metadatas[start:end])
+                stored += len(embeddings)
+        finally:
+            for task in tasks:
+                task.cancel()
+        return stored
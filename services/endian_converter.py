@@ -0,0 +1,67 @@
+import io
+import zipfile
+from array import array
+
+# Console (Xbox 360 / Wii U) save files are big-endian. Converting them to PC format
+# byte-swaps the 32-bit words of the main header and of the CMP1 sizes and checksums;
+# the 'CMP1' magic (bytes 64-67) and the compressed data are kept as is.
+SWAP_RANGES = ((0, 64), (68, 84))
+MIN_FILE_SIZE = 84
+
+# array typecode for unsigned 32-bit words
+_WORD = 'I' if array('I').itemsize == 4 else 'L'
+
+
+def swap_header(data: bytes) -> bytes:
+    """Returns a copy of a console save file with its header words byte-swapped."""
+    out = bytearray(data)
+    for start, end in SWAP_RANGES:
+        words = array(_WORD, out[start:end])
+        words.byteswap()
+        out[start:end] = words.tobytes()
+    return bytes(out)
+
+
+def _is_save_file(name: str) -> bool:
+    """Toybox save files are the *RR* files (SRR, EHRR, SHRR, ...)."""
+    return "RR" in name
+
+
+def _root_prefix(names: list[str]) -> str:
+    """The archive's single top-level folder (with a trailing slash), or '' if there isn't one."""
+    top_level = {name.split('/', 1)[0] for name in names}
+    if len(top_level) == 1:
+        root = top_level.pop()
+        if any(name.startswith(root + '/') for name in names):
+            return root + '/'
+    return ''
+
+
+def convert_zip(zip_bytes: bytes) -> tuple[bytes, int, int]:
+    """
+    Converts every save file directly inside the archive's root folder (or its single
+    top-level folder) to PC format, in memory.
+
+    Returns:
+        A tuple of (zip_bytes, found, converted): a ZIP with the converted files at its
+        root, the number of *RR* files found and the number converted. Files smaller
+        than the header are skipped.
+    """
+    output = io.BytesIO()
+    found = converted = 0
+
+    with zipfile.ZipFile(io.BytesIO(zip_bytes)) as in_zip, \
+         zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as out_zip:
+        prefix = _root_prefix(in_zip.namelist())
+
+        for info in in_zip.infolist():
+            relative = info.filename[len(prefix):]
+            if info.is_dir() or not info.filename.startswith(prefix) or '/' in relative or not _is_save_file(relative):
+                continue
+            found += 1
+            if info.file_size < MIN_FILE_SIZE:
+                continue
+            out_zip.writestr(relative, swap_header(in_zip.read(info)))
+            converted += 1
+
+    return output.getvalue(), found, converted
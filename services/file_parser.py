@@ -1,5 +1,11 @@
+import io
+import os
 import re
-from typing import Dict, Any, List
+import zipfile
+import zlib
+from typing import Dict, Any, List, NamedTuple, Optional
+
+from services import save_codec
 
 # Regex patterns
 TEXT_PATTERN = re.compile(r'"([^"]*)"')
@@ -8,6 +14,70 @@ EHRR_FILE_PATTERN = re.compile(r'^EHRR\d+[A-Z]?$')
 AUTHOREDNAME_PATTERN = re.compile(r'AUTHOREDNAME\s*=\s*"([^"]*)"')
 AUTHOREDDESC_PATTERN = re.compile(r'AUTHOREDDESC\s*=\s*"([^"]*)"')
 
+# Metadata keys of EHRR/EHRA files, matched on the raw decompressed bytes
+METADATA_PATTERNS = {
+    'name': (b'AUTHOREDNAME', re.compile(rb'AUTHOREDNAME\s*=\s*"([^"]+)"')),
+    'description': (b'AUTHOREDDESC', re.compile(rb'AUTHOREDDESC\s*=\s*"([^"]+)"')),
+    'date': (b'DATESTRING', re.compile(rb'DATESTRING\s*=\s*"([^"]+)"')),
+}
+
+
+class ToyboxMetadata(NamedTuple):
+    name: Optional[str] = None
+    description: Optional[str] = None
+    date: Optional[str] = None
+
+
+def read_metadata(data: bytes, fields: tuple = ('name', 'description', 'date'), chunk_size: int = 16 * 1024) -> ToyboxMetadata:
+    """
+    Reads metadata from an EHRR/EHRA save file without decompressing all of it.
+
+    The stream is inflated chunk by chunk and reading stops as soon as every requested
+    field has been found. Fields that are missing, or not requested, are None.
+
+    Raises:
+        ValueError: If the CMP1 block is missing.
+        zlib.error: If the compressed stream is damaged.
+    """
+    try:
+        stream = save_codec.parse(data, verify_checksum=False).payload
+    except save_codec.SaveFileError:
+        stream = memoryview(data)[save_codec.find_cmp1(data) + save_codec.CMP1_HEADER_SIZE:]
+
+    decompressor = zlib.decompressobj()
+    text = bytearray()
+    pending = {field: 0 for field in fields}  # field -> offset to resume searching from
+    found = {}
+
+    for pos in range(0, len(stream), chunk_size):
+        text += decompressor.decompress(stream[pos:pos + chunk_size])
+
+        for field, start in list(pending.items()):
+            key, pattern = METADATA_PATTERNS[field]
+            match = pattern.search(text, start)
+            if match:
+                found[field] = match.group(1).decode('utf-8', errors='replace')
+                del pending[field]
+            else:
+                # A match can only start at the last occurrence of the key or after it
+                last = text.rfind(key, start)
+                pending[field] = last if last != -1 else max(start, len(text) - len(key) + 1)
+
+        if not pending or decompressor.eof:
+            break
+
+    return ToyboxMetadata(**found)
+
+
+def read_zip_metadata(zip_bytes: bytes, fields: tuple = ('name', 'description', 'date')) -> Optional[ToyboxMetadata]:
+    """read_metadata() for the first EHRR/EHRA file in a toybox ZIP, or None if it has none."""
+    with zipfile.ZipFile(io.BytesIO(zip_bytes)) as zf:
+        for info in zf.infolist():
+            filename = os.path.basename(info.filename)
+            if filename.startswith("EHRR") or filename.startswith("EHRA"):
+                return read_metadata(zf.read(info), fields)
+    return None
+
 def analyze_and_parse_toybox_file(file_content: bytes) -> Dict[str, Any]:
     try:
         # Try UTF-8 first
@@ -1,50 +1,71 @@
 import io
-import struct
+import copy
 import zlib
 import re
+import shutil
+import struct
+import tempfile
 import zipfile
 import logging
 import numpy as np
 from PIL import Image
 from pathlib import Path
 
+from services import save_codec
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# DXT1 encoder settings: "fast" uses the per-channel min/max of each block as endpoints,
+# "high" fits the endpoints along the principal axis of the block and refines them.
+DXT1_QUALITY_MODES = ("fast", "high")
+
+# Modified ZIPs stay in memory up to this size before spilling to a temporary file
+_SPOOL_MAX_SIZE = 16 * 1024 * 1024
+
+# ZIP local file header: signature, 22 bytes of fields already in the central directory,
+# file name length and extra field length
+_LOCAL_HEADER = struct.Struct('<4s22xHH')
+
 class ImageInjectorService:
     """
     Service to handle the injection of custom screenshots into Disney Infinity 3.0 save files.
     """
 
-    def __init__(self):
-        pass
+    def __init__(self, quality: str = "fast"):
+        if quality not in DXT1_QUALITY_MODES:
+            raise ValueError(f"Unknown DXT1 quality '{quality}'. Expected one of: {', '.join(DXT1_QUALITY_MODES)}")
+        self.quality = quality
 
-    def process_toybox(self, zip_bytes: bytes, image_bytes: bytes) -> tuple[bytes, str]:
+    def process_toybox(self, zip_bytes: bytes, image_bytes: bytes) -> tuple[tempfile.SpooledTemporaryFile, str]:
         """
         Processes a Toybox ZIP file, replacing the screenshot in the save file with the provided image.
-        
+
+        Only the save file is re-encoded; every other member is copied over with its
+        original compressed bytes.
+
         Args:
             zip_bytes: The raw bytes of the input ZIP file.
             image_bytes: The raw bytes of the input image (PNG/JPG).
             
         Returns:
-            A tuple containing (modified_zip_bytes, filename_of_modified_zip).
+            A tuple containing (modified_zip_file, filename_of_modified_zip). The file is a
+            spooled temporary file positioned at the start, ready for discord.File.
         """
+        output = tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX_SIZE)
         try:
             # 1. Load and convert image to binary DXT1
             bin_data = self._convert_image_to_bin(image_bytes)
             
             # 2. Process ZIP file
-            output_zip_io = io.BytesIO()
+            source = memoryview(zip_bytes)
             
             with zipfile.ZipFile(io.BytesIO(zip_bytes), 'r') as in_zip, \
-                 zipfile.ZipFile(output_zip_io, 'w', zipfile.ZIP_DEFLATED) as out_zip:
+                 zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as out_zip:
                 
                 found_save_file = False
                 
                 for item in in_zip.infolist():
-                    file_data = in_zip.read(item.filename)
-                    
                     # Check if this is a save file (SCCA* or SCRR*)
                     # Usually they are at the root or in a folder, but we look for the filename pattern
                     filename = Path(item.filename).name
@@ -53,28 +74,53 @@ class ImageInjectorService:
                         
                         try:
                             # Attempt to process this file
-                            modified_data = self._inject_into_save_file(file_data, bin_data)
-                            out_zip.writestr(item, modified_data)
+                            modified_data = self._inject_into_save_file(in_zip.read(item), bin_data)
+                            out_zip.writestr(copy.copy(item), modified_data)
                             found_save_file = True
                             logger.info(f"Successfully modified {item.filename}")
+                            continue
                         except Exception as e:
                             logger.error(f"Failed to process {item.filename}: {e}")
                             # If we fail, just write the original file back? 
                             # Or maybe we shouldn't fail silently. For now, write original back.
-                            out_zip.writestr(item, file_data)
-                    else:
-                        # Copy other files as is
-                        out_zip.writestr(item, file_data)
+
+                    # Copy other files as is
+                    self._copy_member_raw(source, item, out_zip)
                 
                 if not found_save_file:
                     raise ValueError("No valid save file (SCCA* or SCRR*) found in the ZIP.")
 
-            return output_zip_io.getvalue(), "modified_toybox.zip"
+            output.seek(0)
+            return output, "modified_toybox.zip"
 
         except Exception as e:
+            output.close()
             logger.error(f"Error in process_toybox: {e}")
             raise
 
+    def _copy_member_raw(self, source: memoryview, item: zipfile.ZipInfo, out_zip: zipfile.ZipFile):
+        """
+        Appends a ZIP member to out_zip without decompressing it.
+
+        zipfile has no public API for this, so the local header is rebuilt from the
+        central directory entry and the compressed bytes are written straight to the
+        archive, the same way ZipFile.writestr does after compressing.
+        """
+        signature, name_len, extra_len = _LOCAL_HEADER.unpack_from(source, item.header_offset)
+        if signature != b'PK\x03\x04':
+            raise zipfile.BadZipFile(f"Bad local file header for {item.filename}")
+        data_start = item.header_offset + _LOCAL_HEADER.size + name_len + extra_len
+
+        entry = copy.copy(item)
+        # CRC and sizes are known, so they go into the local header instead of a data descriptor
+        entry.flag_bits &= ~0x08
+        entry.header_offset = out_zip.fp.tell()
+        out_zip.fp.write(entry.FileHeader())
+        out_zip.fp.write(source[data_start:data_start + item.compress_size])
+        out_zip.filelist.append(entry)
+        out_zip.NameToInfo[entry.filename] = entry
+        out_zip.start_dir = out_zip.fp.tell()
+
     def _convert_image_to_bin(self, image_bytes: bytes) -> bytes:
         """Converts an image (bytes) to DXT1 binary format, resizing if necessary."""
         img = Image.open(io.BytesIO(image_bytes))
@@ -91,7 +137,10 @@ class ImageInjectorService:
         """Full pipeline: Decompress -> Inject -> Recompress"""
         
         # 1. Decompress
-        decompressed_data, header_info = self._decompress_file(save_file_data)
+        try:
+            header, decompressed_data = save_codec.decode(save_file_data)
+        except zlib.error as e:
+            raise ValueError(f"Decompression failed: {e}")
         
         # 2. Inject
         # Convert binary data to hex string
@@ -113,193 +162,160 @@ class ImageInjectorService:
             
         # Replace
         # Note: The original script used re.sub with a string.
-        new_text_content = pattern.sub(r'\1' + hex_blob, text_content, count=1)
+        new_text_content = pattern.sub(r'\g<1>' + hex_blob, text_content, count=1)
         
         # Encode back to bytes
         new_decompressed_data = new_text_content.encode('utf-8') # Or latin-1? Usually these are ASCII/UTF-8 compatible.
         
-        # 3. Recompress
-        return self._compress_file_fixed(new_decompressed_data, save_file_data)
+        # 3. Recompress (level 1, CMP1 block padded to the next 64-byte boundary)
+        return save_codec.encode(new_decompressed_data, header, level=1, alignment=64)
 
     # --- Helper methods adapted from existing scripts ---
 
-    def _hash_file(self, k: bytes, length: int, initval: int) -> int:
-        """Jenkins hash implementation from inflate.py"""
-        def mix(a, b, c):
-            a = (a - b - c) & 0xffffffff; a ^= (c >> 13)
-            b = (b - c - a) & 0xffffffff; b ^= (a << 8) & 0xffffffff
-            c = (c - a - b) & 0xffffffff; c ^= (b >> 13)
-            a = (a - b - c) & 0xffffffff; a ^= (c >> 12)
-            b = (b - c - a) & 0xffffffff; b ^= (a << 16) & 0xffffffff
-            c = (c - a - b) & 0xffffffff; c ^= (b >> 5)
-            a = (a - b - c) & 0xffffffff; a ^= (c >> 3)
-            b = (b - c - a) & 0xffffffff; b ^= (a << 10) & 0xffffffff
-            c = (c - a - b) & 0xffffffff; c ^= (b >> 15)
-            return a & 0xffffffff, b & 0xffffffff, c & 0xffffffff
-
-        a = b = 0x9e3779b9
-        c = initval
-        pos = 0
-
-        while length - pos >= 12:
-            a += int.from_bytes(k[pos:pos+4], 'little')
-            b += int.from_bytes(k[pos+4:pos+8], 'little')
-            c += int.from_bytes(k[pos+8:pos+12], 'little')
-            a, b, c = mix(a & 0xffffffff, b & 0xffffffff, c & 0xffffffff)
-            pos += 12
-
-        c += length
-        remainder = k[pos:]
-
-        if len(remainder) >= 11: c += remainder[10] << 24
-        if len(remainder) >= 10: c += remainder[9] << 16
-        if len(remainder) >= 9:  c += remainder[8] << 8
-        if len(remainder) >= 8:  b += remainder[7] << 24
-        if len(remainder) >= 7:  b += remainder[6] << 16
-        if len(remainder) >= 6:  b += remainder[5] << 8
-        if len(remainder) >= 5:  b += remainder[4]
-        if len(remainder) >= 4:  a += remainder[3] << 24
-        if len(remainder) >= 3:  a += remainder[2] << 16
-        if len(remainder) >= 2:  a += remainder[1] << 8
-        if len(remainder) >= 1:  a += remainder[0]
-
-        a, b, c = mix(a & 0xffffffff, b & 0xffffffff, c & 0xffffffff)
-        return c & 0xffffffff
-
-    def _decompress_file(self, data: bytes) -> tuple[bytes, dict]:
-        """Decompresses the save file data."""
-        # Read Main Header
-        # version = struct.unpack('<I', data[0:4])[0]
-        # total_filesize = struct.unpack('<I', data[4:8])[0]
-        
-        # Find CMP1 marker
-        try:
-            cmp1_offset = data.index(b'CMP1')
-        except ValueError:
-            raise ValueError("'CMP1' magic string not found in file.")
-
-        # Read CMP1 Header
-        cmp1_header_offset = cmp1_offset + 4
-        # uncompressed_size = struct.unpack('<i', data[cmp1_header_offset:cmp1_header_offset+4])[0]
-        compressed_size = struct.unpack('<i', data[cmp1_header_offset+4:cmp1_header_offset+8])[0]
-        
-        # The actual compressed data starts after the CMP1 header (20 bytes total)
-        compressed_data_offset = cmp1_offset + 20
-        compressed_data = data[compressed_data_offset : compressed_data_offset + compressed_size]
+    # DXT1 output record per 4x4 block: two RGB565 endpoints and 16 2-bit indices
+    _DXT1_BLOCK_DTYPE = np.dtype([('c0', '<u2'), ('c1', '<u2'), ('indices', '<u4')])
 
-        try:
-            decompressed_data = zlib.decompress(compressed_data)
-            return decompressed_data, {} # We don't strictly need the header info for recompression as we use the original file as template
-        except zlib.error as e:
-            raise ValueError(f"Decompression failed: {e}")
+    def _convert_rgb_to_565(self, colors: np.ndarray) -> np.ndarray:
+        """Packs an (..., 3) array of 8-bit RGB colors into RGB565."""
+        colors = colors.astype(np.int32)
+        return ((colors[..., 0] >> 3) << 11) | ((colors[..., 1] >> 2) << 5) | (colors[..., 2] >> 3)
 
-    def _compress_file_fixed(self, raw_data: bytes, original_file_data: bytes) -> bytes:
-        """Compresses the data back into the save file format."""
-        
-        # --- Compression (Level 1) ---
-        compressed_data = zlib.compress(raw_data, 1)
-        
-        uncompressed_size = len(raw_data)
-        compressed_size = len(compressed_data)
+    def _expand_565(self, c: np.ndarray) -> np.ndarray:
+        """Expands an array of RGB565 colors back to an (..., 3) array of 8-bit RGB."""
+        r = ((c >> 11) & 0x1F) * 255 // 31
+        g = ((c >>  5) & 0x3F) * 255 // 63
+        b = ( c        & 0x1F) * 255 // 31
+        return np.stack([r, g, b], axis=-1)
 
-        uncompressed_checksum = self._hash_file(raw_data, len(raw_data), 0)
-        compressed_checksum = self._hash_file(compressed_data, len(compressed_data), 0)
+    def _to_blocks(self, arr: np.ndarray) -> np.ndarray:
+        """Splits an (H, W, 3) image into an (N, 16, 3) tensor of 4x4 blocks in DXT1 order."""
+        blocks_y, blocks_x = arr.shape[0] // 4, arr.shape[1] // 4
+        arr = arr[:blocks_y * 4, :blocks_x * 4]
+        return arr.reshape(blocks_y, 4, blocks_x, 4, 3).transpose(0, 2, 1, 3, 4).reshape(-1, 16, 3)
 
-        # Build CMP1 block header
-        cmp1_header = b'CMP1'
-        cmp1_header += struct.pack('<iiII', uncompressed_size, compressed_size, uncompressed_checksum, compressed_checksum)
+    def _match_palette(self, pixels: np.ndarray, c0: np.ndarray, c1: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Builds the 4-color palettes and picks the nearest entry per pixel.
 
-        # Combine header and compressed data
-        cmp1_block_unpadded = cmp1_header + compressed_data
-        
-        # --- FINAL FIX v3: Pad to the next 64-byte boundary ---
-        pad_len = (64 - (len(cmp1_block_unpadded) % 64)) % 64
-        padding = b'\x00' * pad_len
-        
-        # Final CMP1 block
-        final_cmp1_block = cmp1_block_unpadded + padding
-        unpadded_size_new = len(final_cmp1_block)
-        
-        # --- Reuse the original main header but overwrite ALL size-related values ---
-        cmp1_offset = 64
-        total_filesize_new = cmp1_offset + unpadded_size_new
-
-        final_data = bytearray(original_file_data) 
-        final_data[4:8] = struct.pack('<I', total_filesize_new)
-        final_data[12:16] = struct.pack('<I', uncompressed_size)
-        final_data[16:20] = struct.pack('<I', unpadded_size_new)
-        
-        # Construct the final file
-        final_data = final_data[:cmp1_offset] + final_cmp1_block
-        
-        # Ensure the final byte stream has the correct total length
-        final_data = final_data[:total_filesize_new]
-        
-        return bytes(final_data)
+        Returns the (N, 16) palette indices and the squared error of each block.
+        """
+        rgb0 = self._expand_565(c0)
+        rgb1 = self._expand_565(c1)
+        palette = np.stack([rgb0, rgb1, (2 * rgb0 + rgb1) // 3, (rgb0 + 2 * rgb1) // 3], axis=1)
 
-    def _convert_rgb_to_565(self, r, g, b):
-        return ((int(r) >> 3) << 11) | ((int(g) >> 2) << 5) | (int(b) >> 3)
+        # (N, 16, 4) squared distances minus the per-pixel constant |p|^2, which does not
+        # change the argmin. All values stay integers below 2^24, so float32 is exact and
+        # argmin picks the same (first) entry on ties as the reference encoder.
+        palette = palette.astype(np.float32)
+        pixels = pixels.astype(np.float32)
+        dists = (palette * palette).sum(axis=2)[:, None, :] - 2 * np.matmul(pixels, palette.transpose(0, 2, 1))
+        indices = np.argmin(dists, axis=2)
+        error = np.take_along_axis(dists, indices[..., None], axis=2).sum(axis=(1, 2)) + (pixels * pixels).sum(axis=(1, 2))
+        return indices, error
 
-    def _pack_dxt1_block(self, block):
-        pixels = block.reshape(-1, 3)
-        min_col = np.min(pixels, axis=0)
-        max_col = np.max(pixels, axis=0)
-        
-        c0 = self._convert_rgb_to_565(*max_col)
-        c1 = self._convert_rgb_to_565(*min_col)
-        
-        if c0 < c1:
-            c0, c1 = c1, c0
-            max_col, min_col = min_col, max_col
-
-        def expand565(c):
-            r = ((c >> 11) & 0x1F) * 255 // 31
-            g = ((c >>  5) & 0x3F) * 255 // 63
-            b = ( c        & 0x1F) * 255 // 31
-            return np.array([r, g, b])
-
-        rgb0 = expand565(c0)
-        rgb1 = expand565(c1)
-        
-        palette = np.zeros((4, 3))
-        palette[0] = rgb0
-        palette[1] = rgb1
-        palette[2] = (2 * rgb0 + rgb1) // 3
-        palette[3] = (rgb0 + 2 * rgb1) // 3
-        
-        indices = []
-        for p in pixels:
-            dists = np.sum((palette - p)**2, axis=1)
-            indices.append(np.argmin(dists))
-            
-        packed_indices = 0
-        for i, idx in enumerate(indices):
-            packed_indices |= (idx << (2 * i))
-            
-        return struct.pack('<HHI', c0, c1, packed_indices)
+    def _pack_dxt1_blocks(self, pixels: np.ndarray, c0: np.ndarray, c1: np.ndarray) -> bytes:
+        """Picks the palette entry per pixel and packs all blocks."""
+        indices, _ = self._match_palette(pixels, c0, c1)
+        packed_indices = np.bitwise_or.reduce(indices.astype(np.uint32) << (2 * np.arange(16, dtype=np.uint32)), axis=1)
+
+        out = np.empty(len(pixels), dtype=self._DXT1_BLOCK_DTYPE)
+        out['c0'] = c0
+        out['c1'] = c1
+        out['indices'] = packed_indices
+        return out.tobytes()
+
+    # Weight of (endpoint 0, endpoint 1) in each of the four palette entries
+    _DXT1_WEIGHTS = np.array([[1, 0], [0, 1], [2 / 3, 1 / 3], [1 / 3, 2 / 3]], dtype=np.float32)
+
+    def _quantize_565(self, colors: np.ndarray) -> np.ndarray:
+        """Rounds an (..., 3) array of float RGB colors to the nearest RGB565 values."""
+        colors = np.clip(colors, 0, 255)
+        r = np.rint(colors[..., 0] * (31 / 255)).astype(np.int32)
+        g = np.rint(colors[..., 1] * (63 / 255)).astype(np.int32)
+        b = np.rint(colors[..., 2] * (31 / 255)).astype(np.int32)
+        return (r << 11) | (g << 5) | b
+
+    def _order_endpoints(self, c0: np.ndarray, c1: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Puts the larger endpoint first, which selects the 4-color DXT1 mode."""
+        swap = c0 < c1
+        return np.where(swap, c1, c0), np.where(swap, c0, c1)
+
+    def _fit_endpoints(self, pixels: np.ndarray, iterations: int = 3) -> tuple[np.ndarray, np.ndarray]:
+        """
+        High quality endpoint selection for all blocks at once.
+
+        The initial endpoints are the extremes of the block's pixels projected onto their
+        principal axis (the largest eigenvector of the color covariance). They are then
+        refined by solving the least-squares problem for the current palette assignment
+        and re-matching; a block only takes the new endpoints if its error goes down.
+        """
+        px = pixels.astype(np.float32)
+        mean = px.mean(axis=1)
+        centered = px - mean[:, None, :]
+        covariance = np.matmul(centered.transpose(0, 2, 1), centered)
+        axis = np.linalg.eigh(covariance)[1][..., -1]
+
+        t = np.matmul(centered, axis[..., None])[..., 0]
+        e0 = mean + t.max(axis=1)[:, None] * axis
+        e1 = mean + t.min(axis=1)[:, None] * axis
+        c0, c1 = self._order_endpoints(self._quantize_565(e0), self._quantize_565(e1))
+        indices, error = self._match_palette(pixels, c0, c1)
+
+        for _ in range(iterations):
+            # Normal equations of min sum |w0*e0 + w1*e1 - p|^2, one 2x2 system per block
+            w = self._DXT1_WEIGHTS[indices]
+            w0, w1 = w[..., 0], w[..., 1]
+            a00 = (w0 * w0).sum(axis=1)
+            a01 = (w0 * w1).sum(axis=1)
+            a11 = (w1 * w1).sum(axis=1)
+            r0 = np.matmul(w0[:, None, :], px)[:, 0]
+            r1 = np.matmul(w1[:, None, :], px)[:, 0]
+
+            det = a00 * a11 - a01 * a01
+            solvable = det > 1e-6
+            det = np.where(solvable, det, 1)[:, None]
+            e0 = (a11[:, None] * r0 - a01[:, None] * r1) / det
+            e1 = (a00[:, None] * r1 - a01[:, None] * r0) / det
+
+            n0, n1 = self._order_endpoints(self._quantize_565(e0), self._quantize_565(e1))
+            new_indices, new_error = self._match_palette(pixels, n0, n1)
+
+            better = solvable & (new_error < error)
+            if not better.any():
+                break
+            c0 = np.where(better, n0, c0)
+            c1 = np.where(better, n1, c1)
+            indices = np.where(better[:, None], new_indices, indices)
+            error = np.where(better, new_error, error)
+
+        return c0, c1
 
     def _compress_dxt1(self, img):
-        width, height = img.size
-        # Ensure dimensions are multiples of 4
-        # (The resize step should handle this, but good to be safe)
-        
-        arr = np.array(img.convert('RGB'))
-        blocks_x = width // 4
-        blocks_y = height // 4
-        
-        dxt_data = bytearray()
-        
-        for by in range(blocks_y):
-            for bx in range(blocks_x):
-                y0, x0 = by * 4, bx * 4
-                block = arr[y0:y0+4, x0:x0+4]
-                
-                if block.shape != (4, 4, 3):
-                    padded = np.zeros((4, 4, 3), dtype=np.uint8)
-                    h, w, _ = block.shape
-                    padded[:h, :w, :] = block
-                    block = padded
-                    
-                dxt_data.extend(self._pack_dxt1_block(block))
-                
-        return bytes(dxt_data)
+        """Encodes the whole image at once; partial blocks at the right/bottom edge are dropped."""
+        pixels = self._to_blocks(np.asarray(img.convert('RGB')))
+
+        if self.quality == "high":
+            c0, c1 = self._fit_endpoints(pixels)
+            return self._pack_dxt1_blocks(pixels, c0, c1)
+
+        # Endpoints: per-channel max and min of each block (reduced over a channel-major copy,
+        # which is much faster than reducing the short middle axis)
+        channels = np.ascontiguousarray(pixels.transpose(0, 2, 1))
+        c0 = self._convert_rgb_to_565(channels.max(axis=2))
+        c1 = self._convert_rgb_to_565(channels.min(axis=2))
+        c0, c1 = self._order_endpoints(c0, c1)
+
+        return self._pack_dxt1_blocks(pixels, c0, c1)
+
+
+def replace_screenshot(zip_bytes: bytes, image_bytes: bytes, quality: str, output_path: str) -> str:
+    """
+    CPU executor job: replaces the screenshot and writes the modified ZIP to output_path,
+    so the archive doesn't have to be sent back from the worker process.
+
+    Returns the suggested filename of the modified ZIP.
+    """
+    modified_zip, filename = ImageInjectorService(quality=quality).process_toybox(zip_bytes, image_bytes)
+    with modified_zip, open(output_path, 'wb') as f:
+        shutil.copyfileobj(modified_zip, f)
+    return filename
@@ -0,0 +1,140 @@
+import heapq
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+_WORD = re.compile(r"[a-z0-9]+(?:['\-.][a-z0-9]+)*")
+_JOINERS = re.compile(r"['\-.]")
+
+# Field weights: a term in the name counts three times, in the tags twice
+NAME_WEIGHT = 3
+TAGS_WEIGHT = 2
+DESCRIPTION_WEIGHT = 1
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lowercase word tokens. Joined words ("K-2SO", "Spider-Man", "Jyn's") are indexed
+    both as one token without the joiners ("k2so", "spiderman") and as their parts, so
+    either spelling in a query matches.
+    """
+    tokens = []
+    for word in _WORD.findall(text.lower()):
+        parts = _JOINERS.split(word)
+        if len(parts) > 1:
+            tokens.append("".join(parts))
+        tokens.extend(parts)
+    return tokens
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60) -> list[str]:
+    """Merges ranked ID lists: each ID scores sum(1 / (k + rank)) over the lists it appears in."""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] += 1 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class LexicalIndex:
+    """
+    In-memory BM25 inverted index over toybox names, tags and descriptions.
+
+    sync() applies only the differences to a new toybox list, so keeping the index in
+    step with the toybox catalog is cheap. Searching needs no network call.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._postings = defaultdict(dict)  # token -> {doc_id: weighted term frequency}
+        self._doc_lengths = {}
+        self._total_length = 0
+        self.toyboxes = {}  # doc_id -> toybox dict
+
+    @staticmethod
+    def _terms(toybox: dict) -> Counter:
+        terms = Counter()
+        for token in tokenize(toybox.get('name', '')):
+            terms[token] += NAME_WEIGHT
+        for token in tokenize(" ".join(toybox.get('tags', []))):
+            terms[token] += TAGS_WEIGHT
+        for token in tokenize(toybox.get('description', '')):
+            terms[token] += DESCRIPTION_WEIGHT
+        return terms
+
+    def _remove(self, doc_id: str):
+        old = self.toyboxes.pop(doc_id, None)
+        if old is None:
+            return
+        for token in self._terms(old):
+            postings = self._postings[token]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[token]
+        self._total_length -= self._doc_lengths.pop(doc_id)
+
+    def _add(self, doc_id: str, toybox: dict):
+        terms = self._terms(toybox)
+        for token, frequency in terms.items():
+            self._postings[token][doc_id] = frequency
+        length = sum(terms.values())
+        self._doc_lengths[doc_id] = length
+        self._total_length += length
+        # A copy, so later in-place edits of the caller's dict still show up as changes in sync()
+        self.toyboxes[doc_id] = {**toybox, 'tags': list(toybox.get('tags', []))}
+
+    def upsert(self, toybox: dict):
+        doc_id = str(toybox['id'])
+        with self._lock:
+            self._remove(doc_id)
+            self._add(doc_id, toybox)
+
+    def remove(self, doc_id: str):
+        with self._lock:
+            self._remove(doc_id)
+
+    def sync(self, toybox_list: list[dict]) -> tuple[list[str], list[str]]:
+        """
+        Makes the index match the toybox list: new and edited toyboxes are (re)indexed,
+        ones no longer in the list are dropped.
+
+        Returns:
+            A tuple of (updated, removed) document ID lists.
+        """
+        current = {str(tb['id']): tb for tb in toybox_list}
+        updated, removed = [], []
+        with self._lock:
+            for doc_id in set(self.toyboxes) - set(current):
+                self._remove(doc_id)
+                removed.append(doc_id)
+            for doc_id, toybox in current.items():
+                old = self.toyboxes.get(doc_id)
+                if old is not None and (old.get('name'), old.get('tags'), old.get('description'), old.get('url')) == \
+                        (toybox.get('name'), toybox.get('tags'), toybox.get('description'), toybox.get('url')):
+                    continue
+                self._remove(doc_id)
+                self._add(doc_id, toybox)
+                updated.append(doc_id)
+        return updated, removed
+
+    def search(self, query: str, limit: int = 15) -> list[tuple[str, float]]:
+        """The `limit` best (doc_id, score) pairs for the query by BM25, best first."""
+        with self._lock:
+            doc_count = len(self._doc_lengths)
+            if not doc_count:
+                return []
+            avg_length = self._total_length / doc_count
+            scores = defaultdict(float)
+            for token in set(tokenize(query)):
+                postings = self._postings.get(token)
+                if not postings:
+                    continue
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
@@ -0,0 +1,108 @@
+import asyncio
+import inspect
+import time
+from collections import OrderedDict
+
+import config
+from utils.logger import logger
+
+
+def normalize_query(query: str) -> str:
+    """Cache key for a search query: lowercase with collapsed whitespace."""
+    return " ".join(query.lower().split())
+
+
+def gemini_embed_query(text: str) -> list[float]:
+    """Embeds a single search query with Gemini."""
+    import google.generativeai as genai
+
+    return genai.embed_content(model=config.EMBEDDING_MODEL_NAME, content=text, task_type="retrieval_query")['embedding']
+
+
+class QueryEmbeddingCache:
+    """
+    In-memory LRU of search query embeddings with a TTL, optionally backed by the
+    persistent EmbeddingCache so entries survive restarts.
+
+    Queries are keyed (and embedded) by their normalized text, so "Marvel  Racing" and
+    "marvel racing" share one entry. Concurrent lookups of a query that is not cached yet
+    wait for the same upstream request instead of each sending their own.
+    """
+
+    def __init__(self, embed_query=gemini_embed_query, max_entries: int = 512, ttl: float = 86400,
+                 disk_cache=None, model: str = config.EMBEDDING_MODEL_NAME):
+        self.embed_query = embed_query
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_cache = disk_cache
+        self.model = model
+        self._entries = OrderedDict()  # key -> (expires_at, embedding)
+        self._pending = {}  # key -> task fetching the embedding
+        self.hits = 0
+        self.disk_hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self._upstream_seconds = 0.0
+
+    async def _embed(self, text: str) -> list[float]:
+        if inspect.iscoroutinefunction(self.embed_query):
+            return await self.embed_query(text)
+        return await asyncio.to_thread(self.embed_query, text)
+
+    async def _fetch(self, key: str) -> list[float]:
+        embedding = None
+        if self.disk_cache is not None:
+            embedding = await asyncio.to_thread(self.disk_cache.get, self.model, "retrieval_query", key, self.ttl)
+        if embedding is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            start = time.perf_counter()
+            embedding = await self._embed(key)
+            self._upstream_seconds += time.perf_counter() - start
+            if self.disk_cache is not None:
+                await asyncio.to_thread(self.disk_cache.put, self.model, "retrieval_query", key, embedding)
+
+        self._entries[key] = (time.monotonic() + self.ttl, embedding)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return embedding
+
+    async def get(self, query: str) -> list[float]:
+        """Returns the embedding for a search query, embedding it only if needed."""
+        key = normalize_query(query)
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, embedding = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return embedding
+            del self._entries[key]
+
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch(key))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        else:
+            self.coalesced += 1
+            logger.debug(f"Query embedding for '{key}' already in flight; waiting for it.")
+        # Shielded, so one cancelled caller doesn't cancel the request the others wait for
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        """Hit/miss counters and the upstream latency they saved (estimated from the average miss)."""
+        lookups = self.hits + self.disk_hits + self.coalesced + self.misses
+        avg_upstream = self._upstream_seconds / self.misses if self.misses else 0.0
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'coalesced': self.coalesced,
+            'misses': self.misses,
+            'hit_rate': (lookups - self.misses) / lookups if lookups else 0.0,
+            'avg_upstream_ms': avg_upstream * 1000,
+            'saved_ms': (lookups - self.misses) * avg_upstream * 1000,
+        }
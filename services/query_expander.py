@@ -0,0 +1,156 @@
+import json
+import re
+import unicodedata
+from typing import NamedTuple
+
+import config
+from utils.logger import logger
+
+_WORD = re.compile(r"[a-z0-9]+(?:['\-][a-z0-9]+)*")
+_JOINERS = re.compile(r"['\-]")
+_YEAR_SUFFIX = re.compile(r"\s*\(\d{4}\)$")
+
+# Keywords of a concept added to the query when the user names the concept itself
+MAX_RELATED = 5
+
+# An expansion naming more concepts than this is too vague to skip the LLM refinement
+MAX_CONCEPTS = 2
+
+# Conversational filler the LLM refinement step used to strip from requests
+FILLER_WORDS = frozenset("""
+    a about an and any anything are can could do does find for from get give good got have i in is it
+    looking me my of on one ones or play please recommend search show some something that the there
+    these this to toybox toyboxes map maps game games want what where which with would you
+""".split())
+
+
+def _normalize(text: str) -> str:
+    """Lowercase without accents, so "Chirrut Îmwe" matches "chirrut imwe"."""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def _words(text: str) -> list[str]:
+    """Words with the joiners removed: "K-2SO" -> "k2so", "Qi'ra" -> "qira"."""
+    return [_JOINERS.sub("", word) for word in _WORD.findall(_normalize(text))]
+
+
+def _variants(phrase: str) -> set[tuple[str, ...]]:
+    """The token sequences a phrase is matched as: joined ("obiwan") and split ("obi wan")."""
+    normalized = _normalize(phrase)
+    joined = tuple(_words(phrase))
+    split = tuple(part for word in _WORD.findall(normalized) for part in _JOINERS.split(word))
+    return {joined, split} - {()}
+
+
+class Match(NamedTuple):
+    phrase: str  # the alias or keyword as written in the knowledge base
+    concepts: tuple  # indices of the concepts it belongs to
+    is_alias: bool
+
+
+class QueryExpansion(NamedTuple):
+    matches: list  # Match tuples, in query order
+    concepts: list  # canonical concept names
+    residual: list  # query words that are neither matched nor filler
+    related: list  # keywords of concepts named by an alias
+    confident: bool
+
+    @property
+    def search_query(self) -> str:
+        """Concept titles, matched terms, remaining words and related keywords, without duplicates."""
+        titles = [_YEAR_SUFFIX.sub("", concept) for concept in self.concepts]
+        terms = titles + [match.phrase for match in self.matches] + self.residual + self.related
+        seen = set()
+        return " ".join(term for term in terms if not (term.lower() in seen or seen.add(term.lower())))
+
+
+class QueryExpander:
+    """
+    Expands search queries with knowledge_base.json, without an LLM call.
+
+    Every alias and keyword is inserted into a trie over words, and a query is matched
+    by walking the trie from each word, keeping the longest phrase (leftmost-longest,
+    non-overlapping). Matching costs microseconds for queries of a few words.
+
+    An expansion is only confident (used instead of the LLM refinement) when an alias or
+    title names at most MAX_CONCEPTS concepts and few query words are left unmatched.
+    """
+
+    def __init__(self, path: str = config.KNOWLEDGE_BASE_FILE, max_unmatched: int = 3):
+        self.max_unmatched = max_unmatched
+        self.concepts = []
+        self._keywords = []
+        self._trie = {}
+        self.load(path)
+
+    def load(self, path: str):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except Exception as e:
+            logger.error(f"❌ Failed to load knowledge base {path}: {e}")
+            return
+
+        self.concepts = [entry['concept'] for entry in entries]
+        self._keywords = [entry.get('keywords', []) for entry in entries]
+        self._trie = {}
+        for index, entry in enumerate(entries):
+            for phrase in [entry['concept']] + entry.get('aliases', []):
+                self._insert(phrase, index, True)
+            for phrase in entry.get('keywords', []):
+                self._insert(phrase, index, False)
+        logger.info(f"✅ Query expander loaded {len(self.concepts)} concepts.")
+
+    def _insert(self, phrase: str, concept: int, is_alias: bool):
+        for tokens in _variants(phrase):
+            # A bare year ("2018") or filler word says nothing about the subject of a query
+            if all(token.isdigit() or token in FILLER_WORDS for token in tokens):
+                continue
+            node = self._trie
+            for token in tokens:
+                node = node.setdefault(token, {})
+            # A phrase shared by several concepts ("Star Wars Story") maps to all of them;
+            # the first spelling seen is the one reported
+            match = node.get(None)
+            if match is None:
+                node[None] = Match(phrase, (concept,), is_alias)
+            elif concept not in match.concepts:
+                node[None] = Match(match.phrase, match.concepts + (concept,), match.is_alias or is_alias)
+
+    def expand(self, query: str) -> QueryExpansion:
+        words = _words(query)
+        matches, residual = [], []
+        position = 0
+        while position < len(words):
+            node, longest, end = self._trie, None, position
+            for i in range(position, len(words)):
+                node = node.get(words[i])
+                if node is None:
+                    break
+                if None in node:
+                    longest, end = node[None], i + 1
+            if longest is not None:
+                matches.append(longest)
+                position = end
+                continue
+            if words[position] not in FILLER_WORDS:
+                residual.append(words[position])
+            position += 1
+
+        aliased = list(dict.fromkeys(index for match in matches if match.is_alias for index in match.concepts))
+        # A keyword ("Empire", "Darth Vader") is shared by many concepts and doesn't name one;
+        # only concepts named by an alias or title make the expansion confident
+        concept_ids = aliased or list(dict.fromkeys(index for match in matches for index in match.concepts))
+        related = list(dict.fromkeys(keyword for index in aliased for keyword in self._keywords[index]))[:MAX_RELATED]
+        return QueryExpansion(
+            matches=matches,
+            concepts=[self.concepts[index] for index in concept_ids],
+            residual=residual,
+            related=related,
+            confident=bool(aliased) and len(aliased) <= MAX_CONCEPTS and len(residual) <= self.max_unmatched
+        )
+
+
+# Global instance
+query_expander = QueryExpander()
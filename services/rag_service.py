@@ -1,14 +1,33 @@
-import chromadb
+import asyncio
 import google.generativeai as genai
+import hashlib
+import json
 import logging
 import config
+from services.answer_cache import AnswerCache
+from services.context_builder import compress_description
+from services.embedding_cache import embedding_cache
+from services.embedding_pipeline import EmbeddingPipeline
+from services.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from services.query_embedding_cache import QueryEmbeddingCache
+from services.toybox_catalog import toybox_catalog
+from services.vector_store import create_vector_store
 
 logger = logging.getLogger("DonaldBot")
 
 class RagService:
     def __init__(self):
-        self.chroma_client = None
-        self.toybox_collection = None
+        self.vector_store = None
+        self.embedding_pipeline = EmbeddingPipeline(
+            batch_size=config.EMBEDDING_BATCH_SIZE,
+            concurrency=config.EMBEDDING_CONCURRENCY,
+            cache=embedding_cache
+        )
+        self.query_cache = QueryEmbeddingCache(
+            max_entries=config.QUERY_EMBEDDING_CACHE_SIZE,
+            ttl=config.QUERY_EMBEDDING_TTL,
+            disk_cache=embedding_cache if config.QUERY_EMBEDDING_DISK_CACHE else None
+        )
         
         # Configure Gemini API for embeddings
         if config.GEMINI_API_KEY:
@@ -17,157 +36,227 @@ class RagService:
         else:
             logger.warning("⚠️ GEMINI_API_KEY not found. Embedding features will fail.")
         
-        self.setup_chromadb()
+        self.setup_vector_store()
 
-    def setup_chromadb(self):
+        self.lexical_index = LexicalIndex()
+        self.lexical_index.sync(toybox_catalog.all())
+        logger.info(f"✅ Lexical index built with {len(self.lexical_index.toyboxes)} toyboxes.")
+        self.db_version = None
+        self._update_db_version()
+        # Toybox IDs whose embedding failed in the last ingest, retried in the next one.
+        # None until an ingest has checked every toybox against the vector store.
+        self._unembedded = None
+
+        self.answer_cache = AnswerCache(
+            embed_query=self.query_cache.get,
+            max_entries=config.ANSWER_CACHE_SIZE,
+            ttl=config.ANSWER_CACHE_TTL,
+            similarity=config.ANSWER_CACHE_SIMILARITY
+        )
+
+    def setup_vector_store(self):
         try:
-            self.chroma_client = chromadb.PersistentClient(path=config.CHROMA_DB_PATH)
-            self.toybox_collection = self.chroma_client.get_or_create_collection(name="toybox_collection")
-            logger.info(f"✅ ChromaDB connected. Collection has {self.toybox_collection.count()} items.")
+            self.vector_store = create_vector_store(config.VECTOR_STORE_BACKEND)
+            logger.info(f"✅ Vector store ({config.VECTOR_STORE_BACKEND}) connected. It has {self.vector_store.count()} items.")
         except Exception as e:
-            logger.error(f"❌ Failed to connect to ChromaDB: {e}")
-            self.toybox_collection = None
+            logger.error(f"❌ Failed to open the {config.VECTOR_STORE_BACKEND} vector store: {e}")
+            self.vector_store = None
+
+    def _update_db_version(self):
+        """Fingerprint of the indexed toyboxes; it changes whenever one is added, edited or removed."""
+        snapshot = json.dumps(sorted(self.lexical_index.toyboxes.items()), ensure_ascii=False, sort_keys=True)
+        self.db_version = hashlib.sha256(snapshot.encode('utf-8')).hexdigest()[:16]
+
+    def _summary_of(self, toybox_id: str) -> str:
+        """Prompt-sized description for entries stored without a precomputed summary."""
+        toybox = self.lexical_index.toyboxes.get(toybox_id)
+        return compress_description(toybox.get("description", ""), config.CONTEXT_ITEM_TOKENS) if toybox else ""
+
+    async def _vector_search(self, query: str, max_results: int) -> list[dict]:
+        # Create an embedding for the user's query (cached, and shared by concurrent identical queries)
+        query_embedding = await self.query_cache.get(query)
+        # Query the vector store for the most similar documents, off the event loop
+        return await asyncio.to_thread(self.vector_store.query, query_embedding, max_results)
 
     async def retrieve_toyboxes(self, query: str, max_results: int = 15) -> list[dict]:
-        """Finds relevant toyboxes using fast vector search."""
-        if not self.toybox_collection:
-            logger.error("❌ Vector DB not available, cannot retrieve.")
-            return []
+        """
+        Finds relevant toyboxes with hybrid search: BM25 over names, tags and descriptions
+        plus vector search, merged with reciprocal rank fusion. If the embedding API is
+        slow or unavailable, the lexical results are returned on their own.
+        """
+        logger.info(f"--- Performing hybrid search for query: '{query}' ---")
+        candidates = max_results * 2
 
-        logger.info(f"--- Performing vector search for query: '{query}' ---")
-        try:
-            # 1. Create an embedding for the user's query
-            query_embedding = genai.embed_content(
-                model=config.EMBEDDING_MODEL_NAME,
-                content=query,
-                task_type="retrieval_query"
-            )['embedding']
-
-            # 2. Query ChromaDB for the most similar documents
-            results = self.toybox_collection.query(
-                query_embeddings=[query_embedding],
-                n_results=max_results
-            )
-
-            # 3. Format the results
-            found_toyboxes = []
-            if results and results['ids'][0]:
-                for i, toybox_id in enumerate(results['ids'][0]):
-                    metadata = results['metadatas'][0][i]
-                    found_toyboxes.append({
-                        "id": toybox_id,
-                        "name": metadata.get("name", "Unknown"),
-                        "url": metadata.get("url", ""),
-                        "description": results['documents'][0][i], 
-                        "tags": metadata.get("tags", "").split(",")
-                    })
-            
-            logger.info(f"   -> Found {len(found_toyboxes)} relevant results from vector search.")
-            return found_toyboxes
+        # 1. Lexical search (local, instant)
+        lexical_hits = self.lexical_index.search(query, candidates)
 
-        except Exception as e:
-            logger.error(f"❌ Error during vector retrieval: {e}")
-            return []
+        # 2. Vector search, bounded by a timeout
+        vector_results = []
+        if self.vector_store:
+            try:
+                vector_results = await asyncio.wait_for(self._vector_search(query, candidates), config.VECTOR_SEARCH_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning(f"⚠️ Vector search took over {config.VECTOR_SEARCH_TIMEOUT}s; using lexical results only.")
+            except Exception as e:
+                logger.error(f"❌ Error during vector retrieval: {e}. Using lexical results only.")
+        else:
+            logger.warning("⚠️ Vector DB not available; using lexical results only.")
+
+        # 3. Merge both rankings and format the results
+        vector_by_id = {result['id']: result for result in vector_results}
+        ranking = reciprocal_rank_fusion(
+            [[doc_id for doc_id, _ in lexical_hits], list(vector_by_id)],
+            k=config.HYBRID_RRF_K
+        )
+
+        found_toyboxes = []
+        for toybox_id in ranking[:max_results]:
+            if toybox_id in vector_by_id:
+                result = vector_by_id[toybox_id]
+                metadata = result['metadata']
+                found_toyboxes.append({
+                    "id": toybox_id,
+                    "name": metadata.get("name", "Unknown"),
+                    "url": metadata.get("url", ""),
+                    "description": result['document'], 
+                    "summary": metadata.get("summary") or self._summary_of(toybox_id),
+                    "tags": metadata.get("tags", "").split(",")
+                })
+            else:
+                toybox = self.lexical_index.toyboxes[toybox_id]
+                found_toyboxes.append({
+                    "id": toybox_id,
+                    "name": toybox.get("name", "Unknown"),
+                    "url": toybox.get("url", ""),
+                    "description": toybox.get("description", ""),
+                    "summary": self._summary_of(toybox_id),
+                    "tags": toybox.get("tags", [])
+                })
+
+        logger.info(f"   -> Found {len(found_toyboxes)} relevant results "
+                    f"({len(lexical_hits)} lexical, {len(vector_results)} vector candidates).")
+        return found_toyboxes
 
     async def search_by_category(self, category: str, limit: int = 25) -> list[dict]:
         """Finds toyboxes with a specific tag."""
-        if not self.toybox_collection:
+        if not self.vector_store:
             return []
             
         try:
-            results = self.toybox_collection.get(
-                where={"tags": {"$contains": category}},
-                limit=limit
-            )
+            results = self.vector_store.with_tag(category, limit)
             
             found_toyboxes = []
-            if results and results['ids']:
-                for i, toybox_id in enumerate(results['ids']):
-                    metadata = results['metadatas'][i]
-                    found_toyboxes.append({
-                        "name": metadata.get("name", "Unknown"),
-                        "url": metadata.get("url", ""),
-                        "tags": metadata.get("tags", "").split(","),
-                        "category": category
-                    })
+            for result in results:
+                metadata = result['metadata']
+                found_toyboxes.append({
+                    "name": metadata.get("name", "Unknown"),
+                    "url": metadata.get("url", ""),
+                    "tags": metadata.get("tags", "").split(","),
+                    "category": category
+                })
             return found_toyboxes
             return found_toyboxes
         except Exception as e:
             logger.error(f"Error searching category {category}: {e}")
             return []
 
-    async def ingest_new_data(self, toybox_list: list[dict]):
-        """Ingests new toyboxes into the vector database."""
-        if not self.toybox_collection:
+    @staticmethod
+    def _is_current(document: str, metadata: dict, tb: dict) -> bool:
+        """
+        Whether a stored entry still matches the toybox. Entries are written here
+        ("name\ndescription\nTags: ...") or by indexer.py ("Name: ... Description: ..."),
+        which also adds AI tags, so the forum tags only need to be among the stored ones.
+        """
+        document = document or ""
+        metadata = metadata or {}
+        same_text = (document.startswith(f"{tb['name']}\n{tb['description']}\n")
+                     or (document.startswith(f"Name: {tb['name']}. ") and document.endswith(f"Description: {tb['description']}")))
+        stored_tags = {tag.strip() for tag in metadata.get("tags", "").split(",")}
+        return same_text and set(tb['tags']) <= stored_tags and metadata.get("url") == tb['url']
+
+    async def ingest_new_data(self, toybox_list: list[dict], check_all: bool = False):
+        """
+        Ingests new toyboxes into the vector database, refreshes edited ones and drops the
+        ones no longer in the list. The vector store is flushed to disk once, at the end.
+
+        Only the toyboxes the lexical index reports as new or edited, and those whose embedding
+        failed last time, are looked up in the vector store. With `check_all` (and on the first
+        ingest after startup) every toybox in the list is checked.
+        """
+        updated, removed = self.lexical_index.sync(toybox_list)
+        logger.info(f"🔄 Lexical index: {len(updated)} toyboxes (re)indexed, {len(removed)} removed.")
+        if updated or removed:
+            self._update_db_version()
+
+        if not self.vector_store:
             logger.warning("⚠️ Vector DB not available, skipping ingestion.")
             return
 
-        logger.info(f"🔄 Check for new toyboxes to ingest ({len(toybox_list)} items)...")
+        if not check_all and self._unembedded is not None:
+            to_check = set(updated) | self._unembedded
+            toybox_list = [tb for tb in toybox_list if str(tb['id']) in to_check]
+        # Every toybox to check counts as failed until it is found current or stored
+        self._unembedded = {str(tb['id']) for tb in toybox_list}
+
+        try:
+            return await self._ingest(toybox_list, removed)
+        finally:
+            await asyncio.to_thread(self.vector_store.flush)
+
+    async def _ingest(self, toybox_list: list[dict], removed: list[str]):
+        if removed:
+            await asyncio.to_thread(self.vector_store.delete, removed)
+            logger.info(f"🗑️ Removed {len(removed)} deleted toyboxes from the Vector DB.")
+
+        logger.info(f"🔄 Check for new or edited toyboxes to ingest ({len(toybox_list)} items)...")
         
-        # Get existing IDs to avoid re-embedding
-        existing_ids = self.toybox_collection.get()['ids']
+        # Stored documents and metadata (no embeddings) of these toyboxes, to tell unchanged entries from edited ones
+        existing_entries = await asyncio.to_thread(self.vector_store.entries, [str(tb['id']) for tb in toybox_list])
         
-        new_items = []
         new_ids = []
         new_metadatas = []
         new_documents = []
+        edited = 0
 
         for tb in toybox_list:
             str_id = str(tb['id'])
-            if str_id not in existing_ids:
-                # Prepare data for insertion
-                # text_content combining name, description and tags for better embedding
-                text_content = f"{tb['name']}\n{tb['description']}\nTags: {', '.join(tb['tags'])}"
-                
-                new_ids.append(str_id)
-                new_documents.append(text_content)
-                new_metadatas.append({
-                    "name": tb['name'],
-                    "url": tb['url'],
-                    "tags": ",".join(tb['tags'])
-                })
+            # text_content combining name, description and tags for better embedding
+            text_content = f"{tb['name']}\n{tb['description']}\nTags: {', '.join(tb['tags'])}"
+            metadata = {
+                "name": tb['name'],
+                "url": tb['url'],
+                "tags": ",".join(tb['tags']),
+                # Compressed once here, so building the prompt is just a lookup
+                "summary": compress_description(tb['description'], config.CONTEXT_ITEM_TOKENS)
+            }
+
+            if str_id in existing_entries:
+                if self._is_current(*existing_entries[str_id], tb):
+                    continue
+                edited += 1
+
+            new_ids.append(str_id)
+            new_documents.append(text_content)
+            new_metadatas.append(metadata)
         
+        self._unembedded = set(new_ids)
         if not new_ids:
             logger.info("✅ Vector DB is up to date.")
             return 0
 
-        logger.info(f"🔄 Ingesting {len(new_ids)} new toyboxes into Vector DB...")
-        
+        logger.info(f"🔄 Ingesting {len(new_ids) - edited} new and {edited} edited toyboxes into Vector DB...")
+
+        async def store_batch(ids, documents, embeddings, metadatas):
+            # Stored as each batch finishes and flushed once at the end, also when the ingest fails,
+            # so an interrupted ingest keeps its progress. Upsert replaces the entries of edited toyboxes.
+            await asyncio.to_thread(self.vector_store.upsert, ids, embeddings, documents, metadatas)
+            self._unembedded.difference_update(ids)
+
         try:
-             # Generate embeddings in batches if needed, but ChromaDB might handle it or we use Gemini explicitly
-             # Since we configured Gemini in __init__, we need to generate embeddings manually if we don't use an embedding function
-             # The existing retrieve_toyboxes uses genai.embed_content explicitly.
-             # So we should probably do the same here or rely on a default if one was set.
-             # Looking at __init__, no embedding function was passed to get_or_create_collection.
-             # So we must generate embeddings.
-             
-            embeddings = []
-            # Batch size for embeddings to avoid rate limits
-            BATCH_SIZE = 10
-            for i in range(0, len(new_documents), BATCH_SIZE):
-                batch_docs = new_documents[i:i+BATCH_SIZE]
-                
-                # Gemini embed_content supports batching? 
-                # According to docs: yes, but let's be safe and loop or check support.
-                # Actually, standard genai.embed_content takes 'content' (str) or 'content' (list)?
-                # To be safe and consistent with retrieve_toyboxes, let's just loop for now or use the batch method if available.
-                # Simple loop for safety:
-                for doc in batch_docs:
-                    emb = genai.embed_content(
-                        model=config.EMBEDDING_MODEL_NAME,
-                        content=doc,
-                        task_type="retrieval_document"
-                    )['embedding']
-                    embeddings.append(emb)
-
-            self.toybox_collection.add(
-                ids=new_ids,
-                documents=new_documents,
-                embeddings=embeddings,
-                metadatas=new_metadatas
-            )
-            logger.info(f"✅ Successfully added {len(new_ids)} new items to Vector DB.")
-            return len(new_ids)
+            added = await self.embedding_pipeline.run(new_ids, new_documents, new_metadatas, store_batch)
+            logger.info(f"✅ Successfully stored {added}/{len(new_ids)} items in Vector DB "
+                        f"({embedding_cache.hits} cached embeddings reused so far).")
+            return added
             
         except Exception as e:
             logger.error(f"❌ Error ingesting data into Vector DB: {e}")
@@ -0,0 +1,221 @@
+import logging
+import struct
+import zlib
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+# Save file layout (all values little-endian)
+#
+# Main header (64 bytes):
+#   uint32 version;
+#   uint32 totalFilesize;
+#   uint32 StorageCompression;
+#   uint32 originalSize (uncompressed);
+#   uint32 unpaddedSize (from CMP1 to end of file);
+#   uint32 StorageEncryption;
+#   ... zero padding up to 64 bytes
+#
+# CMP1 block (20 byte header + zlib stream + zero padding):
+#   string "CMP1"
+#   int32  decompressedSize;
+#   int32  compressedSize;
+#   uint32 decompressedHash;
+#   uint32 compressedHash;
+
+MAIN_HEADER_SIZE = 64
+CMP1_MAGIC = b'CMP1'
+CMP1_HEADER_SIZE = 20
+SAVE_FILE_VERSION = 519
+
+# Offset where the CMP1 scan starts (right after the six main header fields)
+_HEADER_FIELDS_SIZE = 24
+
+# The hash consumes its input as blocks of three little-endian words
+_BLOCK = struct.Struct('<3I')
+
+# The six main header fields and the CMP1 header (magic, sizes, checksums)
+_MAIN_HEADER = struct.Struct('<6I')
+_CMP1_HEADER = struct.Struct('<4siiII')
+
+
+class SaveFileError(ValueError):
+    """Raised when a save file's headers don't match its content."""
+
+
+class Cmp1Container(NamedTuple):
+    """A parsed save file. `payload` is a memoryview of the compressed stream (no copy)."""
+    header: bytes
+    cmp1_offset: int
+    decompressed_size: int
+    compressed_size: int
+    decompressed_hash: int
+    compressed_hash: int
+    payload: memoryview
+
+
+def hash_file(k: bytes, length: int, initval: int) -> int:
+    """
+    Jenkins lookup2 hash used for the CMP1 checksums.
+
+    The mix rounds depend on each other, so the blocks cannot be processed in parallel.
+    Instead the 12-byte blocks are unpacked in one pass with struct.iter_unpack and the
+    mix is inlined, which avoids the slicing and function call overhead per block.
+    """
+    a = b = 0x9e3779b9
+    c = initval
+    pos = (length // 12) * 12
+
+    if pos:
+        for x, y, z in _BLOCK.iter_unpack(memoryview(k)[:pos]):
+            a += x; b += y; c = (c + z) & 0xffffffff
+            a = (a - b - c) & 0xffffffff; a ^= c >> 13
+            b = (b - c - a) & 0xffffffff; b ^= (a << 8) & 0xffffffff
+            c = (c - a - b) & 0xffffffff; c ^= b >> 13
+            a = (a - b - c) & 0xffffffff; a ^= c >> 12
+            b = (b - c - a) & 0xffffffff; b ^= (a << 16) & 0xffffffff
+            c = (c - a - b) & 0xffffffff; c ^= b >> 5
+            a = (a - b - c) & 0xffffffff; a ^= c >> 3
+            b = (b - c - a) & 0xffffffff; b ^= (a << 10) & 0xffffffff
+            c = (c - a - b) & 0xffffffff; c ^= b >> 15
+
+    # The last 0-11 bytes: the lowest byte of c is reserved for the length
+    x, y, z = _BLOCK.unpack(bytes(k[pos:pos + 11]).ljust(12, b'\x00'))
+    a += x; b += y; c = (c + length + (z << 8)) & 0xffffffff
+
+    a = (a - b - c) & 0xffffffff; a ^= c >> 13
+    b = (b - c - a) & 0xffffffff; b ^= (a << 8) & 0xffffffff
+    c = (c - a - b) & 0xffffffff; c ^= b >> 13
+    a = (a - b - c) & 0xffffffff; a ^= c >> 12
+    b = (b - c - a) & 0xffffffff; b ^= (a << 16) & 0xffffffff
+    c = (c - a - b) & 0xffffffff; c ^= b >> 5
+    a = (a - b - c) & 0xffffffff; a ^= c >> 3
+    b = (b - c - a) & 0xffffffff; b ^= (a << 10) & 0xffffffff
+    c = (c - a - b) & 0xffffffff; c ^= b >> 15
+    return c
+
+
+def find_cmp1(data: bytes) -> int:
+    """Returns the offset of the CMP1 block. Raises ValueError if it is missing."""
+    try:
+        return data.index(CMP1_MAGIC, _HEADER_FIELDS_SIZE)
+    except ValueError:
+        raise ValueError("'CMP1' magic string not found in file.")
+
+
+def parse(data: bytes, verify_checksum: bool = True) -> Cmp1Container:
+    """
+    Reads the main header and the CMP1 header at their fixed offsets.
+
+    The CMP1 block must directly follow the main header, the compressed size must fit in
+    the file and, with verify_checksum, the compressed stream must match its checksum.
+
+    Raises:
+        SaveFileError: If any of these checks fail.
+    """
+    if len(data) < MAIN_HEADER_SIZE + CMP1_HEADER_SIZE:
+        raise SaveFileError(f"File too short for a save file ({len(data)} bytes).")
+
+    magic, decompressed_size, compressed_size, decompressed_hash, compressed_hash = _CMP1_HEADER.unpack_from(data, MAIN_HEADER_SIZE)
+    if magic != CMP1_MAGIC:
+        raise SaveFileError("'CMP1' magic string not found after the main header.")
+
+    original_size = _MAIN_HEADER.unpack_from(data, 0)[3]
+    start = MAIN_HEADER_SIZE + CMP1_HEADER_SIZE
+    if not 0 < compressed_size <= len(data) - start:
+        raise SaveFileError(f"Compressed size {compressed_size} does not fit in a {len(data)} byte file.")
+    if decompressed_size < 0 or original_size != decompressed_size:
+        raise SaveFileError(f"Main header size {original_size} does not match the CMP1 size {decompressed_size}.")
+
+    payload = memoryview(data)[start:start + compressed_size]
+    if verify_checksum and hash_file(payload, compressed_size, 0) != compressed_hash:
+        raise SaveFileError("Compressed data checksum mismatch.")
+
+    return Cmp1Container(bytes(data[:MAIN_HEADER_SIZE]), MAIN_HEADER_SIZE, decompressed_size, compressed_size,
+                         decompressed_hash, compressed_hash, payload)
+
+
+def decode(data: bytes, verify_checksums: bool = False) -> tuple[bytes, bytes]:
+    """
+    Decompresses a save file (SRR, EHRR, SCCA, ...) held in memory.
+
+    Well-formed files are read with parse() and the result is checked against the
+    decompressed size. The pure Python hash runs at a few MB/s, so both checksums are
+    only verified with verify_checksums. Files that fail these checks (e.g. byte-swapped
+    console headers) fall back to scanning for the CMP1 block and inflating whatever
+    follows it.
+
+    Returns:
+        A tuple of (header, payload): the original 64-byte main header, which can be
+        passed back to encode() as a template, and the decompressed payload.
+
+    Raises:
+        ValueError: If the CMP1 block is missing.
+        zlib.error: If the compressed stream is damaged.
+    """
+    try:
+        container = parse(data, verify_checksums)
+        payload = zlib.decompress(container.payload)
+        if len(payload) != container.decompressed_size:
+            raise SaveFileError(f"Decompressed {len(payload)} bytes, header says {container.decompressed_size}.")
+        if verify_checksums and hash_file(payload, len(payload), 0) != container.decompressed_hash:
+            raise SaveFileError("Decompressed data checksum mismatch.")
+        return container.header, payload
+    except (SaveFileError, zlib.error) as e:
+        logger.warning(f"Save file failed validation ({e}); falling back to a CMP1 scan.")
+
+    cmp1_offset = find_cmp1(data)
+    payload = zlib.decompress(memoryview(data)[cmp1_offset + CMP1_HEADER_SIZE:])
+    return bytes(data[:MAIN_HEADER_SIZE]), payload
+
+
+def encode(payload: bytes, template_header: bytes = None, level: int = zlib.Z_DEFAULT_COMPRESSION, alignment: int = 16) -> bytes:
+    """
+    Compresses a payload back into the save file format.
+
+    Args:
+        payload: The decompressed file content.
+        template_header: The main header of the original file. All size fields are
+            rewritten, everything else is kept. If omitted, a fresh header is built
+            exactly like `inflate.py -c` does.
+        level: zlib compression level.
+        alignment: The CMP1 block is zero padded to a multiple of this many bytes.
+
+    Returns:
+        The complete save file.
+    """
+    compressed_data = zlib.compress(payload, level)
+    uncompressed_size = len(payload)
+    compressed_size = len(compressed_data)
+
+    uncompressed_checksum = hash_file(payload, uncompressed_size, 0)
+    compressed_checksum = hash_file(compressed_data, compressed_size, 0)
+
+    cmp1_header = CMP1_MAGIC + struct.pack('<iiII', uncompressed_size, compressed_size, uncompressed_checksum, compressed_checksum)
+
+    pad_len = (alignment - ((CMP1_HEADER_SIZE + compressed_size) % alignment)) % alignment
+    unpadded_size = CMP1_HEADER_SIZE + compressed_size + pad_len
+    total_filesize = MAIN_HEADER_SIZE + unpadded_size
+
+    if template_header is None:
+        header = bytearray(MAIN_HEADER_SIZE)
+        struct.pack_into('<IIIIII', header, 0, SAVE_FILE_VERSION, total_filesize, 1, uncompressed_size, unpadded_size, 0)
+    else:
+        header = bytearray(template_header[:MAIN_HEADER_SIZE].ljust(MAIN_HEADER_SIZE, b'\x00'))
+        struct.pack_into('<I', header, 4, total_filesize)
+        struct.pack_into('<II', header, 12, uncompressed_size, unpadded_size)
+
+    return b''.join((header, cmp1_header, compressed_data, b'\x00' * pad_len))
+
+
+def decode_file(path: str) -> tuple[bytes, bytes]:
+    """decode() for a save file on disk."""
+    with open(path, 'rb') as f:
+        return decode(f.read())
+
+
+def encode_file(path: str, payload: bytes, template_header: bytes = None, **kwargs) -> None:
+    """encode() straight into a file on disk. Keyword arguments are passed to encode()."""
+    data = encode(payload, template_header, **kwargs)
+    with open(path, 'wb') as f:
+        f.write(data)
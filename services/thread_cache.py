@@ -0,0 +1,269 @@
+import asyncio
+import datetime
+import json
+import sqlite3
+import time
+from typing import TypedDict
+from urllib.parse import parse_qs, urlparse
+
+import discord
+
+import config
+from utils.logger import logger
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.gif')
+
+# Discord CDN attachment links stop working at their "ex" timestamp; refresh them this much earlier
+URL_EXPIRY_MARGIN = 3600
+
+
+class ZipInfo(TypedDict):
+    url: str
+    size: int
+    filename: str
+
+
+class ThreadFacts(TypedDict):
+    thread_id: int
+    name: str
+    applied_tags: list[str]
+    starter_message_id: int | None
+    zips: list[ZipInfo]  # ZIP attachments of the starter message
+    image_url: str | None  # first image attachment or embed image of the starter message
+    srr_count: int | None  # SRR files in the ZIPs, once counted
+    updated_at: str
+
+
+def is_expired(url: str | None, margin: float = URL_EXPIRY_MARGIN) -> bool:
+    """Whether a Discord CDN link is past (or within `margin` seconds of) its "ex" expiry."""
+    if not url:
+        return False
+    expires = parse_qs(urlparse(url).query).get('ex')
+    if not expires:
+        return False
+    try:
+        return int(expires[0], 16) <= time.time() + margin
+    except ValueError:
+        return False
+
+
+def first_image_url(message: discord.Message) -> str | None:
+    for att in message.attachments:
+        if att.content_type and att.content_type.startswith('image/'):
+            return att.url
+        # Fallback check of path without query parameters
+        if att.url.split('?')[0].lower().endswith(IMAGE_EXTENSIONS):
+            return att.url
+    for emb in message.embeds:
+        if emb.image and emb.image.url:
+            return emb.image.url
+    return None
+
+
+def describe_thread(thread: discord.Thread, starter: discord.Message | None) -> ThreadFacts:
+    """The cached facts of a forum thread, from the thread and its starter message."""
+    return {
+        'thread_id': thread.id,
+        'name': thread.name,
+        'applied_tags': [tag.name for tag in thread.applied_tags],
+        'starter_message_id': starter.id if starter else None,
+        'zips': [{'url': att.url, 'size': att.size, 'filename': att.filename}
+                 for att in (starter.attachments if starter else []) if att.filename.lower().endswith('.zip')],
+        'image_url': first_image_url(starter) if starter else None,
+        'srr_count': None,
+        'updated_at': datetime.datetime.utcnow().isoformat(),
+    }
+
+
+class ThreadCache:
+    """
+    Per-thread facts of the toybox forum (starter message, ZIP attachments, first image,
+    applied tags, SRR count), kept in memory and in SQLite across restarts.
+
+    The cache is filled once by backfill() and then kept fresh by gateway events (see
+    cogs/forum_events.py) and by the toybox sync, so forum-scanning commands don't have to
+    crawl every thread. Attachment links expire, so fresh() re-reads a thread whose cached
+    links are about to.
+    """
+
+    def __init__(self, db_path: str = config.THREAD_CACHE_PATH):
+        self.db_path = db_path
+        self._db = None
+        self._threads = {}
+        self.complete = False
+        self.setup_db()
+
+    def setup_db(self):
+        """Opens the connection every read and write of this cache goes through."""
+        try:
+            self._db = sqlite3.connect(self.db_path)
+            self._db.execute("PRAGMA synchronous = NORMAL")
+            with self._db as db:
+                db.execute("PRAGMA journal_mode = WAL")
+                db.execute("""
+                    CREATE TABLE IF NOT EXISTS threads (
+                        thread_id INTEGER PRIMARY KEY,
+                        facts TEXT NOT NULL
+                    )
+                """)
+                db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+                self._threads = {thread_id: json.loads(facts) for thread_id, facts in db.execute("SELECT thread_id, facts FROM threads")}
+                self.complete = db.execute("SELECT 1 FROM meta WHERE key = 'backfilled_at'").fetchone() is not None
+            logger.info(f"✅ Thread cache loaded with {len(self._threads)} threads.")
+        except Exception as e:
+            logger.error(f"❌ Failed to initialize {self.db_path}: {e}")
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    # --- Reads ---
+
+    def get(self, thread_id: int) -> ThreadFacts | None:
+        facts = self._threads.get(int(thread_id))
+        return dict(facts) if facts is not None else None
+
+    def all(self) -> list[ThreadFacts]:
+        """Every cached thread, newest first."""
+        return [dict(self._threads[thread_id]) for thread_id in sorted(self._threads, reverse=True)]
+
+    # --- Writes ---
+
+    def put(self, facts: ThreadFacts):
+        self.put_many([facts])
+
+    def put_many(self, facts_list: list[ThreadFacts]):
+        """Stores the facts of several threads in one transaction."""
+        rows = []
+        for facts in facts_list:
+            old = self._threads.get(facts['thread_id'])
+            if old is not None and facts['srr_count'] is None:
+                # The count still holds if the ZIPs are the same files
+                if [(z['filename'], z['size']) for z in old['zips']] == [(z['filename'], z['size']) for z in facts['zips']]:
+                    facts = dict(facts, srr_count=old['srr_count'])
+            self._threads[facts['thread_id']] = facts
+            rows.append((facts['thread_id'], json.dumps(facts, ensure_ascii=False)))
+        if rows:
+            with self._db as db:
+                db.executemany("INSERT OR REPLACE INTO threads (thread_id, facts) VALUES (?, ?)", rows)
+
+    def update_metadata(self, thread: discord.Thread) -> bool:
+        """Updates name and tags of a cached thread from a thread object. False if it isn't cached."""
+        facts = self._threads.get(thread.id)
+        if facts is None:
+            return False
+        applied_tags = [tag.name for tag in thread.applied_tags]
+        if facts['name'] != thread.name or facts['applied_tags'] != applied_tags:
+            self.put(dict(facts, name=thread.name, applied_tags=applied_tags))
+        return True
+
+    def set_srr_count(self, thread_id: int, count: int):
+        facts = self._threads.get(int(thread_id))
+        if facts is not None:
+            self.put(dict(facts, srr_count=count))
+
+    def remove_many(self, thread_ids: list):
+        thread_ids = [int(thread_id) for thread_id in thread_ids]
+        for thread_id in thread_ids:
+            self._threads.pop(thread_id, None)
+        with self._db as db:
+            db.executemany("DELETE FROM threads WHERE thread_id = ?", [(thread_id,) for thread_id in thread_ids])
+
+    # --- Discord ---
+
+    async def read(self, thread: discord.Thread, fetch: bool = False) -> ThreadFacts:
+        """
+        The facts of a thread from its starter message, without storing them. The message
+        comes from the client's message cache if it is there, unless `fetch` is set.
+        """
+        starter = None if fetch else thread.starter_message
+        if starter is None:
+            try:
+                # The starter message of a forum thread has the thread's ID
+                starter = await thread.fetch_message(thread.id)
+            except discord.NotFound:
+                starter = None
+        return describe_thread(thread, starter)
+
+    async def refresh(self, thread: discord.Thread, fetch: bool = False) -> ThreadFacts:
+        """Re-reads a thread's starter message (see read()) and stores its facts."""
+        facts = await self.read(thread, fetch)
+        # Threads outside the toybox forum (e.g. bundle links) are looked up but not cached
+        if thread.parent_id != config.FORUM_CHANNEL_ID:
+            return facts
+        self.put(facts)
+        return self.get(thread.id)
+
+    async def fresh(self, source: discord.Guild | discord.Client, thread_id: int) -> ThreadFacts | None:
+        """
+        The facts of a thread with links that still work: from the cache, or re-read from
+        Discord when the thread isn't cached or its ZIP/image links are about to expire.
+        `source` is the guild or the bot. Returns None if the thread doesn't exist (any more).
+        """
+        facts = self.get(thread_id)
+        if facts is not None and not any(is_expired(url) for url in [facts['image_url']] + [z['url'] for z in facts['zips']]):
+            return facts
+        get_thread = getattr(source, 'get_thread', None) or source.get_channel
+        thread = get_thread(int(thread_id))
+        if thread is None:
+            try:
+                thread = await source.fetch_channel(int(thread_id))
+            except discord.NotFound:
+                self.remove_many([thread_id])
+                return None
+        return await self.refresh(thread, fetch=facts is not None)
+
+    async def backfill(self, forum_channel: discord.ForumChannel) -> int:
+        """
+        Walks every thread of the forum once and reads the starter messages of those not
+        cached yet, STARTER_FETCH_CONCURRENCY at a time, then stores them in one transaction.
+        Returns how many were added.
+        """
+        threads = list(forum_channel.threads)
+        async for archived_thread in forum_channel.archived_threads(limit=None):
+            threads.append(archived_thread)
+
+        missing, renamed = [], []
+        for thread in threads:
+            facts = self._threads.get(thread.id)
+            applied_tags = [tag.name for tag in thread.applied_tags]
+            if facts is None:
+                missing.append(thread)
+            elif facts['name'] != thread.name or facts['applied_tags'] != applied_tags:
+                renamed.append(dict(facts, name=thread.name, applied_tags=applied_tags))
+        logger.info(f"🔄 Thread cache backfill: {len(threads)} threads, {len(missing)} not cached yet.")
+
+        semaphore = asyncio.Semaphore(config.STARTER_FETCH_CONCURRENCY)
+
+        async def fetch(thread):
+            async with semaphore:
+                try:
+                    return await self.read(thread)
+                except discord.HTTPException as e:
+                    logger.warning(f"⚠️ Could not read thread {thread.id} for the thread cache: {e}")
+                    return None
+
+        read = await asyncio.gather(*(fetch(thread) for thread in missing))
+        self.put_many(renamed + [facts for facts in read if facts is not None])
+
+        # Threads that are gone were deleted while the bot was offline
+        gone = set(self._threads) - {thread.id for thread in threads}
+        if gone:
+            self.remove_many(list(gone))
+
+        with self._db as db:
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('backfilled_at', ?)",
+                       (datetime.datetime.utcnow().isoformat(),))
+        self.complete = True
+        logger.info(f"✅ Thread cache backfill complete ({len(self._threads)} threads, {len(gone)} removed).")
+        return len(missing)
+
+    async def ensure_complete(self, forum_channel: discord.ForumChannel):
+        """Backfills the cache if that never happened; afterwards gateway events keep it current."""
+        if not self.complete:
+            await self.backfill(forum_channel)
+
+
+# Global instance
+thread_cache = ThreadCache()
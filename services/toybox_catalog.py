@@ -0,0 +1,260 @@
+import contextlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import NamedTuple, TypedDict
+
+import config
+from utils.logger import logger
+
+_CREATOR = re.compile(r'(?i)Creator:\s*([^\n]+)')
+
+# Columns of the toyboxes table; any other key of a toybox (e.g. "subtoyboxes") is kept in `extra`
+_COLUMNS = ('id', 'name', 'url', 'description')
+
+
+class Toybox(TypedDict, total=False):
+    id: int
+    name: str
+    url: str
+    description: str
+    tags: list[str]
+    subtoyboxes: list
+
+
+class CatalogSnapshot(NamedTuple):
+    signature: tuple  # (mtime, size) of the database and its WAL file when it was read
+    by_id: dict  # id -> toybox
+    by_tag: dict  # lowercase tag -> [ids]
+    by_creator: dict  # lowercase creator -> [ids]
+
+
+def extract_creator(description: str) -> str | None:
+    """The creator named in a "Creator: ..." line of a forum post, if there is one."""
+    match = _CREATOR.search(description or "")
+    if not match:
+        return None
+    return match.group(1).replace('*', '').strip() or None
+
+
+class ToyboxCatalog:
+    """
+    The toybox database (formerly toybox_data.json) in SQLite.
+
+    Toyboxes are keyed by thread ID, with their tags in a separate table and the creator
+    parsed from the description, both indexed. The database runs in WAL mode, so lookups
+    are not blocked while a sync writes. Toyboxes are returned as plain dicts shaped like
+    the old JSON entries.
+
+    Reads are served from an in-memory snapshot (id -> toybox, tag -> ids, creator -> ids).
+    It is rebuilt when this catalog writes, or when the database or WAL file changed on
+    disk (mtime or size), e.g. because indexer.py or cleaner.py ran meanwhile.
+    """
+
+    def __init__(self, db_path: str = config.TOYBOX_DB_PATH):
+        self.db_path = db_path
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._snapshot = None
+        self._snapshot_lock = threading.Lock()
+        self.reloads = 0
+        self.setup_db()
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """The catalog's one connection, held for a transaction that commits on success."""
+        with self._db_lock, self._db:
+            yield self._db
+
+    def setup_db(self):
+        try:
+            # Shared by the threads that read and write the catalog, one transaction at a time
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute("PRAGMA foreign_keys = ON")
+            self._db.execute("PRAGMA synchronous = NORMAL")
+            with self._transaction() as db:
+                db.execute("PRAGMA journal_mode = WAL")
+                db.execute("""
+                    CREATE TABLE IF NOT EXISTS toyboxes (
+                        id INTEGER PRIMARY KEY,
+                        name TEXT NOT NULL,
+                        url TEXT NOT NULL DEFAULT '',
+                        description TEXT NOT NULL DEFAULT '',
+                        creator TEXT,
+                        extra TEXT
+                    )
+                """)
+                db.execute("""
+                    CREATE TABLE IF NOT EXISTS toybox_tags (
+                        toybox_id INTEGER NOT NULL REFERENCES toyboxes(id) ON DELETE CASCADE,
+                        tag TEXT NOT NULL,
+                        position INTEGER NOT NULL,
+                        PRIMARY KEY (toybox_id, tag)
+                    )
+                """)
+                db.execute("CREATE INDEX IF NOT EXISTS idx_toybox_tags_tag ON toybox_tags (tag COLLATE NOCASE, toybox_id)")
+                db.execute("CREATE INDEX IF NOT EXISTS idx_toyboxes_creator ON toyboxes (creator COLLATE NOCASE)")
+            logger.info(f"✅ {self.db_path} initialized successfully.")
+        except Exception as e:
+            logger.error(f"❌ Failed to initialize {self.db_path}: {e}")
+
+    def close(self):
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    # --- Reads ---
+
+    def _signature(self) -> tuple:
+        signature = []
+        for path in (self.db_path, self.db_path + "-wal"):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _load(self, db: sqlite3.Connection) -> list[tuple[Toybox, str | None]]:
+        tags = {}
+        for toybox_id, tag in db.execute("SELECT toybox_id, tag FROM toybox_tags ORDER BY toybox_id, position"):
+            tags.setdefault(toybox_id, []).append(tag)
+
+        toyboxes = []
+        for toybox_id, name, url, description, creator, extra in db.execute(
+                "SELECT id, name, url, description, creator, extra FROM toyboxes ORDER BY id"):
+            toybox = {"id": toybox_id, "name": name, "url": url, "tags": tags.get(toybox_id, []), "description": description}
+            if extra:
+                toybox.update(json.loads(extra))
+            toyboxes.append((toybox, creator))
+        return toyboxes
+
+    def snapshot(self) -> CatalogSnapshot:
+        """The current snapshot, reloaded first if the database changed."""
+        signature = self._signature()
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.signature == signature:
+            return snapshot
+
+        with self._snapshot_lock:
+            if self._snapshot is not None and self._snapshot.signature == signature:
+                return self._snapshot
+            with self._transaction() as db:
+                rows = self._load(db)
+            by_id, by_tag, by_creator = {}, {}, {}
+            for toybox, creator in rows:
+                by_id[toybox['id']] = toybox
+                for tag in dict.fromkeys(tag.lower() for tag in toybox['tags']):
+                    by_tag.setdefault(tag, []).append(toybox['id'])
+                if creator:
+                    by_creator.setdefault(creator.lower(), []).append(toybox['id'])
+            # Taken before reading, so a write that lands during the read triggers another reload
+            self._snapshot = CatalogSnapshot(signature, by_id, by_tag, by_creator)
+            self.reloads += 1
+            return self._snapshot
+
+    def invalidate(self):
+        """Drops the snapshot, so the next read reloads it. Called after every write."""
+        self._snapshot = None
+
+    @staticmethod
+    def _copy(toybox: Toybox) -> Toybox:
+        # Callers may edit what they get; the snapshot must stay as stored
+        return dict(toybox, tags=list(toybox['tags']))
+
+    def get(self, toybox_id: int | str) -> Toybox | None:
+        toybox = self.snapshot().by_id.get(int(toybox_id))
+        return self._copy(toybox) if toybox is not None else None
+
+    def get_url(self, toybox_id: int | str) -> str:
+        toybox = self.snapshot().by_id.get(int(toybox_id))
+        return toybox['url'] if toybox is not None else ""
+
+    def all(self) -> list[Toybox]:
+        return [self._copy(toybox) for toybox in self.snapshot().by_id.values()]
+
+    def ids(self) -> set[int]:
+        return set(self.snapshot().by_id)
+
+    def count(self) -> int:
+        return len(self.snapshot().by_id)
+
+    def with_tag(self, tag: str) -> list[Toybox]:
+        snapshot = self.snapshot()
+        return [self._copy(snapshot.by_id[toybox_id]) for toybox_id in snapshot.by_tag.get(tag.lower(), [])]
+
+    def by_creator(self, creator: str) -> list[Toybox]:
+        snapshot = self.snapshot()
+        return [self._copy(snapshot.by_id[toybox_id]) for toybox_id in snapshot.by_creator.get(creator.lower(), [])]
+
+    # --- Writes ---
+
+    @staticmethod
+    def _write(db: sqlite3.Connection, toybox: Toybox):
+        extra = {key: value for key, value in toybox.items() if key not in _COLUMNS and key != 'tags'}
+        db.execute("""
+            INSERT INTO toyboxes (id, name, url, description, creator, extra) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET
+                name = excluded.name, url = excluded.url, description = excluded.description,
+                creator = excluded.creator, extra = excluded.extra
+        """, (int(toybox['id']), toybox['name'], toybox.get('url', ''), toybox.get('description', ''),
+              extract_creator(toybox.get('description', '')),
+              json.dumps(extra, ensure_ascii=False) if extra else None))
+        ToyboxCatalog._write_tags(db, int(toybox['id']), toybox.get('tags', []))
+
+    @staticmethod
+    def _write_tags(db: sqlite3.Connection, toybox_id: int, tags: list[str]):
+        db.execute("DELETE FROM toybox_tags WHERE toybox_id = ?", (toybox_id,))
+        db.executemany("INSERT OR IGNORE INTO toybox_tags (toybox_id, tag, position) VALUES (?, ?, ?)",
+                       [(toybox_id, tag, position) for position, tag in enumerate(tags)])
+
+    def upsert(self, toybox: Toybox):
+        self.upsert_many([toybox])
+
+    def upsert_many(self, toyboxes: list[Toybox]):
+        """Inserts or replaces the given toyboxes in one transaction."""
+        with self._transaction() as db:
+            for toybox in toyboxes:
+                self._write(db, toybox)
+        self.invalidate()
+
+    def set_tags(self, toybox_id: int | str, tags: list[str]) -> bool:
+        """Replaces the tags of one toybox. Returns False if there is no such toybox."""
+        with self._transaction() as db:
+            if db.execute("SELECT 1 FROM toyboxes WHERE id = ?", (int(toybox_id),)).fetchone() is None:
+                return False
+            self._write_tags(db, int(toybox_id), tags)
+        self.invalidate()
+        return True
+
+    def delete_many(self, toybox_ids: list) -> int:
+        """Deletes the given toyboxes (and their tags). Returns how many existed."""
+        with self._transaction() as db:
+            cursor = db.executemany("DELETE FROM toyboxes WHERE id = ?", [(int(toybox_id),) for toybox_id in toybox_ids])
+        self.invalidate()
+        return cursor.rowcount
+
+    def import_json(self, path: str = config.TOYBOX_DATA_FILE) -> int:
+        """Upserts every toybox of a toybox_data.json style file. Returns how many were imported."""
+        with open(path, 'r', encoding='utf-8') as f:
+            toyboxes = json.load(f)
+        self.upsert_many(toyboxes)
+        return len(toyboxes)
+
+    def import_legacy_json(self):
+        """One-time migration: fills an empty catalog from TOYBOX_DATA_FILE if that file exists."""
+        if not os.path.exists(config.TOYBOX_DATA_FILE) or self.count():
+            return
+        try:
+            imported = self.import_json(config.TOYBOX_DATA_FILE)
+            logger.info(f"✅ Imported {imported} toyboxes from {config.TOYBOX_DATA_FILE} into {self.db_path}.")
+        except Exception as e:
+            logger.error(f"❌ Failed to import {config.TOYBOX_DATA_FILE}: {e}")
+
+
+# Global instance
+toybox_catalog = ToyboxCatalog()
+toybox_catalog.import_legacy_json()
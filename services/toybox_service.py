@@ -1,50 +1,145 @@
 import discord
+import datetime
 import json
+import os
+import time
 import asyncio
 import config
 from services.tag_analyzer import SimpleTagAnalyzer
 from services.rag_service import rag_service
+from services.toybox_catalog import toybox_catalog
+from services.thread_cache import thread_cache, describe_thread
 from utils.logger import logger
 
 class ToyboxService:
-    async def update_toybox_database(self, guild: discord.Guild):
+    def _load_sync_state(self) -> dict:
+        """The high-water mark of the last sync: the newest archive timestamp seen."""
+        try:
+            with open(config.TOYBOX_SYNC_STATE_FILE, "r", encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"⚠️ Ignoring unreadable sync state {config.TOYBOX_SYNC_STATE_FILE}: {e}")
+            return {}
+
+    def _save_sync_state(self, state: dict):
+        with open(config.TOYBOX_SYNC_STATE_FILE + ".tmp", "w", encoding='utf-8') as f:
+            json.dump(state, f, indent=4)
+        os.replace(config.TOYBOX_SYNC_STATE_FILE + ".tmp", config.TOYBOX_SYNC_STATE_FILE)
+
+    async def _fetch_starter_messages(self, threads: list) -> dict:
+        """
+        The first message of each thread, by thread ID (None when it has none or the fetch
+        failed). Uses `thread.starter_message` when it is in the message cache, and fetches
+        the rest concurrently, at most STARTER_FETCH_CONCURRENCY at a time. What is read is
+        also stored in the thread cache, in one transaction.
+        """
+        results = {}
+        starters = []
+        to_fetch = []
+        for thread in threads:
+            if thread.starter_message is not None:
+                results[thread.id] = thread.starter_message
+                starters.append(describe_thread(thread, thread.starter_message))
+            else:
+                to_fetch.append(thread)
+        if not to_fetch:
+            thread_cache.put_many(starters)
+            return results
+
+        semaphore = asyncio.Semaphore(config.STARTER_FETCH_CONCURRENCY)
+        start = time.monotonic()
+        done = 0
+        failed = 0
+
+        async def fetch(thread):
+            nonlocal done, failed
+            async with semaphore:
+                first_message = None
+                try:
+                    async for msg in thread.history(oldest_first=True, limit=1):
+                        first_message = msg
+                        break
+                except discord.HTTPException as e:
+                    failed += 1
+                    logger.warning(f"⚠️ Could not fetch the first message of thread {thread.id}: {e}")
+            results[thread.id] = first_message
+            # Only the actual starter message; it is gone if the first message is a reply
+            if first_message is not None and first_message.id == thread.id:
+                starters.append(describe_thread(thread, first_message))
+            done += 1
+            if done % 50 == 0 and done < len(to_fetch):
+                logger.info(f"📥 Fetched {done}/{len(to_fetch)} starter messages "
+                            f"({done / (time.monotonic() - start):.1f}/s).")
+
+        await asyncio.gather(*(fetch(thread) for thread in to_fetch))
+        thread_cache.put_many(starters)
+        elapsed = time.monotonic() - start
+        logger.info(f"📥 Fetched {len(to_fetch)} starter messages in {elapsed:.1f}s "
+                    f"({len(to_fetch) / elapsed if elapsed else 0:.1f}/s, {len(threads) - len(to_fetch)} from cache, {failed} failed).")
+        return results
+
+    async def update_toybox_database(self, guild: discord.Guild, full: bool = False):
+        """
+        Syncs the toybox catalog and the search indexes with the forum.
+
+        By default only threads created or archived since the last sync are fetched: the
+        active threads come from the gateway cache, and the archive (newest first) is paged
+        only down to the archive timestamp stored in TOYBOX_SYNC_STATE_FILE. An incremental
+        sync never removes entries; `full=True` pages through the whole archive and drops
+        threads that no longer exist. A full sync also runs when there is no watermark yet.
+        """
         forum_channel = guild.get_channel(config.FORUM_CHANNEL_ID)
         if not forum_channel or not isinstance(forum_channel, discord.ForumChannel):
             logger.warning("⚠️ Forum channel not found!")
             return
 
         # Load existing data
-        existing_toyboxes = {}
-        try:
-            with open(config.TOYBOX_DATA_FILE, "r", encoding='utf-8') as f:
-                existing_data = json.load(f)
-                existing_toyboxes = {str(item['id']): item for item in existing_data}
-        except FileNotFoundError:
+        existing_toyboxes = {str(item['id']): item for item in toybox_catalog.all()}
+        if not existing_toyboxes:
             logger.info("📝 No existing toybox data found, creating new database...")
 
+        state = self._load_sync_state()
+        if not existing_toyboxes or not state.get('archived_at'):
+            full = True
+        watermark = None if full else datetime.datetime.fromisoformat(state['archived_at'])
+
         analyzer = SimpleTagAnalyzer()
-        toybox_list = []
-        
-        # Gather all threads
+
+        # Gather threads: the active ones are cached, only the archive needs REST calls
         threads = list(forum_channel.threads)
+        newest_archived = watermark
+        archived_read = 0
         async for archived_thread in forum_channel.archived_threads(limit=None):
+            archived_read += 1
+            archived_at = archived_thread.archive_timestamp
+            # The archive is listed newest first; everything past the watermark was seen before.
+            # Threads archived at exactly the watermark are fetched again, which is harmless.
+            if watermark and archived_at < watermark:
+                break
+            if newest_archived is None or archived_at > newest_archived:
+                newest_archived = archived_at
             threads.append(archived_thread)
-        
-        logger.info(f"🔄 Updating Toybox database with {len(threads)} threads...")
-        
+
+        # Only new threads are analyzed; their first messages are fetched up front, concurrently
+        to_analyze = list({thread.id: thread for thread in threads if str(thread.id) not in existing_toyboxes}.values())
+        logger.info(f"🔄 {'Full' if full else 'Incremental'} toybox sync: {len(threads)} threads "
+                    f"({len(to_analyze)} not in the catalog, {archived_read} archived threads read).")
+        first_messages = await self._fetch_starter_messages(to_analyze)
+
+        seen = {}
+        added = 0
         for thread in threads:
             thread_id = str(thread.id)
-            
+            if thread_id in seen:
+                continue
+
             # If thread exists and already has tags, preserve them
             if thread_id in existing_toyboxes:
                 toybox_entry = existing_toyboxes[thread_id]
             else:
-                # Only analyze new threads or threads without tags
-                first_message = None
-                async for msg in thread.history(oldest_first=True, limit=1):
-                    first_message = msg
-                    break
-
+                first_message = first_messages.get(thread.id)
                 if not first_message:
                     continue
 
@@ -58,19 +153,46 @@ class ToyboxService:
                     "tags": tags,
                     "description": first_message.content
                 }
-            
-            toybox_list.append(toybox_entry)
-
-        # Save updated database
-        with open(config.TOYBOX_DATA_FILE, "w", encoding='utf-8') as f:
-            json.dump(toybox_list, f, indent=4, ensure_ascii=False)
-        
-        
-        logger.info(f"✅ Toybox database update complete. ({len(toybox_list)} entries processed).")
-        
-        # Sync with Vector DB
-        ingested_count = await rag_service.ingest_new_data(toybox_list)
-        
+                added += 1
+
+            seen[thread_id] = toybox_entry
+
+        new_entries = [entry for thread_id, entry in seen.items() if thread_id not in existing_toyboxes]
+        if full:
+            toybox_list = list(seen.values())
+            removed_ids = [thread_id for thread_id in existing_toyboxes if thread_id not in seen]
+        else:
+            # Everything not fetched this time is unchanged
+            toybox_list = list(existing_toyboxes.values()) + new_entries
+            removed_ids = []
+        removed = len(removed_ids)
+
+        state = {
+            'archived_at': newest_archived.isoformat() if newest_archived else state.get('archived_at'),
+            'last_sync': datetime.datetime.utcnow().isoformat(),
+            'last_full_sync': datetime.datetime.utcnow().isoformat() if full else state.get('last_full_sync'),
+        }
+
+        # Save updated database: existing entries are unchanged, so only new and deleted rows are written
+        if new_entries:
+            toybox_catalog.upsert_many(new_entries)
+        if removed_ids:
+            toybox_catalog.delete_many(removed_ids)
+            thread_cache.remove_many(removed_ids)
+
+        if added or removed:
+            logger.info(f"✅ Toybox database update complete. ({len(toybox_list)} entries, {added} new, {removed} removed).")
+        else:
+            logger.info(f"✅ Toybox database is up to date ({len(toybox_list)} entries).")
+
+        # Sync with Vector DB. This runs on every sync, even without new threads, so embeddings that
+        # failed last time are retried; a full sync checks every toybox against the vector store
+        ingested_count = await rag_service.ingest_new_data(toybox_list, check_all=full) or 0
+
+        # Advanced only after the new threads are in the catalog; a sync that fails before that
+        # starts from the old watermark next time
+        self._save_sync_state(state)
+
         return len(toybox_list), ingested_count
 
 toybox_service = ToyboxService()
@@ -0,0 +1,72 @@
+import io
+import os
+import re
+import zipfile
+
+# Toybox file names: prefix letters, slot number, suffix (e.g. "SHRA5A")
+TOYBOX_FILENAME_PATTERN = re.compile(r'([A-Z]+)(\d+)(.*)')
+
+
+def _rename(filename: str, new_number: int = None, prefix_from: str = None, prefix_to: str = None, search: bool = False) -> str:
+    match = (TOYBOX_FILENAME_PATTERN.search if search else TOYBOX_FILENAME_PATTERN.match)(filename)
+    if not match:
+        return filename
+
+    prefix_part, num_part, suffix_part = match.groups()
+    if prefix_from and prefix_part.endswith(prefix_from):
+        prefix_part = prefix_part[:-1] + prefix_to
+    if new_number is not None:
+        num_part = str(new_number)
+    return f"{prefix_part}{num_part}{suffix_part}"
+
+
+def to_toybox_game_name(filename: str, new_number: int = None) -> str:
+    """Toybox -> toybox game: the 'R' at the end of the prefix becomes 'A'."""
+    return _rename(filename, new_number, 'R', 'A', search=True)
+
+
+def to_toybox_name(filename: str, new_number: int = None) -> str:
+    """Toybox game -> toybox: the 'A' at the end of the prefix becomes 'R'."""
+    return _rename(filename, new_number, 'A', 'R')
+
+
+def renumbered_name(filename: str, new_number: int) -> str:
+    return _rename(filename, new_number)
+
+
+def rename_members(zip_bytes: bytes, default_folder: str, rename, skip_macos_metadata: bool = False) -> bytes:
+    """
+    Rewrites a toybox ZIP with every file renamed by rename(filename).
+
+    All files are put in the archive's first folder, or in default_folder if it has none.
+    rename must be picklable (a module-level function or a functools.partial of one) so
+    this can run as a CPU executor job.
+    """
+    output_zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(zip_bytes)) as input_zip, \
+         zipfile.ZipFile(output_zip_buffer, 'w', zipfile.ZIP_DEFLATED) as output_zip:
+
+        folder_name = next((name for name in input_zip.namelist() if name.endswith('/')), default_folder)
+
+        for file_info in input_zip.infolist():
+            if file_info.filename.endswith('/'):
+                continue
+
+            filename = os.path.basename(file_info.filename)
+
+            # Skip macOS metadata files
+            if skip_macos_metadata and ('__MACOSX' in file_info.filename or filename.startswith('._')):
+                continue
+
+            output_zip.writestr(folder_name + rename(filename), input_zip.read(file_info.filename))
+
+    return output_zip_buffer.getvalue()
+
+
+def zip_directory(root: str, output_path: str) -> None:
+    """Zips every file below root into output_path, with paths relative to root."""
+    with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for dirpath, _, files in os.walk(root):
+            for file in files:
+                path = os.path.join(dirpath, file)
+                zf.write(path, os.path.relpath(path, root))
@@ -0,0 +1,236 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+import config
+
+VECTOR_STORE_BACKENDS = ("chroma", "numpy")
+
+
+class VectorStore:
+    """
+    The storage RagService searches: one embedding, document and metadata dict per
+    toybox ID. Results are plain dicts with "id", "document" and "metadata" (plus
+    "score" for query(), higher is more similar).
+    """
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def entries(self, ids: list[str] = None) -> dict:
+        """
+        Stored entries as {id: (document, metadata)}, without embeddings: all of them, or
+        only those among `ids`.
+        """
+        raise NotImplementedError
+
+    def upsert(self, ids: list[str], embeddings: list, documents: list[str], metadatas: list[dict]):
+        raise NotImplementedError
+
+    def delete(self, ids: list[str]):
+        raise NotImplementedError
+
+    def flush(self):
+        """Persists the writes made so far. Stores that write through need not do anything."""
+
+    def query(self, embedding: list[float], n_results: int) -> list[dict]:
+        """The n_results entries most similar to the embedding, best first."""
+        raise NotImplementedError
+
+    def with_tag(self, tag: str, limit: int) -> list[dict]:
+        """Up to `limit` entries whose comma separated "tags" metadata contains `tag`."""
+        raise NotImplementedError
+
+
+class ChromaVectorStore(VectorStore):
+    """The ChromaDB collection the bot has always used."""
+
+    def __init__(self, path: str = config.CHROMA_DB_PATH, collection_name: str = "toybox_collection"):
+        import chromadb
+
+        self.client = chromadb.PersistentClient(path=path)
+        self.collection = self.client.get_or_create_collection(name=collection_name)
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def entries(self, ids=None) -> dict:
+        if ids is not None and not ids:
+            return {}
+        existing = self.collection.get(ids=ids, include=["documents", "metadatas"])
+        return dict(zip(existing['ids'], zip(existing['documents'], existing['metadatas'])))
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def delete(self, ids):
+        self.collection.delete(ids=ids)
+
+    def query(self, embedding, n_results):
+        results = self.collection.query(query_embeddings=[embedding], n_results=n_results)
+        if not results or not results['ids'][0]:
+            return []
+        return [{"id": toybox_id, "document": document, "metadata": metadata or {}, "score": -distance}
+                for toybox_id, document, metadata, distance in zip(results['ids'][0], results['documents'][0],
+                                                                   results['metadatas'][0], results['distances'][0])]
+
+    def with_tag(self, tag, limit):
+        results = self.collection.get(where={"tags": {"$contains": tag}}, limit=limit)
+        if not results or not results['ids']:
+            return []
+        return [{"id": toybox_id, "document": document, "metadata": metadata or {}}
+                for toybox_id, document, metadata in zip(results['ids'], results['documents'], results['metadatas'])]
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    An in-process index for a few thousand vectors: a contiguous float32 matrix of
+    L2-normalized rows, searched exactly with one matrix-vector product (cosine
+    similarity) and argpartition for the top k.
+
+    Stored in a directory as vectors.npy (the matrix, memory-mapped on load with mmap)
+    and entries.json (IDs, documents and metadata in row order). Upserts and deletes only
+    change the in-memory index; flush() rewrites both files atomically, once per batch
+    of writes rather than once per call.
+    """
+
+    VECTORS_FILE = "vectors.npy"
+    ENTRIES_FILE = "entries.json"
+
+    def __init__(self, path: str = config.VECTOR_INDEX_PATH, mmap: bool = True):
+        self.path = path
+        self._lock = threading.Lock()
+        self._ids = []
+        self._documents = []
+        self._metadatas = []
+        self._rows = {}
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._dirty = False
+        self.load(mmap)
+
+    def load(self, mmap: bool = True):
+        vectors_path = os.path.join(self.path, self.VECTORS_FILE)
+        entries_path = os.path.join(self.path, self.ENTRIES_FILE)
+        if not os.path.exists(vectors_path) or not os.path.exists(entries_path):
+            return
+
+        with open(entries_path, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+        matrix = np.load(vectors_path, mmap_mode='r' if mmap else None)
+        if len(entries['ids']) != len(matrix):
+            raise ValueError(f"{entries_path} has {len(entries['ids'])} entries but {vectors_path} has {len(matrix)} vectors.")
+
+        self._ids, self._documents, self._metadatas = entries['ids'], entries['documents'], entries['metadatas']
+        self._rows = {toybox_id: row for row, toybox_id in enumerate(self._ids)}
+        self._matrix = matrix
+
+    def save(self):
+        os.makedirs(self.path, exist_ok=True)
+        vectors_path = os.path.join(self.path, self.VECTORS_FILE)
+        entries_path = os.path.join(self.path, self.ENTRIES_FILE)
+
+        with open(vectors_path + ".tmp", 'wb') as f:
+            np.save(f, self._matrix)
+        with open(entries_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump({"ids": self._ids, "documents": self._documents, "metadatas": self._metadatas}, f, ensure_ascii=False)
+        os.replace(vectors_path + ".tmp", vectors_path)
+        os.replace(entries_path + ".tmp", entries_path)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def entries(self, ids=None) -> dict:
+        with self._lock:
+            if ids is None:
+                return dict(zip(self._ids, zip(self._documents, self._metadatas)))
+            rows = [(toybox_id, self._rows[toybox_id]) for toybox_id in ids if toybox_id in self._rows]
+            return {toybox_id: (self._documents[row], self._metadatas[row]) for toybox_id, row in rows}
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        vectors = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            # Writes work on an in-memory copy; the memory-mapped file is replaced by flush()
+            matrix = np.array(self._matrix) if len(self._matrix) else np.zeros((0, vectors.shape[1]), dtype=np.float32)
+            if matrix.shape[1] != vectors.shape[1]:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the index ({matrix.shape[1]}).")
+
+            new_rows = []
+            for toybox_id, vector, document, metadata in zip(ids, vectors, documents, metadatas):
+                row = self._rows.get(toybox_id)
+                if row is None:
+                    self._rows[toybox_id] = len(self._ids)
+                    self._ids.append(toybox_id)
+                    self._documents.append(document)
+                    self._metadatas.append(metadata)
+                    new_rows.append(vector)
+                elif row >= len(matrix):
+                    new_rows[row - len(matrix)] = vector
+                    self._documents[row] = document
+                    self._metadatas[row] = metadata
+                else:
+                    matrix[row] = vector
+                    self._documents[row] = document
+                    self._metadatas[row] = metadata
+            if new_rows:
+                matrix = np.vstack([matrix, np.asarray(new_rows, dtype=np.float32)])
+            self._matrix = np.ascontiguousarray(matrix)
+            self._dirty = True
+
+    def delete(self, ids):
+        with self._lock:
+            doomed = {self._rows[toybox_id] for toybox_id in ids if toybox_id in self._rows}
+            if not doomed:
+                return
+            keep = [row for row in range(len(self._ids)) if row not in doomed]
+            self._matrix = np.ascontiguousarray(self._matrix[keep])
+            self._ids = [self._ids[row] for row in keep]
+            self._documents = [self._documents[row] for row in keep]
+            self._metadatas = [self._metadatas[row] for row in keep]
+            self._rows = {toybox_id: row for row, toybox_id in enumerate(self._ids)}
+            self._dirty = True
+
+    def flush(self):
+        with self._lock:
+            if self._dirty:
+                self.save()
+                self._dirty = False
+
+    def query(self, embedding, n_results):
+        with self._lock:
+            matrix, ids, documents, metadatas = self._matrix, self._ids, self._documents, self._metadatas
+        if not len(ids) or n_results <= 0:
+            return []
+
+        scores = matrix @ self._normalize(np.asarray(embedding, dtype=np.float32))
+        k = min(n_results, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [{"id": ids[row], "document": documents[row], "metadata": metadatas[row], "score": float(scores[row])}
+                for row in top]
+
+    def with_tag(self, tag, limit):
+        with self._lock:
+            entries = list(zip(self._ids, self._documents, self._metadatas))
+        results = []
+        for toybox_id, document, metadata in entries:
+            if tag in (metadata or {}).get("tags", ""):
+                results.append({"id": toybox_id, "document": document, "metadata": metadata})
+                if len(results) >= limit:
+                    break
+        return results
+
+
+def create_vector_store(backend: str = config.VECTOR_STORE_BACKEND) -> VectorStore:
+    """Opens the vector store selected by VECTOR_STORE_BACKEND ("chroma" or "numpy")."""
+    if backend == "chroma":
+        return ChromaVectorStore()
+    if backend == "numpy":
+        return NumpyVectorStore()
+    raise ValueError(f"Unknown vector store backend '{backend}', expected one of {VECTOR_STORE_BACKENDS}.")
@@ -0,0 +1,54 @@
+import json
+import os
+import sys
+
+import pytest
+
+# The tests import the bot's modules (and benchmark.py's sample data) from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCHMARK_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+
+def pytest_addoption(parser):
+    parser.addoption("--save-stage-baseline", action="store_true",
+                     help=f"Record the stage benchmarks in {os.path.basename(BENCHMARK_BASELINE)} instead of comparing against it")
+    parser.addoption("--stage-tolerance", type=float, default=0.5,
+                     help="Allowed slowdown of a stage benchmark against the baseline (0.5 = 50%%)")
+
+
+@pytest.fixture(scope="session")
+def stage_baseline(request):
+    """
+    Checks stage benchmarks against the committed baseline: check(name, benchmark) fails
+    if its median round is more than --stage-tolerance slower than the recorded one.
+    With --save-stage-baseline the timings are written to the baseline file instead.
+    """
+    save = request.config.getoption("--save-stage-baseline")
+    tolerance = request.config.getoption("--stage-tolerance")
+    try:
+        with open(BENCHMARK_BASELINE) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = {}
+    recorded = {}
+
+    def check(name, benchmark):
+        if benchmark.stats is None:
+            return  # --benchmark-disable: the function ran once, nothing was timed
+        ms = benchmark.stats.stats.median * 1000
+        if save:
+            recorded[name] = round(ms, 3)
+            return
+        reference = baseline.get(name)
+        if reference is None:
+            pytest.skip(f"No baseline for {name}; run with --save-stage-baseline to record one.")
+        assert ms <= reference * (1 + tolerance), \
+            f"{name} regressed: {ms:.2f} ms vs baseline {reference:.2f} ms (+{(ms / reference - 1) * 100:.0f}%)"
+
+    yield check
+
+    if save and recorded:
+        with open(BENCHMARK_BASELINE, 'w') as f:
+            json.dump(dict(baseline, **recorded), f, indent=2, sort_keys=True)
+            f.write("\n")
@@ -0,0 +1,62 @@
+import hashlib
+import struct
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from benchmark import _sample_image
+from services.image_injector_service import ImageInjectorService
+
+# SHA-256 of the DXT1 data for _sample_image(), recorded with the original per-block encoder
+DXT1_GOLDEN_DIGEST = "54d6624609495045d6ee1ae0a848e0bde1c6432ed1368d8a4f787577fdf362a9"
+
+
+def _reference_dxt1(img) -> bytes:
+    """The original per-block encoder the vectorized one must match byte for byte."""
+    def rgb_to_565(r, g, b):
+        return ((int(r) >> 3) << 11) | ((int(g) >> 2) << 5) | (int(b) >> 3)
+
+    def expand565(c):
+        return np.array([((c >> 11) & 0x1F) * 255 // 31, ((c >> 5) & 0x3F) * 255 // 63, (c & 0x1F) * 255 // 31])
+
+    arr = np.array(img.convert('RGB'))
+    width, height = img.size
+    data = bytearray()
+    for by in range(height // 4):
+        for bx in range(width // 4):
+            pixels = arr[by * 4:by * 4 + 4, bx * 4:bx * 4 + 4].reshape(-1, 3)
+            c0 = rgb_to_565(*np.max(pixels, axis=0))
+            c1 = rgb_to_565(*np.min(pixels, axis=0))
+            if c0 < c1:
+                c0, c1 = c1, c0
+            rgb0, rgb1 = expand565(c0), expand565(c1)
+            palette = np.array([rgb0, rgb1, (2 * rgb0 + rgb1) // 3, (rgb0 + 2 * rgb1) // 3], dtype=np.float64)
+            indices = 0
+            for i, p in enumerate(pixels):
+                indices |= int(np.argmin(np.sum((palette - p) ** 2, axis=1))) << (2 * i)
+            data.extend(struct.pack('<HHI', c0, c1, indices))
+    return bytes(data)
+
+
+def _fixed_images():
+    rng = np.random.default_rng(3)
+    y, x = np.mgrid[0:36, 0:52]
+    return {
+        "pattern": _sample_image(64, 48),
+        "noise": Image.fromarray(rng.integers(0, 256, (40, 40, 3)).astype(np.uint8)),
+        "flat": Image.new('RGB', (16, 16), (200, 30, 90)),
+        # Not a multiple of 4: the last partial row and column of blocks are dropped
+        "gradient": Image.fromarray(np.stack([x * 4, y * 7, (x + y) * 3], axis=-1).astype(np.uint8)),
+    }
+
+
+@pytest.mark.parametrize("name", list(_fixed_images()))
+def test_dxt1_matches_the_reference_encoder(name):
+    img = _fixed_images()[name]
+    assert ImageInjectorService()._compress_dxt1(img) == _reference_dxt1(img)
+
+
+def test_dxt1_golden_digest():
+    data = ImageInjectorService()._compress_dxt1(_sample_image())
+    assert hashlib.sha256(data).hexdigest() == DXT1_GOLDEN_DIGEST
@@ -0,0 +1,68 @@
+import functools
+import io
+
+import pytest
+
+from benchmark import _edit_toys, _sample_image, _synthetic_ehrr, _synthetic_scca, _synthetic_srr, _synthetic_toybox_zip
+from services import save_codec, toybox_zip
+from services.file_parser import analyze_and_parse_toybox_file
+from services.image_injector_service import ImageInjectorService
+
+# Decompressed SRR size of the stage benchmarks, a large real toybox
+SRR_SIZE_KB = 512
+
+
+@pytest.fixture(scope="module")
+def toybox():
+    """The save files and ZIP of a synthetic toybox, and the payload, parse and edit of its SRR."""
+    srr = save_codec.encode(_synthetic_srr(SRR_SIZE_KB))
+    ehrr = save_codec.encode(_synthetic_ehrr())
+    scca = save_codec.encode(_synthetic_scca(), level=1, alignment=64)
+    header, payload = save_codec.decode(srr)
+    parsed = analyze_and_parse_toybox_file(payload)
+    return {
+        'srr': srr,
+        'zip': _synthetic_toybox_zip(srr, ehrr, scca),
+        'payload': payload,
+        'parsed': parsed,
+        'edited': _edit_toys(parsed),
+    }
+
+
+@pytest.fixture(scope="module")
+def screenshot():
+    png = io.BytesIO()
+    _sample_image().save(png, format='PNG')
+    return png.getvalue()
+
+
+def test_decode(benchmark, stage_baseline, toybox):
+    _, payload = benchmark(save_codec.decode, toybox['srr'])
+    assert payload == toybox['payload']
+    stage_baseline("decode", benchmark)
+
+
+def test_encode(benchmark, stage_baseline, toybox):
+    data = benchmark(save_codec.encode, toybox['edited'])
+    assert save_codec.decode(data)[1] == toybox['edited']
+    stage_baseline("encode", benchmark)
+
+
+def test_parse(benchmark, stage_baseline, toybox):
+    parsed = benchmark(analyze_and_parse_toybox_file, toybox['payload'])
+    assert parsed['toys']
+    stage_baseline("parse", benchmark)
+
+
+def test_inject_screenshot(benchmark, stage_baseline, toybox, screenshot):
+    injector = ImageInjectorService()
+    result, _ = benchmark(injector.process_toybox, toybox['zip'], screenshot)
+    result.close()
+    stage_baseline("inject", benchmark)
+
+
+def test_renumber(benchmark, stage_baseline, toybox):
+    renamed = benchmark(toybox_zip.rename_members, toybox['zip'], "Toybox/",
+                        functools.partial(toybox_zip.renumbered_name, new_number=42))
+    assert renamed
+    stage_baseline("renumber", benchmark)
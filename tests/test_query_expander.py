@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+from services.query_expander import MAX_CONCEPTS, QueryExpander
+
+KNOWLEDGE_BASE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "knowledge_base.json")
+
+
+@pytest.fixture(scope="module")
+def expander():
+    return QueryExpander(KNOWLEDGE_BASE)
+
+
+@pytest.mark.parametrize("query", ["best racing map made in 2018", "toyboxes from 2016", "2018"])
+def test_year_only_queries_are_not_rewritten(expander, query):
+    expansion = expander.expand(query)
+    assert not expansion.confident
+    assert not expansion.concepts
+
+
+@pytest.mark.parametrize("query", ["empire", "Empire maps", "darth vader"])
+def test_keyword_only_queries_are_left_to_the_llm(expander, query):
+    # Keywords are shared by several films; they don't say which one is meant
+    assert not expander.expand(query).confident
+
+
+@pytest.mark.parametrize("query", ["marvel racing", "stitch"])
+def test_unknown_subjects_are_left_to_the_llm(expander, query):
+    expansion = expander.expand(query)
+    assert not expansion.confident
+    assert not expansion.matches
+
+
+def test_alias_names_one_concept(expander):
+    expansion = expander.expand("rogue one maps")
+    assert expansion.confident
+    assert expansion.concepts == ["Rogue One: A Star Wars Story (2016)"]
+    assert expansion.search_query.startswith("Rogue One: A Star Wars Story Rogue One")
+
+
+def test_alias_with_keyword_expands_only_the_named_concept(expander):
+    expansion = expander.expand("rogue one darth vader")
+    assert expansion.confident
+    assert expansion.concepts == ["Rogue One: A Star Wars Story (2016)"]
+
+
+def test_expanded_titles_are_capped(expander):
+    expansion = expander.expand("star wars story")
+    assert len(expansion.concepts) <= MAX_CONCEPTS
+    assert expansion.confident
@@ -0,0 +1,64 @@
+import struct
+
+import pytest
+
+from benchmark import _sample_bytes
+from services import save_codec
+
+# (length, initval, expected hash) for _sample_bytes(length), recorded with the
+# original inflate.py implementation. Any change to the hash must keep these.
+HASH_GOLDEN_VALUES = [
+    (0, 0x00000000, 0xBD49D10D),
+    (0, 0x12345678, 0x3DF641A9),
+    (1, 0x00000000, 0x4E67E405),
+    (1, 0x12345678, 0x3E826B9A),
+    (2, 0x00000000, 0xC9E140BA),
+    (3, 0x00000000, 0x73798DB0),
+    (4, 0x00000000, 0x5A2569F2),
+    (5, 0x00000000, 0x9CCBC8B2),
+    (6, 0x00000000, 0x456BB8EC),
+    (7, 0x00000000, 0xB9573534),
+    (8, 0x00000000, 0x3AE3798A),
+    (9, 0x00000000, 0x12A3788A),
+    (10, 0x00000000, 0xF5986950),
+    (11, 0x00000000, 0x8B195F40),
+    (11, 0x12345678, 0x42A95EC7),
+    (12, 0x00000000, 0xDB110A22),
+    (12, 0x12345678, 0xB508D1CB),
+    (13, 0x00000000, 0xAAD0FC69),
+    (23, 0x00000000, 0xA6282506),
+    (24, 0x00000000, 0x6BE981B8),
+    (25, 0x00000000, 0xA4E40C30),
+    (255, 0x00000000, 0xDCA396C6),
+    (255, 0x12345678, 0x98951B35),
+    (4096, 0x00000000, 0x62CF0812),
+    (65537, 0x00000000, 0x1A3D985C),
+    (65537, 0x12345678, 0x7553502A),
+]
+
+
+@pytest.mark.parametrize("length, initval, expected", HASH_GOLDEN_VALUES)
+def test_hash_file_golden_values(length, initval, expected):
+    assert save_codec.hash_file(_sample_bytes(length), length, initval) == expected
+
+
+def test_hash_file_accepts_memoryview():
+    data = _sample_bytes(1000)
+    assert save_codec.hash_file(memoryview(data)[100:900], 800, 0) == save_codec.hash_file(data[100:900], 800, 0)
+
+
+def test_encode_without_template_builds_a_fresh_header():
+    payload = _sample_bytes(5000)
+    data = save_codec.encode(payload)
+
+    version, total_filesize, count, uncompressed_size, unpadded_size, _ = struct.unpack_from('<IIIIII', data, 0)
+    assert (version, total_filesize, count, uncompressed_size) == (save_codec.SAVE_FILE_VERSION, len(data), 1, len(payload))
+    assert unpadded_size == len(data) - save_codec.MAIN_HEADER_SIZE
+    assert unpadded_size % 16 == 0
+
+
+def test_decode_returns_the_encoded_payload():
+    payload = _sample_bytes(70000)
+    header, decoded = save_codec.decode(save_codec.encode(payload))
+    assert decoded == payload
+    assert len(header) == save_codec.MAIN_HEADER_SIZE
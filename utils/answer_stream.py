@@ -0,0 +1,126 @@
+import asyncio
+import threading
+import time
+
+import discord
+
+EMBED_LIMIT = 4096
+MESSAGE_LIMIT = 2000
+OVERFLOW_PREFIX = "[...]\n"
+CURSOR = " ▌"
+
+
+class _Failure:
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+async def iterate_in_thread(make_iterable):
+    """
+    Runs a blocking iterable (e.g. a streamed `generate_content` response) in a worker
+    thread and yields its items on the event loop as they arrive.
+
+    A consumer that stops early must aclose() the generator; the worker then stops
+    reading the iterable at its next item.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    done = object()
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in make_iterable():
+                if stop.is_set():
+                    return
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+        except Exception as e:
+            if not stop.is_set():
+                loop.call_soon_threadsafe(queue.put_nowait, _Failure(e))
+        finally:
+            if not stop.is_set():
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    worker = loop.run_in_executor(None, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+        await worker
+    finally:
+        stop.set()
+
+
+class StreamingAnswer:
+    """
+    Shows an answer while it is being generated: the first 4096 characters in the embed
+    of `message`, the rest in follow-up messages of up to 2000 characters that are sent
+    as soon as the text reaches them.
+
+    Discord rate limits message edits, so the text is only pushed out once every
+    `interval` seconds (and once more by finish()).
+    """
+
+    def __init__(self, message: discord.Message, embed: discord.Embed, interval: float = 1.2):
+        self.message = message
+        self.embed = embed
+        self.interval = interval
+        self.text = ""
+        self.first_token_at = None
+        self._shown_embed_text = None
+        self._overflow = []  # [follow-up message, text it shows]
+        self._last_flush = 0.0
+
+    def _layout(self) -> tuple[str, list[str]]:
+        text = self.text.strip()
+        overflow = text[EMBED_LIMIT:]
+        if overflow:
+            overflow = OVERFLOW_PREFIX + overflow
+        return text[:EMBED_LIMIT], [overflow[i:i + MESSAGE_LIMIT] for i in range(0, len(overflow), MESSAGE_LIMIT)]
+
+    async def append(self, text: str):
+        if not text:
+            return
+        if self.first_token_at is None:
+            self.first_token_at = time.time()
+        self.text += text
+        if time.monotonic() - self._last_flush >= self.interval:
+            await self.flush()
+
+    async def flush(self, footer: str = None):
+        embed_text, chunks = self._layout()
+        final = footer is not None
+        if not final and not chunks and len(embed_text) + len(CURSOR) <= EMBED_LIMIT:
+            # Still writing: show a cursor at the end of the text
+            embed_text += CURSOR
+
+        if embed_text != self._shown_embed_text or final:
+            self.embed.description = embed_text
+            if final:
+                self.embed.set_footer(text=footer)
+            await self.message.edit(embed=self.embed)
+            self._shown_embed_text = embed_text
+
+        for i, chunk in enumerate(chunks):
+            if i < len(self._overflow):
+                follow_up, shown = self._overflow[i]
+                if chunk != shown:
+                    await follow_up.edit(content=chunk)
+                    self._overflow[i][1] = chunk
+            else:
+                follow_up = await self.message.channel.send(chunk)
+                self._overflow.append([follow_up, chunk])
+        self._last_flush = time.monotonic()
+
+    async def show(self, text: str, footer: str):
+        """Shows a complete answer at once (e.g. one served from a cache)."""
+        self.text = text
+        await self.finish(footer)
+
+    async def finish(self, footer: str):
+        """Shows the complete text without the cursor, and the footer."""
+        await self.flush(footer)
@@ -7,6 +7,7 @@ import io
 import os
 import tempfile
 import aiohttp
+from services.thread_cache import thread_cache
 from utils.logger import logger
 
 
@@ -159,22 +160,24 @@ class AddToBundleView(ui.View):
                         )
                         await self.message.edit(embed=processing_embed)
 
-                        # Find ZIP attachment in thread
-                        zip_attachment = None
-                        async for msg in thread.history(limit=10, oldest_first=True):
-                            for attachment in msg.attachments:
-                                if attachment.filename.lower().endswith('.zip'):
-                                    zip_attachment = attachment
+                        # Find ZIP attachment in thread: the starter message's, from the thread cache,
+                        # else the first one in the first 10 messages
+                        zip_url = None
+                        facts = await thread_cache.fresh(guild, thread_id)
+                        if facts and facts['zips']:
+                            zip_url = facts['zips'][0]['url']
+                        else:
+                            async for msg in thread.history(limit=10, oldest_first=True):
+                                zip_url = next((a.url for a in msg.attachments if a.filename.lower().endswith('.zip')), None)
+                                if zip_url:
                                     break
-                            if zip_attachment:
-                                break
 
-                        if not zip_attachment:
+                        if not zip_url:
                             failed_threads.append(f"{thread.name}: No ZIP found")
                             continue
 
                         # Download ZIP
-                        async with session.get(zip_attachment.url) as resp:
+                        async with session.get(zip_url) as resp:
                             if resp.status != 200:
                                 failed_threads.append(f"{thread.name}: Download failed")
                                 continue
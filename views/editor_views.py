@@ -3,12 +3,12 @@ from discord import ui
 import re
 import io
 import os
-import zipfile
-import asyncio
 import shutil
 import traceback
 from typing import List, Dict, Any
 
+from services import save_codec, toybox_zip
+from services.cpu_executor import cpu_executor
 from services.file_parser import (
     analyze_and_parse_toybox_file, 
     TEXT_PATTERN, 
@@ -267,20 +267,11 @@ class ToyboxEditView(ui.View):
                 final_content = "\n".join(self.file_lines).encode('utf-8')
                 final_file = discord.File(io.BytesIO(final_content), filename=f"edited_{self.original_filename}")
             elif self.mode == 'zip':
-                with open(self.context['txt_path'], 'w', encoding='utf-8') as f:
-                    f.write("\n".join(self.file_lines))
-                proc = await asyncio.create_subprocess_exec('python3', self.context['script_path'], '-c', self.context['txt_path'], self.context['srr_path'], self.context['srr_path'], stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
-                _, stderr = await proc.communicate()
-                if proc.returncode != 0: 
-                    raise Exception(f"Compression failed: {stderr.decode()}")
-                
-                os.remove(self.context['txt_path'])
+                final_content = "\n".join(self.file_lines).encode('utf-8')
+                await cpu_executor.run(save_codec.encode_file, self.context['srr_path'], final_content)
 
                 new_zip_path = os.path.join(self.context['temp_dir'], f"edited_{self.context['original_zip_name']}")
-                with zipfile.ZipFile(new_zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-                    for root, _, files in os.walk(self.context['files_root']):
-                        for file in files:
-                            zf.write(os.path.join(root, file), os.path.relpath(os.path.join(root, file), self.context['files_root']))
+                await cpu_executor.run(toybox_zip.zip_directory, self.context['files_root'], new_zip_path)
                 final_file = discord.File(new_zip_path, filename=os.path.basename(new_zip_path))
             
             for item in self.children:
@@ -313,13 +304,12 @@ class ToyboxEditView(ui.View):
                 print(f"Error cleaning up temp directory: {e}")
 
 class SRRFileSelectView(ui.View):
-    def __init__(self, srr_files: List[Dict[str, str]], temp_dir: str, files_root: str, original_zip_name: str, script_path: str):
+    def __init__(self, srr_files: List[Dict[str, str]], temp_dir: str, files_root: str, original_zip_name: str):
         super().__init__(timeout=1800)
         self.srr_files = srr_files
         self.temp_dir = temp_dir
         self.files_root = files_root
         self.original_zip_name = original_zip_name
-        self.script_path = script_path
         self.add_item(self.create_srr_select())
         self.add_item(self.create_cancel_button())
     
@@ -366,16 +356,8 @@ class SRRFileSelectView(ui.View):
         selected_srr = self.srr_files[selected_index]
         try:
             srr_path = selected_srr['path']
-            txt_path = os.path.join(self.files_root, f"{selected_srr['name']}.txt")
-            proc = await asyncio.create_subprocess_exec(
-                'python3', self.script_path, '-d', srr_path, txt_path,
-                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-            )
-            _, stderr = await proc.communicate()
-            if proc.returncode != 0:
-                raise Exception(f"Decompression failed: {stderr.decode()}")
-            with open(txt_path, 'rb') as f:
-                parsed_data = analyze_and_parse_toybox_file(f.read())
+            _, payload = await cpu_executor.run(save_codec.decode_file, srr_path)
+            parsed_data = analyze_and_parse_toybox_file(payload)
             if not parsed_data['toys']:
                 await interaction.followup.send("❌ No editable toys found in the selected SRR file.", ephemeral=True)
                 return
@@ -383,9 +365,7 @@ class SRRFileSelectView(ui.View):
                 'temp_dir': self.temp_dir,
                 'files_root': self.files_root,
                 'original_zip_name': self.original_zip_name,
-                'srr_path': srr_path,
-                'txt_path': txt_path,
-                'script_path': self.script_path
+                'srr_path': srr_path
             }
             view = ToyboxEditView(parsed_data, selected_srr['name'], 'zip', context)
             await interaction.edit_original_response(embed=view.create_embed(), view=view)
@@ -414,13 +394,12 @@ class SRRFileSelectView(ui.View):
                 print(f"Error cleaning up temp directory: {e}")
 
 class EHRRFileSelectView(ui.View):
-    def __init__(self, ehrr_files: List[Dict[str, str]], temp_dir: str, files_root: str, original_zip_name: str, script_path: str):
+    def __init__(self, ehrr_files: List[Dict[str, str]], temp_dir: str, files_root: str, original_zip_name: str):
         super().__init__(timeout=1800)
         self.ehrr_files = ehrr_files
         self.temp_dir = temp_dir
         self.files_root = files_root
         self.original_zip_name = original_zip_name
-        self.script_path = script_path
         self.add_item(self.create_ehrr_select())
         self.add_item(self.create_cancel_button())
     
@@ -459,16 +438,8 @@ class EHRRFileSelectView(ui.View):
         selected_ehrr = self.ehrr_files[selected_index]
         try:
             ehrr_path = selected_ehrr['path']
-            txt_path = os.path.join(self.files_root, f"{selected_ehrr['name']}.txt")
-            proc = await asyncio.create_subprocess_exec(
-                'python3', self.script_path, '-d', ehrr_path, txt_path,
-                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-            )
-            _, stderr = await proc.communicate()
-            if proc.returncode != 0:
-                raise Exception(f"Decompression failed: {stderr.decode()}")
-            with open(txt_path, 'rb') as f:
-                parsed_data = analyze_and_parse_toybox_file(f.read())
+            _, payload = await cpu_executor.run(save_codec.decode_file, ehrr_path)
+            parsed_data = analyze_and_parse_toybox_file(payload)
             if not parsed_data['toys']:
                 await interaction.followup.send("❌ No editable metadata found in the selected EHRR file.", ephemeral=True)
                 return
@@ -476,9 +447,7 @@ class EHRRFileSelectView(ui.View):
                 'temp_dir': self.temp_dir,
                 'files_root': self.files_root,
                 'original_zip_name': self.original_zip_name,
-                'srr_path': ehrr_path,
-                'txt_path': txt_path,
-                'script_path': self.script_path
+                'srr_path': ehrr_path
             }
             view = ToyboxEditView(parsed_data, selected_ehrr['name'], 'zip', context)
             await interaction.edit_original_response(embed=view.create_embed(), view=view)